@@ -6,6 +6,6 @@ setup(name='pygestalt',
       author='Ilan Moyer',
       author_email='imoyer@mit.edu',
       url='https://github.com/imoyer/pygestalt',
-      packages=['pygestalt'],
+      packages=['pygestalt', 'pygestalt.benchmarks'],
       package_dir={'pygestalt':'source/.'}
      )
@@ -0,0 +1,6 @@
+#   pyGestalt Benchmarks Package
+
+"""Micro-benchmark suites for tracking the performance of the pyGestalt framework across releases.
+
+Each suite is a module that can be run directly, e.g. python -m pygestalt.benchmarks.packets, and prints its results as JSON.
+"""
@@ -0,0 +1,190 @@
+#   pyGestalt Packets Benchmark Suite
+
+"""Reproducible timings of packet encoding and decoding, for tracking regressions across releases.
+
+Run as python -m pygestalt.benchmarks.packets [--output results.json] [--repeat N] [--filter text]
+
+Each benchmark times a single encode or decode call on a representative template, and reports the best and median time per
+call over several repeats. Allocations per call are measured with tracemalloc where it is avaliable. Under Python 2, which has
+no tracemalloc, the number of garbage-collected objects created and retained per call is reported instead, which catches leaks
+and caches that grow without bound but not transient allocations.
+"""
+
+#---- IMPORTS ----
+import gc
+import json
+import platform
+import time
+import timeit
+import argparse
+from pygestalt import packets
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None  #only avaliable in Python 3.4+
+
+#---- TEMPLATES ----
+
+def gestaltPacketTemplate():
+    """Returns the frame template used by interfaces.gestaltInterface."""
+    return packets.template('gestaltPacketTemplate',
+                            packets.unsignedInt('_startByte_',1),
+                            packets.unsignedInt('_address_',2),
+                            packets.unsignedInt('_port_',1),
+                            packets.length('_length_'),
+                            packets.packet('_payload_'),
+                            packets.checksum('_checksum_'))
+
+def bootWriteRequestTemplate(pageSize = 128):
+    """Returns the bootloader page write template used by nodes.gestaltVirtualNode."""
+    return packets.template('bootWriteRequest',
+                            packets.unsignedInt('commandCode', 1),
+                            packets.unsignedInt('pageNumber', 2),
+                            packets.pList('writeData', pageSize))
+
+def bootReadResponseTemplate(pageSize = 128):
+    """Returns the bootloader page read response template used by nodes.gestaltVirtualNode."""
+    return packets.template('bootReadResponse',
+                            packets.pList('readData', pageSize))
+
+def statusTemplate():
+    """Returns a bitfield-heavy status reply, of the kind polled from motion controllers."""
+    return packets.template('statusResponse',
+                            packets.bitfield('limitSwitches', 8, *[(bitPosition, 'limit' + str(bitPosition)) for bitPosition in range(8)]),
+                            packets.bitfield('flags', 16, *[(bitPosition, 'flag' + str(bitPosition)) for bitPosition in range(16)]),
+                            packets.signedInt('position', 4),
+                            packets.fixedPoint('velocity', 8, 15),
+                            packets.unsignedInt('bufferFill', 1))
+
+def nestedTemplate():
+    """Returns a multi-axis status reply, built up from nested packetTemplate tokens."""
+    axisTemplates = []
+    for axisName in 'xyz':
+        axisTemplates += [packets.packetTemplate(axisName + 'Axis', packets.template(axisName + 'AxisStatus',
+                                                                                   packets.signedInt(axisName + 'Position', 4),
+                                                                                   packets.fixedPoint(axisName + 'Velocity', 8, 15),
+                                                                                   packets.bitfield(axisName + 'Flags', 8, (0, axisName + 'Moving'), (1, axisName + 'Homed'))))]
+    return packets.template('multiAxisStatus', packets.unsignedInt('segmentCount', 1), *(axisTemplates + [packets.checksum('_checksum_')]))
+
+def nestedEncodeDict():
+    """Returns an encode dictionary for nestedTemplate."""
+    encodeDict = {'segmentCount':3}
+    for axisName in 'xyz':
+        encodeDict.update({axisName + 'Position':-12345, axisName + 'Velocity':12.5, axisName + 'Flags':{axisName + 'Moving':True, axisName + 'Homed':False}})
+    return encodeDict
+
+#---- BENCHMARKS ----
+
+def buildBenchmarks():
+    """Returns a list of (benchmarkName, function) pairs, where each function performs a single encode or decode call."""
+    benchmarks = []
+    
+    def addCodecBenchmarks(name, packetTemplate, encodeDict):
+        """Adds encode and decode benchmarks for a template."""
+        encodedPacket = packetTemplate.encode(encodeDict)
+        encodedBuffer = packetTemplate.encodeBuffer(encodeDict)
+        packetList = list(encodedPacket)
+        benchmarks.append((name + '.encode', lambda: packetTemplate.encode(encodeDict)))
+        benchmarks.append((name + '.encodeBuffer', lambda: packetTemplate.encodeBuffer(encodeDict)))
+        benchmarks.append((name + '.decode', lambda: packetTemplate.decode(packetList)))
+        benchmarks.append((name + '.decodeBuffer', lambda: packetTemplate.decode(encodedBuffer)))
+    
+    payload = packets.serializedPacket(range(8))
+    gestaltDict = {'_startByte_':72, '_address_':1001, '_port_':10, '_payload_':payload}
+    addCodecBenchmarks('gestaltPacket', gestaltPacketTemplate(), gestaltDict)
+    prefixTemplate = gestaltPacketTemplate()
+    benchmarks.append(('gestaltPacket.encodeBufferWithPrefix', lambda: prefixTemplate.getFramePrefix({'_startByte_':72, '_address_':1001, '_port_':10}).encodeBuffer({'_payload_':payload})))
+    
+    pageData = [byteIndex % 256 for byteIndex in range(128)]
+    addCodecBenchmarks('bootWriteRequest', bootWriteRequestTemplate(), {'commandCode':2, 'pageNumber':17, 'writeData':pageData})
+    addCodecBenchmarks('bootReadResponse', bootReadResponseTemplate(), {'readData':pageData})
+    
+    statusDict = {'limitSwitches':{'limit0':True, 'limit5':True}, 'flags':dict(('flag' + str(bitPosition), bitPosition % 3 == 0) for bitPosition in range(16)),
+                  'position':-40000, 'velocity':-3.25, 'bufferFill':12}
+    addCodecBenchmarks('status', statusTemplate(), statusDict)
+    addCodecBenchmarks('status.codegen', packets.template(*([statusTemplate().name] + statusTemplate().template), codegen = True), statusDict)
+    
+    addCodecBenchmarks('nested', nestedTemplate(), nestedEncodeDict())
+    
+    manyTemplate = statusTemplate()
+    statusBuffer, statusOffsets = manyTemplate.encodeMany([statusDict]*256)
+    benchmarks.append(('status.encodeMany256', lambda: manyTemplate.encodeMany([statusDict]*256)))
+    benchmarks.append(('status.decodeMany256', lambda: manyTemplate.decodeMany(statusBuffer, statusOffsets)))
+    return benchmarks
+
+def timeBenchmark(function, repeat, number):
+    """Returns the best and median time per call, in microseconds, over the provided number of repeats."""
+    function()  #warm up, e.g. compile the template
+    times = sorted(timeit.repeat(function, repeat = repeat, number = number))
+    return {'bestMicroseconds':times[0]/number*1e6, 'medianMicroseconds':times[len(times)//2]/number*1e6}
+
+def measureAllocations(function, number):
+    """Returns allocation measurements per call.
+    
+    With tracemalloc, returns the number of bytes and memory blocks allocated per call, net of anything freed. Otherwise returns the
+    number of garbage-collected objects that were created and are still alive per call.
+    """
+    function()  #warm up
+    gcWasEnabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        if tracemalloc != None:
+            tracemalloc.start()
+            startSnapshot = tracemalloc.take_snapshot()
+            for callIndex in range(number): function()
+            statistics = tracemalloc.take_snapshot().compare_to(startSnapshot, 'filename')
+            tracemalloc.stop()
+            return {'method':'tracemalloc',
+                    'bytesPerCall':float(sum(statistic.size_diff for statistic in statistics))/number,
+                    'blocksPerCall':float(sum(statistic.count_diff for statistic in statistics))/number}
+        startCount = len(gc.get_objects())
+        results = [function() for callIndex in range(number)]  #results are kept so that the objects they contain are counted
+        objectCount = len(gc.get_objects()) - startCount - 1  #the results list itself is not counted
+        del results
+        return {'method':'gc', 'objectsPerCall':float(objectCount)/number}
+    finally:
+        if gcWasEnabled: gc.enable()
+
+def run(repeat = 7, number = 2000, nameFilter = None):
+    """Runs the benchmark suite, and returns the results as a dictionary.
+    
+    repeat -- the number of times each benchmark is timed. The best and median are reported.
+    number -- the number of calls per timing.
+    nameFilter -- if provided, only benchmarks whose names contain this string are run.
+    """
+    results = {'suite':'pygestalt.benchmarks.packets',
+               'python':platform.python_version(),
+               'implementation':platform.python_implementation(),
+               'platform':platform.platform(),
+               'timestamp':time.time(),
+               'repeat':repeat,
+               'number':number,
+               'benchmarks':{}}
+    for benchmarkName, function in buildBenchmarks():
+        if nameFilter and nameFilter not in benchmarkName: continue
+        benchmarkResult = timeBenchmark(function, repeat, number)
+        benchmarkResult['callsPerSecond'] = 1e6/benchmarkResult['bestMicroseconds']
+        benchmarkResult['allocations'] = measureAllocations(function, min(number, 500))
+        results['benchmarks'][benchmarkName] = benchmarkResult
+    return results
+
+def main(argv = None):
+    """Runs the benchmark suite from the command line, writing JSON results to stdout or to a file."""
+    parser = argparse.ArgumentParser(description = "Times packet encoding and decoding.")
+    parser.add_argument('--output', help = "file to write JSON results to. Defaults to stdout.")
+    parser.add_argument('--repeat', type = int, default = 7, help = "number of timings per benchmark.")
+    parser.add_argument('--number', type = int, default = 2000, help = "number of calls per timing.")
+    parser.add_argument('--filter', dest = 'nameFilter', help = "only run benchmarks whose names contain this text.")
+    arguments = parser.parse_args(argv)
+    
+    results = run(arguments.repeat, arguments.number, arguments.nameFilter)
+    output = json.dumps(results, indent = 2, sort_keys = True)
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            outputFile.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,54 @@ import copy
 import threading
 from pygestalt.utilities import notice
 
+class actionFuture(object):
+    """The eventual result of an operation that completes in another thread, such as an asynchronous transmission.
+    
+    The result can either be waited on, or handled by a callback once it becomes available.
+    """
+    def __init__(self):
+        self._resultLock_ = threading.Lock()
+        self._doneFlag_ = threading.Event()
+        self._result_ = None
+        self._doneCallbacks_ = []
+    
+    def done(self):
+        """Returns True if the result is available."""
+        return self._doneFlag_.is_set()
+    
+    def result(self, timeout = None):
+        """Blocks until the result is available, and returns it.
+        
+        timeout -- time in seconds to wait for the result. A timeout of None means to wait indefinitely.
+        
+        Returns the result, or None on timeout.
+        """
+        self._doneFlag_.wait(timeout)
+        return self._result_
+    
+    def addDoneCallback(self, callback):
+        """Calls callback(future) once the result is available, or immediately if it already is.
+        
+        The callback is run in whichever thread sets the result.
+        """
+        with self._resultLock_:
+            if not self._doneFlag_.is_set():
+                self._doneCallbacks_ += [callback]
+                return
+        callback(self)
+    
+    def setResult(self, result):
+        """Sets the result and runs any callbacks. Returns False if the result was already set, otherwise True."""
+        with self._resultLock_:
+            if self._doneFlag_.is_set(): return False
+            self._result_ = result
+            self._doneFlag_.set()
+            doneCallbacks, self._doneCallbacks_ = self._doneCallbacks_, []
+        for callback in doneCallbacks:
+            callback(self)
+        return True
+
+
 class actionObject(object):
     """A token that embodies the logic behind packet generation.
     
@@ -31,6 +79,7 @@ class actionObject(object):
     _inboundPacketFlagQueue_ = None  #Note that this flag is set dynamically, so need to be careful about which instance is monitoring it.
     _outboundTemplate_ = None
     _inboundTemplate_ = None
+    _lazyDecode_ = False    #if True, inbound packets are decoded into a packets.lazyDecodeDict, which only decodes tokens as they are accessed.
     _baseActionObject_ = None
     virtualNode = None
     
@@ -76,6 +125,11 @@ class actionObject(object):
         
         self._inboundPacketFlag_ = threading.Event()
         
+        self._callbackLock_ = threading.Lock()  #guards the callback lists below against flags being set from another thread
+        self._clearForReleaseCallbacks_ = []    #called once the actionObject is cleared for release, e.g. by an event-driven interface
+        self._channelAccessCallbacks_ = []  #called on channel access, e.g. by transmitAsync
+        self._inboundPacketCallbacks_ = []  #called when a reply is received, e.g. by transmitUntilResponseAsync
+        
     def init(self, *args, **kwargs):    #user initialization routine. This should get overridden by the subclass.
         """actionObject subclass's initialization routine.
         
@@ -92,7 +146,7 @@ class actionObject(object):
     
     def getPacket(self):
         """Returns the decoded inbound packet, or None if no inbound packet has been received."""
-        if self._inboundPacketDictionary_ == {}:
+        if len(self._inboundPacketDictionary_) == 0:    #avoids comparing against {}, which would fully decode a lazily decoded packet
             return None
         else:
             return copy.copy(self._inboundPacketDictionary_)
@@ -106,7 +160,7 @@ class actionObject(object):
         
         serializedPacket -- a packets.serializedPacket object containing a serial byte sequence that should be decoded and stored.
         """
-        self._inboundPacketDictionary_ = self._inboundTemplate_.decode(serializedPacket)[0]    #decodes serializedPacket using _inboundTemplate_
+        self._inboundPacketDictionary_ = self._inboundTemplate_.decode(serializedPacket, lazy = self._lazyDecode_)[0]    #decodes serializedPacket using _inboundTemplate_
         return True
 
     def commit(self):
@@ -124,13 +178,55 @@ class actionObject(object):
         
         Note that the actual release procedure is performed by the channel priority thread.
         """
-        self._clearForReleaseFlag_.set() #set the clear to release flag
+        self._setFlagAndRunCallbacks_(self._clearForReleaseFlag_, self._clearForReleaseCallbacks_) #set the clear to release flag
         return True
     
     def _isClearForRelease_(self):
         """Returns True if the actionObject has been cleared for release from the channel priority queue."""
         return self._clearForReleaseFlag_.is_set()
     
+    def _waitForClearForRelease_(self, timeout = None):
+        """Blocks until the actionObject has been cleared for release from the channel priority queue, or until timeout.
+        
+        timeout -- time in seconds to wait. A timeout of None means to wait indefinitely.
+        
+        Returns True if the actionObject is clear for release, and False on timeout.
+        """
+        return self._clearForReleaseFlag_.wait(timeout)
+    
+    def _whenClearedForRelease_(self, callback):
+        """Calls callback() once the actionObject has been cleared for release, or immediately if it already has been."""
+        self._addFlagCallback_(self._clearForReleaseFlag_, self._clearForReleaseCallbacks_, callback)
+    
+    def _whenChannelAccessGranted_(self, callback):
+        """Calls callback() once the actionObject has been granted channel access, or immediately if it already has been."""
+        self._addFlagCallback_(self._channelAccessGrantedFlag_, self._channelAccessCallbacks_, callback)
+    
+    def _whenPacketReceived_(self, callback):
+        """Calls callback() once a reply has been received, or immediately if one already has been."""
+        self._addFlagCallback_(self._inboundPacketFlag_, self._inboundPacketCallbacks_, callback)
+    
+    def _signalInboundPacket_(self):
+        """Sets the inbound packet flag, and runs any callbacks that are waiting on a reply."""
+        self._setFlagAndRunCallbacks_(self._inboundPacketFlag_, self._inboundPacketCallbacks_)
+    
+    def _addFlagCallback_(self, flag, callbacks, callback):
+        """Adds a callback to a list, to be called once when flag is set. If flag is already set, the callback is called immediately."""
+        with self._callbackLock_:
+            if not flag.is_set():
+                callbacks += [callback]
+                return
+        callback()
+    
+    def _setFlagAndRunCallbacks_(self, flag, callbacks):
+        """Sets flag, and then calls and removes each of the callbacks that were waiting on it."""
+        with self._callbackLock_:
+            flag.set()
+            pendingCallbacks = list(callbacks)
+            del callbacks[:]
+        for callback in pendingCallbacks:
+            callback()
+    
     def _grantChannelAccess_(self, channelAccessLock = None):
         """Grants the actionObject access to its interface's transmission channel.
         
@@ -141,7 +237,7 @@ class actionObject(object):
         """
         self._channelAccessLock_ = channelAccessLock    #store a ref to the channel access lock
         self.onChannelAccess()  #call the user-defined onChannelAccess method
-        self._channelAccessGrantedFlag_.set()   #set the channel access flag, to indicate to another thread that the actionObject has channel access
+        self._setFlagAndRunCallbacks_(self._channelAccessGrantedFlag_, self._channelAccessCallbacks_)   #set the channel access flag, to indicate to another thread that the actionObject has channel access
     
     def channelAccessIsGranted(self):
         """Returns True if the actionObject currently has interface channel access."""
@@ -227,6 +323,83 @@ class actionObject(object):
                 return False
         return True        
     
+    def transmitAsync(self, mode = 'unicast', releaseChannelOnTransmit = True):
+        """Transmits packet on the virtualNode's interface without blocking the calling thread.
+        
+        mode -- the transmission mode, either 'unicast to direct at a single node, or 'multicast' to direct at all nodes.
+        releaseChannelOnTransmit -- If True (default), will automatically release the actionObject's channel lock after transmission
+        
+        The packet is transmitted by the interface once the actionObject is granted channel access.
+        
+        Returns a core.actionFuture, whose result is True once the packet has been transmitted.
+        """
+        transmitFuture = actionFuture()
+        def transmitOnChannelAccess():
+            self._putActionObjectIntoInboundPacketFlagQueue_(self)  #put a reference to self in the inbound packet flag queue
+            self.virtualNode._interface_.transmit(actionObject = self, mode = mode)  #pass actionObject to interface for transmission
+            if releaseChannelOnTransmit:  #check if should release the channel lock after transmission
+                self._releaseChannelAccessLock_()  #release the channel access lock
+            transmitFuture.setResult(True)
+        self._whenChannelAccessGranted_(transmitOnChannelAccess)
+        self._releaseForTransmission_()
+        return transmitFuture
+    
+    def transmitUntilResponseAsync(self, timeout = 0.2, mode = 'unicast', attempts = 10, releaseChannelOnTransmit = True):
+        """Persistently transmits until a response is received from the node, without blocking the calling thread.
+        
+        Arguments are the same as for transmitUntilResponse. Reply timeouts are timed by the interface's _callLater_ method.
+        
+        Returns a core.actionFuture, whose result is True once a response is received, or False if every attempt timed out.
+        """
+        responseFuture = actionFuture()
+        exchangeState = {'attempt':0, 'timer':None, 'settled':False}    #shared between the callbacks below, which may run in different threads
+        exchangeLock = threading.Lock()
+        interface = self.virtualNode._interface_
+        
+        def transmitAttempt():
+            with exchangeLock:
+                if exchangeState['settled']: return
+                exchangeState['attempt'] += 1
+            self._putActionObjectIntoInboundPacketFlagQueue_(self)  #put a reference to self in the inbound packet flag queue
+            interface.transmit(actionObject = self, mode = mode)
+            with exchangeLock:
+                if not exchangeState['settled']: exchangeState['timer'] = interface._callLater_(timeout, onTimeout)
+        
+        def onResponse():
+            with exchangeLock:
+                if exchangeState['settled']: return
+                exchangeState['settled'] = True
+                if exchangeState['timer']: exchangeState['timer'].cancel()
+            self._inboundPacketFlag_.clear()    #clear the flag, as waitForResponse would
+            if releaseChannelOnTransmit: self._releaseChannelAccessLock_()   #release access to the channel
+            responseFuture.setResult(True)
+        
+        def onTimeout():
+            with exchangeLock:
+                if exchangeState['settled']: return
+                thisAttempt = exchangeState['attempt']
+                if thisAttempt >= attempts: exchangeState['settled'] = True
+            if thisAttempt < attempts:
+                notice(self, "Could not reach virtual node. Retrying (#" + str(thisAttempt+1) + "/"+str(attempts)+")")
+                transmitAttempt()
+            else:   #could not reach node
+                notice(self, "Unable to reach virtual node after " + str(attempts) + " attempts.")
+                self._releaseChannelAccessLock_()   #release access to the channel
+                responseFuture.setResult(False)
+        
+        self._inboundPacketFlag_.clear()    #only replies to this exchange count
+        self._whenPacketReceived_(onResponse)
+        self._whenChannelAccessGranted_(transmitAttempt)
+        self._releaseForTransmission_()
+        return responseFuture
+    
+    def _releaseForTransmission_(self):
+        """Commits the actionObject and clears it for release, if it hasn't been already, so that it will be granted channel access."""
+        if not self._isCommitted_():    #check if actionObject is already committed
+            self.commit()   #commit actionObject to channel priority queue
+        if not self._isClearForRelease_():   #check if actionObject is cleared for release from the channel priority queue
+            self.clearForRelease()  #clear actionObject for release from the channel priority queue
+    
     def transmitUntilResponse(self, timeout = 0.2, mode = 'unicast', attempts = 10, releaseChannelOnTransmit = True):
         """Persistently transmits until a response is received from the node.
         
@@ -11,20 +11,32 @@ import copy
 import random   #for generating new addresses
 import serial
 import os, platform
+import select, errno
+try:
+    import fcntl
+except ImportError:
+    fcntl = None    #fcntl is only available on POSIX systems, and is only required by the event-driven interfaces
+import collections, heapq, itertools, traceback
 from pygestalt import core, packets, utilities, config
 from pygestalt.utilities import notice, debugNotice
 
+shutdownSentinel = object() #placed into the queue of an interface thread to wake it up and signal it to exit
+
 class baseInterface(object):
     """The base class for all interfaces in the Gestalt framework."""
     
     def start(self):
         """Start method should be overriden by derived class."""
         pass
+    
+    def stop(self):
+        """Stop method should be overriden by derived class."""
+        pass
 
 class serialInterface(baseInterface):
     """The base class for all serial port interfaces."""
     
-    def __init__(self, port = None, baudrate = None, interfaceType = None, name = None, timeout = 0.1, flowControl = None):
+    def __init__(self, port = None, baudrate = None, interfaceType = None, name = None, timeout = 0.1, flowControl = None, maxWriteSize = 4096, maxWriteDelay = 0):
         """Initializes a serial communications port.
         
         port -- the system name of the port, e.g. 'tty.usbserial*' on a Mac, or 'COM0' on Windows
@@ -33,6 +45,9 @@ class serialInterface(baseInterface):
         name -- an optional name to provide to the interface
         timeout -- receiver timeout in seconds before returning '' if no data has been received
         flowControl -- TBD, can be used to enable hardware flow control, or to bring an Arduino into reset, once implemented.
+        maxWriteSize -- the transmitter combines queued packets into a single write of up to this many bytes. Larger packets are written on their own.
+        maxWriteDelay -- time in seconds that the transmitter may hold onto a packet while waiting for more packets to combine with it. Default
+                         is 0, in which case only the packets that are already queued are combined.
         
         Note that the interface will not connect until a call to the start method is made. This is to allow for default interface objects to be created without them auto-connecting.
         """
@@ -50,11 +65,12 @@ class serialInterface(baseInterface):
         self._name_ = name
         self.timeout = timeout
         self.flowControl = flowControl
+        self.maxWriteSize = maxWriteSize
+        self.maxWriteDelay = maxWriteDelay
         
         self.port = False    #the currently connected port, False if not connected
         self.isConnectedFlag = threading.Event()    #keeps track of current status of interface
         self.isStartedFlag = threading.Event()  #keeps track of whether the interface has been started (connected and the transmitter thread running)
-        self._threadIdleTime_ = 0.0005  #seconds, time for thread to idle between runs of loop
         self._portReconnectTime_ = 5    #seconds, time between attempts to reconnect to a down port.
         
     def updateBaudrateIfDefault(self, newBaudrate):
@@ -79,6 +95,20 @@ class serialInterface(baseInterface):
             self.transmitter = self.startTransmitter()
             self.isStartedFlag.set()    #flag that interface is started up.
     
+    def stop(self, timeout = 1.0):
+        """Stops the transmitter thread and disconnects the interface from its hardware port.
+        
+        timeout -- time in seconds to wait for the transmitter to finish writing any queued packets.
+        
+        Returns True if the transmitter thread exited within the timeout period, otherwise False.
+        """
+        if not self.isStarted(): return True
+        self.transmitter.stop()
+        if self.transmitter is not threading.current_thread(): self.transmitter.join(timeout)
+        self.disconnect()
+        self.isStartedFlag.clear()
+        return not self.transmitter.is_alive()
+    
     @staticmethod
     def combineSearchStrings(searchStringDictionaries):
         """Combines a series of search string dictionaries.
@@ -310,7 +340,7 @@ class serialInterface(baseInterface):
     def transmit(self, packet):
         """Transmits a packet over the serial interface.
         
-        packet -- the packets.serializedPacket to be transmitted
+        packet -- the packets.serializedPacket or packets.serializedBuffer to be transmitted
         """
         if not self.isStarted():    #if a transmit request is made but the interface isn't started yet, go ahead and start it up.
             self.start()
@@ -338,6 +368,40 @@ class serialInterface(baseInterface):
         else:
             return None
     
+    def receiveChunk(self, maxBytes = 4096):
+        """Reads all bytes waiting in the serial port input buffer, up to maxBytes.
+        
+        maxBytes -- the maximum number of bytes to return.
+        
+        If no bytes are waiting, blocks until the first byte arrives or the port times out, and then also reads any bytes that arrived along
+        with it. This lets a receiver thread process incoming data a chunk at a time rather than a byte at a time, while still waiting on the
+        port when idle.
+        
+        Returns a string of received bytes, '' if nothing was received before the timeout period, or None if the port is disconnected.
+        """
+        if self.isConnected():
+            try:
+                waitingBytes = self.bytesWaiting()
+                if waitingBytes: return self.port.read(size = min(waitingBytes, maxBytes))
+                receivedBytes = self.port.read(size = 1)    #wait for the next byte to arrive
+                if receivedBytes and maxBytes > 1:
+                    waitingBytes = self.bytesWaiting()
+                    if waitingBytes: receivedBytes += self.port.read(size = min(waitingBytes, maxBytes - 1))
+                return receivedBytes
+            except: #likely that port closed while waiting to receive
+                notice(self, "Lost connection to serial port " + str(self.portPath))
+                self.isConnectedFlag.clear()    #mark that port is closed. It will need to be reopened by the transmit thread.
+                return None
+        else:
+            return None
+    
+    def bytesWaiting(self):
+        """Returns the number of bytes waiting in the serial port input buffer."""
+        try:
+            return self.port.in_waiting
+        except AttributeError:  #pyserial versions prior to 3.0
+            return self.port.inWaiting()
+    
     def startTransmitter(self):
         """Starts up the transmitter thread.
         
@@ -358,46 +422,121 @@ class serialInterface(baseInterface):
             threading.Thread.__init__(self) #initialize threading parent class
             self.interface = interface  #a reference to serialInterface instance
             self.transmitQueue = Queue.Queue()  #Use a queue to permit background transmission, and to allow multiple threads to access the interface.
+            self.stopFlag = threading.Event()   #set to signal the thread to exit
+            self.shutdownReceived = False   #set once the shutdown sentinel has been pulled from the queue
+            self.heldPacket = None  #a packet that didn't fit in the last write, and so starts the next one
+            self.writeBuffer = bytearray()  #reused to combine packets into a single write
+            self.writeCount = 0 #number of writes made to the port
+            self.packetCount = 0    #number of packets written to the port
         
         def run(self):
             """Transmitter thread loop.
             
-            New in this version of Gestalt, the thread attempts to reconnect to a port if connection is lost.
+            New in this version of Gestalt, the thread attempts to reconnect to a port if connection is lost. While connected, the thread
+            blocks on the transmit queue until a packet arrives, rather than polling it, and then writes it to the port along with any other
+            packets gathered by gatherPackets. The wait on the queue times out every _portReconnectTime_ seconds, so that a connection lost
+            while the queue is empty is still noticed and the port reconnected.
             """
             while True:
                 if self.interface.isConnected():    #check to make sure that the interface is connected
-                    pending, packet = self.getPacketFromTransmitQueue() #try to get packet from the queue
-                    if pending:
-                        try:
-                            self.interface.port.write(packet.toString())
-                        except: #IF THIS EXCEPTS, MIGHT WANT TO ADD A WAY TO RETRANSMIT THE PACKET. GETS HAIRY.
-                            self.interface.isConnectedFlag.clear() #port is no longer connected
-                            notice(self.interface, "Lost connection to serial port " + str(self.interface.portPath))
-                    time.sleep(self.interface._threadIdleTime_) #idle
+                    packetsToWrite = self.gatherPackets()
+                    if packetsToWrite: self.writePackets(packetsToWrite)
+                    if self.shutdownReceived: break
                 else:   #port isn't connected, attempt to reconnect
-                    time.sleep(self.interface._portReconnectTime_)
+                    if self.stopFlag.wait(self.interface._portReconnectTime_): break
                     self.interface.connect()    #attempt to reconnect         
         
-        def getPacketFromTransmitQueue(self):
+        def gatherPackets(self):
+            """Waits for a packet to arrive in the transmit queue, and gathers any other packets that can be written along with it.
+            
+            Packets are gathered in the order that they were queued, until either the queue is empty or the next packet would bring the total
+            beyond the interface's maxWriteSize. If the interface has a maxWriteDelay, the thread waits up to that long after the first packet
+            for more packets to arrive.
+            
+            Returns a list of packets, which is empty if the interface was disconnected while waiting for the first packet.
+            """
+            if self.heldPacket != None:
+                packet, self.heldPacket = self.heldPacket, None
+            else:
+                while True:
+                    pending, packet = self.getPacketFromTransmitQueue(block = True, timeout = self.interface._portReconnectTime_) #wait for a packet to arrive in the queue
+                    if pending: break
+                    if not self.interface.isConnected(): return []  #connection was lost while waiting, return to the run loop to reconnect
+            gatheredPackets = []
+            gatheredSize = 0
+            writeDeadline = None
+            while True:
+                if packet is shutdownSentinel:
+                    self.shutdownReceived = True
+                    break
+                if gatheredPackets and gatheredSize + len(packet) > self.interface.maxWriteSize:    #packet doesn't fit, so starts the next write
+                    self.heldPacket = packet
+                    break
+                gatheredPackets += [packet]
+                gatheredSize += len(packet)
+                pending, packet = self.getPacketFromTransmitQueue()
+                if pending: continue
+                if self.interface.maxWriteDelay <= 0: break
+                if writeDeadline == None: writeDeadline = time.time() + self.interface.maxWriteDelay
+                remainingDelay = writeDeadline - time.time()
+                if remainingDelay <= 0: break
+                try:
+                    packet = self.transmitQueue.get(timeout = remainingDelay)   #wait a little while for another packet to combine with the others
+                except Queue.Empty:
+                    break
+            return gatheredPackets
+        
+        def writePackets(self, packetsToWrite):
+            """Writes a list of packets to the port in a single write, and releases any pooled buffers.
+            
+            packetsToWrite -- a list of packets.serializedPacket or packets.serializedBuffer objects, in the order they should be written.
+            """
+            if len(packetsToWrite) == 1:    #nothing to combine
+                packet = packetsToWrite[0]
+                if type(packet) == packets.serializedBuffer: writeData = packet   #buffers are written directly, without conversion to a string
+                else: writeData = packet.toString()
+            else:
+                writeData = self.writeBuffer
+                del writeData[:]
+                for packet in packetsToWrite: writeData.extend(packet)
+            try:
+                self.interface.port.write(writeData)
+                self.writeCount += 1
+                self.packetCount += len(packetsToWrite)
+            except: #IF THIS EXCEPTS, MIGHT WANT TO ADD A WAY TO RETRANSMIT THE PACKET. GETS HAIRY.
+                self.interface.isConnectedFlag.clear() #port is no longer connected
+                notice(self.interface, "Lost connection to serial port " + str(self.interface.portPath))
+            for packet in packetsToWrite:
+                if type(packet) == packets.serializedBuffer: packet.release()    #return pooled buffers for reuse
+        
+        def stop(self):
+            """Signals the transmitter thread to exit once it has written any packets that are already queued."""
+            self.stopFlag.set()
+            self.transmitQueue.put(shutdownSentinel)    #wakes up the thread if it is waiting on the queue
+        
+        def getPacketFromTransmitQueue(self, block = False, timeout = None):
             """Attempts to pull a packet from the transmit queue.
             
+            block -- if True, waits until a packet is available.
+            timeout -- if blocking, the maximum time in seconds to wait for a packet. If None, waits indefinitely.
+            
             Returns (True, packet) if data is waiting in the queue to be transmitted, or (False, None) if not.
             """
             try:
-                return True, self.transmitQueue.get(block = False)    #signal success, return packet
+                return True, self.transmitQueue.get(block = block, timeout = timeout)    #signal success, return packet
             except Queue.Empty:
                 return False, None  #signal failure, return None  
         
         def putPacketInTransmitQueue(self, packet):
             """Puts a packet in the transmit queue.
             
-            packet -- a packet of type packets.serializedPacket
+            packet -- a packet of type packets.serializedPacket or packets.serializedBuffer
             """
-            if type(packet) == packets.serializedPacket:
+            if type(packet) == packets.serializedPacket or type(packet) == packets.serializedBuffer:
                 self.transmitQueue.put(packet)
                 return False
             else:
-                notice(self.interface, "Can only place packets.serializedPacket objects in the transmitter queue. Instead received type "+ str(type(packet)))
+                notice(self.interface, "Can only place packets.serializedPacket or packets.serializedBuffer objects in the transmitter queue. Instead received type "+ str(type(packet)))
                 return False      
         
 class gestaltInterface(baseInterface):
@@ -422,7 +561,7 @@ class gestaltInterface(baseInterface):
         self._shellNodeTable_ = {}          #maintains associations between virtual node shells and their contained nodes
         self._addressRangeMin_ = 1          #Reserve address 0.
         self._addressRangeMax_ = 65535      #maximum address value for gestalt nodes is 16-bit.
-        self._threadIdleTime_ = 0.0005      #seconds, time for thread to idle between runs of loop
+        self._bufferPool_ = packets.bufferPool(maxBuffers = 64)    #outgoing packets are encoded into pooled buffers, which the transmitter releases once written
         
         self._gestaltPacket_ = packets.template('gestaltPacketTemplate',
                                               packets.unsignedInt('_startByte_',1), #start byte, 72 for unicast, 138 for multicast
@@ -578,6 +717,24 @@ class gestaltInterface(baseInterface):
         self._syntheticResponse_ = self._startThreadAsDaemon_(self._syntheticResponseThread_)
         self._receiver_ = self._startThreadAsDaemon_(self._receiveThread_)
         self._packetRouter_ = self._startThreadAsDaemon_(self._packetRouterThread_)
+    
+    def stop(self, timeout = 1.0):
+        """Stops the interface threads, followed by the downstream interface.
+        
+        timeout -- time in seconds to wait for the threads to exit. Each thread exits once it has finished with whatever is already in its queue,
+                   but the channel access thread can't exit while an actionObject holds the channel.
+        
+        Returns True if all threads exited within the timeout period, otherwise False.
+        """
+        interfaceThreads = [self._channelPriority_, self._channelAccess_, self._syntheticResponse_, self._receiver_, self._packetRouter_]
+        for interfaceThread in interfaceThreads:
+            interfaceThread.stop()
+        stopTime = time.time() + timeout
+        for interfaceThread in interfaceThreads:
+            if interfaceThread is not threading.current_thread():   #e.g. stop was called from an onReceive method in the packet router thread
+                interfaceThread.join(max(stopTime - time.time(), 0))
+        if self._interface_: self._interface_.stop()    #stop the downstream interface once the receiver is no longer reading from it
+        return not any([interfaceThread.is_alive() for interfaceThread in interfaceThreads if interfaceThread is not threading.current_thread()])
 
 
     def _startThreadAsDaemon_(self, threadClass):
@@ -599,17 +756,25 @@ class gestaltInterface(baseInterface):
     class _interfaceThread_(threading.Thread):
         """A base class for all interface threads.
         
-        The only reason to make this custom base class is to accept and store a reference to the interface.
+        The base class accepts and stores a reference to the interface, and provides a stop method. Threads wait on their queues rather
+        than polling them, and so are woken up to exit by placing shutdownSentinel into the queue.
         """
         def __init__(self, interface):
             """Initializes thread and stores a reference to the interface."""
             threading.Thread.__init__(self)
             self.interface = interface
+            self.stopFlag = threading.Event()   #set to signal the thread to exit
+            self.threadQueue = None #the queue that the thread waits on, if any
             self.init()
         
         def init(self):
             """Dummy init function to be overriden by derived class."""
             pass
+        
+        def stop(self):
+            """Signals the thread to exit once it has finished with any items that are already in its queue."""
+            self.stopFlag.set()
+            if self.threadQueue != None: self.threadQueue.put(shutdownSentinel)    #wakes up the thread if it is waiting on the queue
     
     class _channelPriorityThread_(_interfaceThread_):
         """Manages actionObjects that are queued for release to the channel access thread.
@@ -623,6 +788,8 @@ class gestaltInterface(baseInterface):
         def init(self):
             """Initializes the channel priority thread."""
             self.channelPriorityQueue = Queue.Queue()   #create the channel priority queue
+            self.threadQueue = self.channelPriorityQueue
+            self.releaseCheckTime = 0.1 #seconds, time between checks for a stop request while waiting for an actionMolecule to be cleared for release
         
         def run(self):
             """The channel priority thread loop.
@@ -630,25 +797,26 @@ class gestaltInterface(baseInterface):
             This thread monitors the channel priority queue for a pending actionMolecule. Note that an actionMolecule can mean an object
             of type core.actionObject, but can also mean nested collections of actionObjects like sets and sequences. Once an actionMolecule
             has been cleared for release from the channel priority queue, it gets serialized into atomic actionObjects that are then released to the
-            channel access queue. 
+            channel access queue. If the thread is stopped while waiting for an actionMolecule to be cleared for release, it exits without
+            releasing it.
             """
-            while True: #repeat forever
-                pending, actionMolecule = self.getActionMolecule() #get the next actionObject (or actionSet, or actionSequence) from the queue.
-                if pending: #an actionMolecule is waiting in the queue
-                    while not actionMolecule._isClearForRelease_():    #wait for the actionMolecule to be cleared for release from the queue
-                        time.sleep(self.interface._threadIdleTime_)  #idle
-                    for actionObject in self.serializeActionMolecule(actionMolecule):   #serialize actionMolecule into actionObjects, and iterate over them
-                        self.releaseActionObject(actionObject)  #put actionObject into the channel access queue
-                else:
-                    time.sleep(self.interface._threadIdleTime_) #idle
+            while True: #repeat until stopped
+                pending, actionMolecule = self.getActionMolecule(block = True) #wait for the next actionObject (or actionSet, or actionSequence) in the queue.
+                if actionMolecule is shutdownSentinel: break
+                while not actionMolecule._waitForClearForRelease_(self.releaseCheckTime):    #wait for the actionMolecule to be cleared for release from the queue
+                    if self.stopFlag.is_set(): return
+                for actionObject in self.serializeActionMolecule(actionMolecule):   #serialize actionMolecule into actionObjects, and iterate over them
+                    self.releaseActionObject(actionObject)  #put actionObject into the channel access queue
                 
-        def getActionMolecule(self):
+        def getActionMolecule(self, block = False):
             """Attempts to pull an actionMolecule from the channel priority queue.
             
+            block -- if True, waits until an actionMolecule is available.
+            
             Returns (True, actionMolecule) if an actionMolecule was waiting in the queue, or (False, None) if not.
             """
             try:
-                return True, self.channelPriorityQueue.get(block = False)    #signal success, return actionMolecule
+                return True, self.channelPriorityQueue.get(block = block)    #signal success, return actionMolecule
             except Queue.Empty:
                 return False, None  #signal failure, return None
         
@@ -671,12 +839,14 @@ class gestaltInterface(baseInterface):
             self.interface._channelAccess_.putActionObject(actionObject)
             return True
         
-        def serializeActionMolecule(self, actionMolecule):
+        @staticmethod
+        def serializeActionMolecule(actionMolecule):
             """Serializes an actionMolecule into a sequence of actionObjects.
             
             actionMolecules are comprised of various actionObject-containing structures to support multi-packet operations
             and synchronized packet execution. This function breaks apart these structures and serializes the contained
-            actionObjects into the sequence in which they should be transmitted over the channel.
+            actionObjects into the sequence in which they should be transmitted over the channel. It is shared with the channel
+            priority task of eventGestaltInterface.
             """
             return [actionMolecule]   #for now nothing fancy, assume only actionObjects are used.
     
@@ -687,6 +857,16 @@ class gestaltInterface(baseInterface):
         """
         self._channelPriority_.putActionMolecule(actionMolecule)
     
+    def _callLater_(self, delay, callback):
+        """Calls callback() from another thread after delay seconds, e.g. to time out a reply.
+        
+        Returns an object whose cancel method prevents the call, if it hasn't yet been made.
+        """
+        timer = threading.Timer(delay, callback)
+        timer.daemon = True
+        timer.start()
+        return timer
+    
     class _channelAccessThread_(_interfaceThread_):
         """Manages actionObjects that are waiting for access to the interface channel.
         
@@ -696,6 +876,7 @@ class gestaltInterface(baseInterface):
         def init(self):
             """Initialization routine for the channel access thread."""
             self.channelAccessQueue = Queue.Queue() #instantiate a queue for holding actionObjects awaiting channel access.
+            self.threadQueue = self.channelAccessQueue
             self.channelAccessLock = threading.Lock()   #creates a lock object used to hand off access to an actionObject
             self.channelAccessLock.acquire()    #lock the lock object
         
@@ -713,20 +894,20 @@ class gestaltInterface(baseInterface):
             initiated by a call in this thread to the actionObject's grantAccess function.
             """
             while True:
-                pending, actionObject = self.getActionObject()  #get the next action object from the queue
-                if pending:
-                    self.grantChannelAccess(actionObject)      #grant channel access to the actionObject
-                    self.channelAccessLock.acquire()    #wait for actionObject to release the channel before continuing
-                else:
-                    time.sleep(self.interface._threadIdleTime_) #idle
+                pending, actionObject = self.getActionObject(block = True)  #wait for the next action object in the queue
+                if actionObject is shutdownSentinel: break
+                self.grantChannelAccess(actionObject)      #grant channel access to the actionObject
+                self.channelAccessLock.acquire()    #wait for actionObject to release the channel before continuing
         
-        def getActionObject(self):
+        def getActionObject(self, block = False):
             """Attempts to pull an actionObject from the channel access queue.
             
+            block -- if True, waits until an actionObject is available.
+            
             Returns (True, actionObject) if an actionObject was waiting in the queue, or (False, None) if not.
             """
             try:
-                return True, self.channelAccessQueue.get(block = False)    #signal success, return actionObject
+                return True, self.channelAccessQueue.get(block = block)    #signal success, return actionObject
             except Queue.Empty:
                 return False, None  #signal failure, return None            
             
@@ -777,18 +958,24 @@ class gestaltInterface(baseInterface):
         except:
             notice(self, "Transmission mode '" + str(mode) + "' is not valid.")
             return False
-        packetEncodeDictionary = {'_startByte_':startByte, '_address_':address, '_port_':port, '_payload_':payload} #establish the encode dictionary
-        encodedPacket = self._gestaltPacket_.encode(packetEncodeDictionary) #encode the complete outgoing packet
-        
-        actionObjectName = type(actionObject).__name__
-        debugNotice(None, 'comm', "--- OUTGOING PACKET FROM '" + actionObjectName + "' ---", padding = True)
-        debugNotice(None, 'comm', mode.upper() +" To Address " + str(utilities.unsignedIntegerToBytes(address, 2)) + " on Port "+ str(port))
-        debugNotice(None, 'comm', "ENCODED AS " + str(encodedPacket))
-        
-        if actionObject.virtualNode._isInSyntheticMode_():   #return a synthetic response
+        framePrefix = self._gestaltPacket_.getFramePrefix({'_startByte_':startByte, '_address_':address, '_port_':port})  #start byte, address, and port are pre-encoded per node and port
+        syntheticMode = actionObject.virtualNode._isInSyntheticMode_()
+        if syntheticMode: packetBuffer = None   #the synthetic response holds onto views into the packet, so it can't be pooled
+        else: packetBuffer = self._bufferPool_.acquire(self._gestaltPacket_)
+        encodedPacket = framePrefix.encodeBuffer({'_payload_':payload}, packetBuffer) #encode the complete outgoing packet into a single buffer
+        
+        if config.verboseDebug() and config.debugChannelEnabled('comm'):    #skip formatting the notices unless they will be printed
+            actionObjectName = type(actionObject).__name__
+            debugNotice(None, 'comm', "--- OUTGOING PACKET FROM '" + actionObjectName + "' ---", padding = True)
+            debugNotice(None, 'comm', mode.upper() +" To Address " + str(utilities.unsignedIntegerToBytes(address, 2)) + " on Port "+ str(port))
+            debugNotice(None, 'comm', "ENCODED AS " + str(encodedPacket.toList()))
+        
+        if syntheticMode:   #return a synthetic response
             return self._syntheticResponse_.putInSyntheticQueue(encodedPacket = encodedPacket, syntheticResponseFunction = actionObject._synthetic_)
         else:   #not running in synthetic mode, so pass along the packet to the transmitter
-            return self._interface_.transmit(encodedPacket)
+            if self._interface_.transmit(encodedPacket): return True
+            encodedPacket.release() #packet wasn't queued, so won't be released by the transmitter
+            return False
             
         
     class _syntheticResponseThread_(_interfaceThread_):
@@ -807,31 +994,25 @@ class gestaltInterface(baseInterface):
         def init(self):
             """Synthetic node thread initialization method."""
             self.syntheticResponseQueue = Queue.Queue()
+            self.threadQueue = self.syntheticResponseQueue
         
         def run(self):
             """Synthetic response thread loop."""
             while True:
-                pending, syntheticTuple = self.getSyntheticTuple()  #get from the queue the next tuple containing information to generate a synthetic packet
-                if pending: #a tuple was waiting
-                    #TODO: handle multicast packets
-                    encodedOutboundPacket, syntheticResponseFunction = syntheticTuple   #break apart stored tuple
-                    decodedOutboundPacket = self.interface._gestaltPacket_.decode(encodedOutboundPacket)[0]    #decode the outgoing packet
-                    outboundPayload = decodedOutboundPacket['_payload_']  #get the outbound payload from the decoded outbound packet
-                    syntheticInboundPayload = syntheticResponseFunction(outboundPayload) #generate an encoded inbound payload
-                    if syntheticInboundPayload != None: #a synthetic payload was provided by the node
-                        decodedSyntheticInboundPacket = copy.copy(decodedOutboundPacket)    #make a copy of the decoded outbound packet to use as an inbound packet
-                        decodedSyntheticInboundPacket.update({'_payload_':syntheticInboundPayload}) #swap the outbound payload for the new synthetized payload
-                        self.interface._packetRouter_.putDecodedPacket(decodedSyntheticInboundPacket)   #put the decoded inbound packet into the packet router queue
-                else:
-                    time.sleep(self.interface._threadIdleTime_) #idle
+                pending, syntheticTuple = self.getSyntheticTuple(block = True)  #wait for the next tuple containing information to generate a synthetic packet
+                if syntheticTuple is shutdownSentinel: break
+                encodedOutboundPacket, syntheticResponseFunction = syntheticTuple   #break apart stored tuple
+                self.interface._generateSyntheticResponse_(encodedOutboundPacket, syntheticResponseFunction)
 
-        def getSyntheticTuple(self):
+        def getSyntheticTuple(self, block = False):
             """Attempts to pull a tuple from the synthetic response queue.
             
+            block -- if True, waits until a tuple is available.
+            
             Returns (True, tuple) if a tuple was waiting in the queue, or (False, None) if not.
             """
             try:
-                return True, self.syntheticResponseQueue.get(block = False)    #signal success, return tuple
+                return True, self.syntheticResponseQueue.get(block = block)    #signal success, return tuple
             except Queue.Empty:
                 return False, None  #signal failure, return None            
             
@@ -845,94 +1026,65 @@ class gestaltInterface(baseInterface):
             return True
                  
     
+    def _generateSyntheticResponse_(self, encodedOutboundPacket, syntheticResponseFunction):
+        """Generates a synthetic inbound packet in response to an outbound packet, and passes it along to the packet router.
+        
+        encodedOutboundPacket -- a fully encoded packet just as it would be transmitted
+        syntheticResponseFunction -- the function that will be used to generate a synthetic response, typically of type actionObject._synthetic_
+        """
+        #TODO: handle multicast packets
+        decodedOutboundPacket = self._gestaltPacket_.decode(encodedOutboundPacket)[0]    #decode the outgoing packet
+        outboundPayload = decodedOutboundPacket['_payload_']  #get the outbound payload from the decoded outbound packet
+        syntheticInboundPayload = syntheticResponseFunction(outboundPayload) #generate an encoded inbound payload
+        if syntheticInboundPayload != None: #a synthetic payload was provided by the node
+            decodedSyntheticInboundPacket = copy.copy(decodedOutboundPacket)    #make a copy of the decoded outbound packet to use as an inbound packet
+            decodedSyntheticInboundPacket.update({'_payload_':syntheticInboundPayload}) #swap the outbound payload for the new synthetized payload
+            self._packetRouter_.putDecodedPacket(decodedSyntheticInboundPacket)   #put the decoded inbound packet into the packet router queue
+    
+    def _createStreamDecoder_(self):
+        """Returns a packets.streamDecoder that frames, validates, and decodes incoming gestalt packets."""
+        return packets.streamDecoder(self._gestaltPacket_, syncTokenName = '_startByte_', syncValues = (72, 138),
+                                     checksumName = '_checksum_')  #unicast and multicast start bytes
+    
     class _receiveThread_(_interfaceThread_):
         """Receives a incoming packet over the interface channel and when complete places the packet in the packet router queue."""
         
-        def resetReceiverState(self):
-            self.inProcessPacket = []    #initialize the currently received packet
-            self.packetReceiveState = 'waitingOnStartByte'
-            self.packetLength = 0
+        def init(self):
+            """Receiver thread initialization method."""
+            self.receiverReconnectTime = 0.1    #seconds, time to wait between checks for the downstream interface to be reconnected
         
-        def validateAndDecodeInProcessPacket(self):
-            """Validates and decodes self.inProcessPacket.
+        def run(self):
+            """Main receiver loop.
             
-            returns the decoded packet in dictionary format if successful, or False if validation or decoding were unsuccessful
+            Received bytes are fed into a packets.streamDecoder, which frames, validates, and decodes incoming gestalt packets. The decoded
+            payload of each packet is a view into the received packet buffer, rather than a copy. If the downstream interface provides a
+            receiveChunk method, bytes are received in chunks of whatever has arrived, rather than one at a time.
             """
-            packet = packets.serializedPacket(self.inProcessPacket)   #convert to a packets.serializedPacket object
-            if self.interface._gestaltPacket_.validateChecksum('_checksum_', packet): #checksum validates
-                decodedPacket = self.interface._gestaltPacket_.decode(packet)[0]
-                return decodedPacket
-            else:
-                return False
             
+            self.streamDecoder = self.interface._createStreamDecoder_()
             
-        def run(self):
-            """Main receiver loop."""
+            if not self.interface._interface_:  #no downstream interface exists, so there is nothing to receive
+                self.stopFlag.wait()
+                return
             
-            self.resetReceiverState()   #reset the receiver state
-            decodeIncompletePacket = self.interface._gestaltPacket_.decodeTokenInIncompletePacket #just a convenient alias to the gestalt packet's decodeIncompletePacket method
+            if hasattr(self.interface._interface_, 'receiveChunk'): receive = self.interface._interface_.receiveChunk
+            else: receive = self.interface._interface_.receive
             
-            while True:
-                if self.interface._interface_:  #a downstream interface exists
-                    receivedCharacter = self.interface._interface_.receive()    #will attempt to read in one character, but will return '' if nothing is avaliable after timeout period, or port is disconnected
-                else:
-                    time.sleep(self.interface._threadIdleTime_) #idle
-                    continue                    
-                if receivedCharacter:    #character was received
-                    receivedByte = ord(receivedCharacter)   #convert to an integer byte
-                    self.inProcessPacket += [receivedByte]
-                    if self.packetReceiveState == 'waitingOnStartByte': #waiting on the start byte
-                        success, startByte = decodeIncompletePacket('_startByte_', self.inProcessPacket)
-                        utilities.debugNotice(None, 'comm', "--- RECEIVER TRIGGERED ---", padding = True)
-                        if success: #could successfully decode start byte
-                            if (startByte == 72 or startByte == 138):   #start byte is valid
-                                utilities.debugNotice(None, 'comm', "Incoming " + {72:'UNICAST', 138:'MULTICAST'}[startByte] + " Packet")
-                                utilities.debugNotice(None, 'comm', "[Receiver State: waitingOnLengthByte]")
-                                utilities.debugNotice(None, 'comm', "HEADER: ["+ str(startByte) + ",", newLine = False)
-                                self.packetReceiveState = 'waitingOnLengthByte'   #put receiver in next state: wait for address to be received
-                                continue
-                            else:
-                                utilities.debugNotice(None, 'comm', "Start Byte " + str(startByte) + " Not Recognized")
-                                utilities.debugNotice(None, 'comm', "--- RECEIVER RESET ---")
-                                self.resetReceiverState() #reset the receiver state, and begin listening again
-                                continue
-                        else:   #haven't received the _startByte_ yet. In case for some reason _startByte_ ever becomes a two-byte word. Leaving this interpretation up to the packet.
-                            utilities.debugNotice(None, 'comm', "Start Byte Not Received Correctly")
-                            utilities.debugNotice(None, 'comm', "CONTINUING TO LISTEN...")
-                            continue
-                        
-                    elif self.packetReceiveState == 'waitingOnLengthByte': #waiting on the length
-                        utilities.debugNotice(None, 'comm', str(receivedByte)+",", newLine = False)
-                        success, length = decodeIncompletePacket('_length_', self.inProcessPacket)
-                        if success:
-                            utilities.debugNotice(None, 'comm', "]")
-                            utilities.debugNotice(None, 'comm', "[Receiver State: waitingToFinish]")
-                            utilities.debugNotice(None, 'comm', "PAYLOAD: [", newLine = False)
-                            self.packetReceiveState = 'waitingToFinish'
-                            self.packetLength = length + 1  #checksum byte is not included in the figure reported by the length token.
-                        continue
-                    
-                    elif self.packetReceiveState == 'waitingToFinish':
-                        if len(self.inProcessPacket) == self.packetLength:  #entire packet has been received
-                            utilities.debugNotice(None, 'comm', "]")
-                            utilities.debugNotice(None, 'comm', "CHECKSUM: " + str(receivedByte))
-                            decodedPacket = self.validateAndDecodeInProcessPacket()
-                            if decodedPacket: #packet validates against checksum
-                                utilities.debugNotice(None, 'comm', "PACKET RECEIVED SUCCESSFULLY")
-                                self.interface._packetRouter_.putDecodedPacket(decodedPacket)    #convert to packets.serializedPacket type and put the decoded packet in the router queue
-                                self.resetReceiverState()   #reset the receiver state
-                                continue
-                            else:   #packet didn't validate, reset the receiver and continue
-                                utilities.debugNotice(None, 'comm', "CHECKSUM DID NOT VALIDATE")
-                                utilities.debugNotice(None, 'comm', "--- RECEIVER RESET ---")
-                                self.resetReceiverState()
-                                continue
-                        else:   #haven't reached the end of the packet yet
-                            utilities.debugNotice(None, 'comm', str(receivedByte) + ",", newLine = False)
-                            continue
+            while not self.stopFlag.is_set():
+                receivedBytes = receive()    #will return whatever bytes are available, '' if nothing is avaliable after timeout period, or None if port is disconnected
+                if receivedBytes == None:   #port is disconnected, wait for the transmitter thread to reconnect it
+                    self.streamDecoder.reset()
+                    self.stopFlag.wait(self.receiverReconnectTime)
+                elif receivedBytes:    #bytes were received
+                    framesRejected = self.streamDecoder.framesRejected
+                    for decodedPacket in self.streamDecoder.feed(receivedBytes):
+                        utilities.debugNotice(None, 'comm', "PACKET RECEIVED SUCCESSFULLY")
+                        self.interface._packetRouter_.putDecodedPacket(decodedPacket)    #put the decoded packet in the router queue
+                    if self.streamDecoder.framesRejected != framesRejected:
+                        utilities.debugNotice(None, 'comm', "CHECKSUM DID NOT VALIDATE")
+                        utilities.debugNotice(None, 'comm', "--- RECEIVER RESET ---")
                 else:   #receiver timed out, reset state
-                    self.resetReceiverState()
-                    time.sleep(self.interface._threadIdleTime_) #idle
+                    self.streamDecoder.reset()
                             
                         
     def _getVirtualNodeFromAddress_(self, address):
@@ -946,6 +1098,17 @@ class gestaltInterface(baseInterface):
             return False    #address does not map to a node, return False
         
 
+    def _routeDecodedPacket_(self, decodedPacket):
+        """Routes a decoded inbound packet to its destination virtual node.
+        
+        decodedPacket -- the decoded packet dictionary.
+        """
+        destinationAddress = decodedPacket['_address_']
+        destinationPort = decodedPacket['_port_']
+        payload = decodedPacket['_payload_']
+        virtualNode = self._getVirtualNodeFromAddress_(destinationAddress)    #look up virtual node that matches the packet's address
+        virtualNode._routeInboundPacket_(port = destinationPort, packet = payload) #call the virtual node's packet router method
+
     class _packetRouterThread_(_interfaceThread_):
         """Routes incoming packets to their destination virtual node.
         
@@ -957,6 +1120,7 @@ class gestaltInterface(baseInterface):
         def init(self):
             """Packet router thread initialization method."""
             self.routerQueue = Queue.Queue()    #create a packet router queue.
+            self.threadQueue = self.routerQueue
         
         def run(self):
             """Packet router loop.
@@ -964,15 +1128,9 @@ class gestaltInterface(baseInterface):
             Note that inbound packets are pulled from the queue already decoded (this was done in the receive thread to validate the checksum).
             """
             while True:
-                pending, decodedPacket = self.getDecodedPacket()  #get the next decoded packet from the queue
-                if pending: #a packet was waiting
-                    destinationAddress = decodedPacket['_address_']
-                    destinationPort = decodedPacket['_port_']
-                    payload = decodedPacket['_payload_']
-                    virtualNode = self.interface._getVirtualNodeFromAddress_(destinationAddress)    #look up virtual node that matches the packet's address
-                    virtualNode._routeInboundPacket_(port = destinationPort, packet = payload) #call the virtual node's packet router method
-                else:
-                    time.sleep(self.interface._threadIdleTime_) #idle
+                pending, decodedPacket = self.getDecodedPacket(block = True)  #wait for the next decoded packet in the queue
+                if decodedPacket is shutdownSentinel: break
+                self.interface._routeDecodedPacket_(decodedPacket)
 
         def putDecodedPacket(self, decodedPacket):
             """Places decoded packet dictionaries into the router queue.
@@ -982,12 +1140,558 @@ class gestaltInterface(baseInterface):
             self.routerQueue.put(decodedPacket)
             return True
                     
-        def getDecodedPacket(self):
+        def getDecodedPacket(self, block = False):
             """Attempts to pull a decoded packet dictionary from the router queue.
             
+            block -- if True, waits until a decoded packet is available.
+            
             Returns (True, decodedPacket) if a decoded packet dictionary was waiting in the queue, or (False, None) if not.
             """
             try:
-                return True, self.routerQueue.get(block = False)    #signal success, return decoded packet
+                return True, self.routerQueue.get(block = block)    #signal success, return decoded packet
             except Queue.Empty:
-                return False, None  #signal failure, return None  
\ No newline at end of file
+                return False, None  #signal failure, return None  
+
+
+#---- EVENT-DRIVEN INTERFACES ----
+
+class eventLoop(object):
+    """A select-based event loop that services any number of interfaces from a single thread.
+    
+    Rather than each interface running its own set of threads, interfaces register callbacks with the loop that get run when a file
+    descriptor becomes readable or writable, when a timer expires, or when another thread schedules them with callSoon. The loop is
+    woken up from other threads by writing to an internal pipe. Note that select only supports serial ports on POSIX systems.
+    """
+    def __init__(self, name = None):
+        """Initializes the event loop. The loop doesn't run until start is called.
+        
+        name -- an optional name for the loop, for use by utilities.notice.
+        
+        Raises an ImportError on systems without the fcntl module, e.g. Windows.
+        """
+        if fcntl == None:
+            raise ImportError("The fcntl module is required by the event-driven interfaces, which are only supported on POSIX systems.")
+        self._name_ = name
+        self.readers = {}   #{fileDescriptor: callback}, only modified from within the loop thread
+        self.writers = {}   #{fileDescriptor: callback}, only modified from within the loop thread
+        self.readyCallbacks = collections.deque()   #[(callback, args)] to be run on the next pass of the loop. Appending is thread-safe.
+        self.timers = []    #a heap of (callTime, sequenceNumber, eventTimer)
+        self.timerLock = threading.Lock()
+        self.timerSequence = itertools.count()  #breaks ties between timers scheduled for the same time
+        self.wakeupReadDescriptor, self.wakeupWriteDescriptor = os.pipe()
+        for fileDescriptor in (self.wakeupReadDescriptor, self.wakeupWriteDescriptor): setNonblocking(fileDescriptor)
+        self.thread = None
+        self.stopFlag = threading.Event()
+    
+    def start(self):
+        """Starts the loop in a daemon thread. Returns the loop."""
+        if self.thread == None:
+            self.thread = threading.Thread(target = self.run)
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+    
+    def stop(self, timeout = 1.0):
+        """Stops the loop, and waits up to timeout seconds for its thread to exit. Returns True if the thread exited."""
+        self.stopFlag.set()
+        self.wakeup()
+        if self.thread == None or self.isLoopThread(): return True
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+    
+    def isLoopThread(self):
+        """Returns True if called from within the loop thread."""
+        return threading.current_thread() is self.thread
+    
+    def wakeup(self):
+        """Wakes up the loop if it is waiting in select."""
+        try:
+            os.write(self.wakeupWriteDescriptor, 'x')
+        except OSError: #pipe is full, so the loop is already due to wake up
+            pass
+    
+    def callSoon(self, callback, *args):
+        """Schedules callback(*args) to be run by the loop thread. Can be called from any thread."""
+        self.readyCallbacks.append((callback, args))
+        if not self.isLoopThread(): self.wakeup()
+    
+    def callLater(self, delay, callback, *args):
+        """Schedules callback(*args) to be run by the loop thread after delay seconds. Can be called from any thread.
+        
+        Returns an interfaces.eventTimer, whose cancel method prevents the call.
+        """
+        timer = eventTimer(callback, args)
+        with self.timerLock:
+            heapq.heappush(self.timers, (time.time() + delay, next(self.timerSequence), timer))
+        if not self.isLoopThread(): self.wakeup()
+        return timer
+    
+    def addReader(self, fileDescriptor, callback):
+        """Calls callback() from the loop thread whenever fileDescriptor is readable."""
+        if not self.isLoopThread(): return self.callSoon(self.addReader, fileDescriptor, callback)
+        self.readers[fileDescriptor] = callback
+    
+    def removeReader(self, fileDescriptor):
+        """Stops monitoring fileDescriptor for readability."""
+        if not self.isLoopThread(): return self.callSoon(self.removeReader, fileDescriptor)
+        self.readers.pop(fileDescriptor, None)
+    
+    def addWriter(self, fileDescriptor, callback):
+        """Calls callback() from the loop thread whenever fileDescriptor is writable."""
+        if not self.isLoopThread(): return self.callSoon(self.addWriter, fileDescriptor, callback)
+        self.writers[fileDescriptor] = callback
+    
+    def removeWriter(self, fileDescriptor):
+        """Stops monitoring fileDescriptor for writability."""
+        if not self.isLoopThread(): return self.callSoon(self.removeWriter, fileDescriptor)
+        self.writers.pop(fileDescriptor, None)
+    
+    def run(self):
+        """The event loop. Waits in select until a file descriptor is ready, a timer expires, or a callback is scheduled."""
+        while not self.stopFlag.is_set():
+            if self.readyCallbacks:
+                selectTimeout = 0
+            else:
+                with self.timerLock:
+                    if self.timers: selectTimeout = max(self.timers[0][0] - time.time(), 0)
+                    else: selectTimeout = None  #wait indefinitely
+            try:
+                readable, writable, exceptional = select.select(self.readers.keys() + [self.wakeupReadDescriptor], self.writers.keys(), [], selectTimeout)
+            except select.error, error:
+                if error.args[0] == errno.EINTR: continue   #interrupted by a signal
+                raise
+            
+            for fileDescriptor in readable:
+                if fileDescriptor == self.wakeupReadDescriptor:
+                    try:
+                        os.read(self.wakeupReadDescriptor, 4096)    #drain the wakeup pipe
+                    except OSError:
+                        pass
+                elif fileDescriptor in self.readers: self.runCallback(self.readers[fileDescriptor])
+            for fileDescriptor in writable:
+                if fileDescriptor in self.writers: self.runCallback(self.writers[fileDescriptor])
+            
+            currentTime = time.time()
+            with self.timerLock:
+                while self.timers and self.timers[0][0] <= currentTime:
+                    timer = heapq.heappop(self.timers)[2]
+                    if not timer.cancelled: self.readyCallbacks.append((timer.callback, timer.args))
+            
+            for callbackCount in range(len(self.readyCallbacks)):   #callbacks scheduled while these run will wait for the next pass
+                callback, args = self.readyCallbacks.popleft()
+                self.runCallback(callback, *args)
+    
+    def runCallback(self, callback, *args):
+        """Runs a callback, reporting rather than propagating any exception so that the loop keeps running."""
+        try:
+            callback(*args)
+        except Exception:
+            notice(self, "Exception in event loop callback:\n" + traceback.format_exc())
+
+
+class eventTimer(object):
+    """A callback scheduled by eventLoop.callLater."""
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+    
+    def cancel(self):
+        """Prevents the callback from being run, if it hasn't been already."""
+        self.cancelled = True
+
+
+def setNonblocking(fileDescriptor):
+    """Puts a file descriptor into non-blocking mode."""
+    fcntl.fcntl(fileDescriptor, fcntl.F_SETFL, fcntl.fcntl(fileDescriptor, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+def setBlocking(fileDescriptor):
+    """Puts a file descriptor back into blocking mode."""
+    fcntl.fcntl(fileDescriptor, fcntl.F_SETFL, fcntl.fcntl(fileDescriptor, fcntl.F_GETFL) & ~os.O_NONBLOCK)
+
+defaultEventLoop = None #shared by event-driven interfaces that aren't provided with a loop
+defaultEventLoopLock = threading.Lock()
+
+def getDefaultEventLoop():
+    """Returns the shared interfaces.eventLoop, starting it on first use."""
+    global defaultEventLoop
+    with defaultEventLoopLock:
+        if defaultEventLoop == None:
+            defaultEventLoop = eventLoop(name = 'defaultEventLoop').start()
+        return defaultEventLoop
+
+
+class eventSerialInterface(serialInterface):
+    """A serial interface that is serviced by an interfaces.eventLoop, rather than by its own transmitter thread.
+    
+    The port's file descriptor is put into non-blocking mode and registered with the loop. Received bytes are handed to a receive callback
+    as they arrive, and transmitted packets are appended to an outgoing buffer that is written whenever the port is ready, which combines
+    packets that are transmitted in quick succession. Only supported on POSIX systems.
+    """
+    def __init__(self, port = None, baudrate = None, interfaceType = None, name = None, timeout = 0.1, flowControl = None, maxWriteSize = 4096, maxWriteDelay = 0, loop = None):
+        """Initializes an event-driven serial communications port.
+        
+        loop -- the interfaces.eventLoop that services the port. If not provided, the shared loop returned by getDefaultEventLoop is used.
+        
+        The remaining arguments are the same as for serialInterface.
+        """
+        serialInterface.__init__(self, port, baudrate, interfaceType, name, timeout, flowControl, maxWriteSize, maxWriteDelay)
+        if loop == None: loop = getDefaultEventLoop()
+        self.eventLoop = loop
+        self.receiveCallback = None #called from the loop thread with each chunk of received bytes
+        self.outgoingBuffer = bytearray()   #bytes waiting to be written to the port, only accessed from the loop thread
+        self.writePending = False   #True while waiting for the port to be ready, or for maxWriteDelay to elapse
+        self.fileDescriptor = None  #the descriptor registered with the loop
+        self.writeCount = 0 #number of writes made to the port
+        self.packetCount = 0    #number of packets written to the port
+    
+    def setReceiveCallback(self, callback):
+        """Sets the function that is called from the loop thread with each chunk of received bytes, as a string."""
+        self.receiveCallback = callback
+    
+    def start(self):
+        """Connects the interface to a hardware port, and registers it with the event loop."""
+        if not self.isStarted(): #only allow to start once
+            self.isStartedFlag.set()
+            if self.connect(): self.eventLoop.callSoon(self.startPolling)
+            else: self.eventLoop.callLater(self._portReconnectTime_, self.reconnect)
+    
+    def stop(self, timeout = 1.0):
+        """Writes any remaining outgoing bytes, and disconnects the interface from its port.
+        
+        Returns True if the port was closed within timeout seconds.
+        """
+        if not self.isStarted(): return True
+        self.isStartedFlag.clear()
+        if self.eventLoop.isLoopThread():
+            self.closePort()
+            return True
+        portClosed = threading.Event()
+        self.eventLoop.callSoon(self.closePort, portClosed)
+        return portClosed.wait(timeout)
+    
+    def startPolling(self):
+        """Registers the port with the event loop. Called from the loop thread once the port is connected."""
+        if not self.isConnected(): return
+        self.fileDescriptor = self.port.fileno()
+        setNonblocking(self.fileDescriptor)
+        self.eventLoop.addReader(self.fileDescriptor, self.readReady)
+        if self.outgoingBuffer: self.scheduleWrite()
+    
+    def closePort(self, portClosed = None):
+        """Unregisters the port from the event loop, writes any remaining outgoing bytes, and closes the port."""
+        if self.fileDescriptor != None:
+            self.eventLoop.removeReader(self.fileDescriptor)
+            self.eventLoop.removeWriter(self.fileDescriptor)
+            if self.outgoingBuffer and self.isConnected():
+                setBlocking(self.fileDescriptor)  #finish writing
+                try:
+                    os.write(self.fileDescriptor, self.outgoingBuffer)
+                except OSError:
+                    pass
+            self.fileDescriptor = None
+        del self.outgoingBuffer[:]
+        self.writePending = False
+        self.disconnect()
+        if portClosed: portClosed.set()
+    
+    def connectionLost(self):
+        """Unregisters the port from the event loop and schedules an attempt to reconnect."""
+        notice(self, "Lost connection to serial port " + str(self.portPath))
+        self.eventLoop.removeReader(self.fileDescriptor)
+        self.eventLoop.removeWriter(self.fileDescriptor)
+        self.fileDescriptor = None
+        self.writePending = False
+        self.disconnect()
+        self.eventLoop.callLater(self._portReconnectTime_, self.reconnect)
+    
+    def reconnect(self):
+        """Attempts to reconnect to the port. Opening a port blocks for a couple of seconds, so this happens in a short-lived thread."""
+        if not self.isStarted(): return
+        def attemptReconnect():
+            if self.connect(): self.eventLoop.callSoon(self.startPolling)
+            else: self.eventLoop.callLater(self._portReconnectTime_, self.reconnect)
+        reconnectThread = threading.Thread(target = attemptReconnect)
+        reconnectThread.daemon = True
+        reconnectThread.start()
+    
+    def readReady(self):
+        """Reads whatever has arrived at the port, and hands it to the receive callback. Called from the loop thread."""
+        try:
+            receivedBytes = os.read(self.fileDescriptor, 4096)
+        except OSError, error:
+            if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR): return
+            return self.connectionLost()
+        if not receivedBytes:   #end of file, e.g. the device was unplugged
+            return self.connectionLost()
+        if self.receiveCallback: self.receiveCallback(receivedBytes)
+    
+    def transmit(self, packet):
+        """Transmits a packet over the serial interface. Can be called from any thread.
+        
+        packet -- the packets.serializedPacket or packets.serializedBuffer to be transmitted
+        """
+        if not self.isStarted():    #if a transmit request is made but the interface isn't started yet, go ahead and start it up.
+            self.start()
+        if self.isConnected():
+            self.eventLoop.callSoon(self.queuePacket, packet)
+            return True
+        else:
+            notice(self, str(self.portPath)+ " is not connected!")
+            return False
+    
+    def queuePacket(self, packet):
+        """Appends a packet to the outgoing buffer, and schedules it to be written. Called from the loop thread."""
+        self.outgoingBuffer.extend(packet)
+        self.packetCount += 1
+        if type(packet) == packets.serializedBuffer: packet.release()    #the packet has been copied, so return pooled buffers for reuse
+        if self.fileDescriptor != None and not self.writePending:
+            if self.maxWriteDelay > 0:  #give other packets a chance to join this one
+                self.writePending = True
+                self.eventLoop.callLater(self.maxWriteDelay, self.scheduleWrite)
+            else:
+                self.scheduleWrite()
+    
+    def scheduleWrite(self):
+        """Waits for the port to be ready to write the outgoing buffer."""
+        if self.fileDescriptor == None: return
+        self.writePending = True
+        self.eventLoop.addWriter(self.fileDescriptor, self.writeReady)
+    
+    def writeReady(self):
+        """Writes as much of the outgoing buffer as the port will accept, up to maxWriteSize bytes. Called from the loop thread."""
+        try:
+            bytesWritten = os.write(self.fileDescriptor, buffer(self.outgoingBuffer, 0, self.maxWriteSize))
+        except OSError, error:
+            if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR): return
+            return self.connectionLost()
+        self.writeCount += 1
+        del self.outgoingBuffer[:bytesWritten]
+        if not self.outgoingBuffer:
+            self.eventLoop.removeWriter(self.fileDescriptor)
+            self.writePending = False
+
+
+class eventGestaltInterface(gestaltInterface):
+    """A gestalt interface whose stages run as callbacks on an interfaces.eventLoop, rather than in five threads of their own.
+    
+    Nodes interact with it exactly as with a gestaltInterface. The channel priority, channel access, synthetic response, receiver, and
+    packet router stages each hand their work along by scheduling callbacks on the loop, so many interfaces can share a single thread.
+    Note that onChannelAccess, onReceive, and synthetic methods of actionObjects are called from the loop thread, and so shouldn't block.
+    In Python 3 this role would be played by asyncio; core.actionObject.transmitAsync and transmitUntilResponseAsync return futures
+    that can be used to transmit without blocking.
+    """
+    def __init__(self, name = None, interface = None, persistence = None, loop = None):
+        """Initialization function for the event-driven gestalt interface.
+        
+        loop -- the interfaces.eventLoop on which the interface runs. If not provided, the loop of the downstream interface is used if
+                it has one, and otherwise the shared loop returned by getDefaultEventLoop.
+        
+        The remaining arguments are the same as for gestaltInterface.
+        """
+        if loop == None: loop = getattr(interface, 'eventLoop', None)
+        if loop == None: loop = getDefaultEventLoop()
+        self._eventLoop_ = loop
+        gestaltInterface.__init__(self, name, interface, persistence)
+    
+    def _startInterfaceThreads_(self):
+        """Sets up the interface stages on the event loop, in place of the threads started by gestaltInterface."""
+        self._channelPriority_ = self._channelPriorityTask_(self)
+        self._channelAccess_ = self._channelAccessTask_(self)
+        self._syntheticResponse_ = self._syntheticResponseTask_(self)
+        self._receiver_ = self._receiveTask_(self)
+        self._packetRouter_ = self._packetRouterTask_(self)
+        if hasattr(self._interface_, 'setReceiveCallback'): self._interface_.setReceiveCallback(self._receiver_.feed)
+    
+    def stop(self, timeout = 1.0):
+        """Stops the interface stages, followed by the downstream interface. The event loop itself keeps running.
+        
+        Returns True if the downstream interface stopped within timeout seconds.
+        """
+        for interfaceTask in [self._channelPriority_, self._channelAccess_, self._syntheticResponse_, self._receiver_, self._packetRouter_]:
+            interfaceTask.stop()
+        if self._interface_: return self._interface_.stop(timeout)
+        return True
+    
+    def _callLater_(self, delay, callback):
+        """Calls callback() from the event loop thread after delay seconds. Returns an interfaces.eventTimer."""
+        return self._eventLoop_.callLater(delay, callback)
+    
+    class _interfaceTask_(object):
+        """A base class for the interface stages, which run as callbacks on the event loop."""
+        def __init__(self, interface):
+            """Initializes the task and stores a reference to the interface."""
+            self.interface = interface
+            self.eventLoop = interface._eventLoop_
+            self.stopped = False
+            self.init()
+        
+        def init(self):
+            """Dummy init function to be overriden by derived class."""
+            pass
+        
+        def stop(self):
+            """Stops the task from accepting any further work."""
+            self.stopped = True
+    
+    class _channelPriorityTask_(_interfaceTask_):
+        """Releases actionMolecules to the channel access task in the order they were committed, as each is cleared for release."""
+        def init(self):
+            self.pendingMolecules = collections.deque() #committed actionMolecules, oldest first. Only accessed from the loop thread.
+        
+        def putActionMolecule(self, actionMolecule):
+            """Places an actionMolecule into the channel priority queue. Can be called from any thread."""
+            if not self.stopped: self.eventLoop.callSoon(self.queueActionMolecule, actionMolecule)
+            return True
+        
+        def queueActionMolecule(self, actionMolecule):
+            self.pendingMolecules.append(actionMolecule)
+            if len(self.pendingMolecules) == 1: self.watchNextMolecule()
+        
+        def watchNextMolecule(self):
+            """Waits for the oldest actionMolecule to be cleared for release, without blocking the loop."""
+            self.pendingMolecules[0]._whenClearedForRelease_(lambda: self.eventLoop.callSoon(self.releaseMolecules))
+        
+        def releaseMolecules(self):
+            """Releases every actionMolecule at the front of the queue that has been cleared for release."""
+            while self.pendingMolecules and self.pendingMolecules[0]._isClearForRelease_():
+                actionMolecule = self.pendingMolecules.popleft()
+                for actionObject in gestaltInterface._channelPriorityThread_.serializeActionMolecule(actionMolecule):   #serialized as by the channel priority thread
+                    self.interface._channelAccess_.putActionObject(actionObject)
+            if self.pendingMolecules: self.watchNextMolecule()
+    
+    class _channelAccessTask_(_interfaceTask_):
+        """Grants channel access to actionObjects one at a time, in the order they were released."""
+        def init(self):
+            self.pendingActionObjects = collections.deque() #only accessed from the loop thread
+            self.channelInUse = False
+        
+        def putActionObject(self, actionObject):
+            """Places an actionObject into the channel access queue. Can be called from any thread."""
+            if not self.stopped: self.eventLoop.callSoon(self.queueActionObject, actionObject)
+            return True
+        
+        def queueActionObject(self, actionObject):
+            self.pendingActionObjects.append(actionObject)
+            self.grantChannelAccess()
+        
+        def grantChannelAccess(self):
+            """Grants channel access to the next actionObject, if the channel is free."""
+            if self.channelInUse or not self.pendingActionObjects: return
+            self.channelInUse = True
+            actionObject = self.pendingActionObjects.popleft()
+            actionObject._grantChannelAccess_(eventGestaltInterface._channelAccessLock_(lambda: self.eventLoop.callSoon(self.channelReleased)))
+        
+        def channelReleased(self):
+            self.channelInUse = False
+            self.grantChannelAccess()
+    
+    class _channelAccessLock_(object):
+        """Stands in for the lock that is handed to an actionObject on channel access. Releasing it passes the channel along."""
+        def __init__(self, onRelease):
+            self.onRelease = onRelease
+            self.releaseLock = threading.Lock()
+            self.released = False
+        
+        def release(self):
+            with self.releaseLock:
+                if self.released: raise threading.ThreadError("release unlocked lock")
+                self.released = True
+            self.onRelease()
+    
+    class _syntheticResponseTask_(_interfaceTask_):
+        """Generates synthetic responses from the loop thread."""
+        def putInSyntheticQueue(self, encodedPacket, syntheticResponseFunction):
+            """Schedules a synthetic response to an outbound packet. Can be called from any thread."""
+            if not self.stopped: self.eventLoop.callSoon(self.interface._generateSyntheticResponse_, encodedPacket, syntheticResponseFunction)
+            return True
+    
+    class _receiveTask_(_interfaceTask_):
+        """Frames and decodes received bytes as the downstream interface hands them over."""
+        def init(self):
+            self.streamDecoder = self.interface._createStreamDecoder_()
+            self.lastReceiveTime = 0
+            self.receiveTimeout = getattr(self.interface._interface_, 'timeout', 0.1)   #a gap longer than this resets the receiver, as in _receiveThread_
+        
+        def feed(self, receivedBytes):
+            """Feeds a chunk of received bytes into the stream decoder, and routes any completed packets. Called from the loop thread."""
+            if self.stopped: return
+            receiveTime = time.time()
+            if receiveTime - self.lastReceiveTime > self.receiveTimeout: self.streamDecoder.reset()
+            self.lastReceiveTime = receiveTime
+            framesRejected = self.streamDecoder.framesRejected
+            for decodedPacket in self.streamDecoder.feed(receivedBytes):
+                utilities.debugNotice(None, 'comm', "PACKET RECEIVED SUCCESSFULLY")
+                self.interface._packetRouter_.putDecodedPacket(decodedPacket)
+            if self.streamDecoder.framesRejected != framesRejected:
+                utilities.debugNotice(None, 'comm', "CHECKSUM DID NOT VALIDATE")
+                utilities.debugNotice(None, 'comm', "--- RECEIVER RESET ---")
+    
+    class _packetRouterTask_(_interfaceTask_):
+        """Routes decoded packets to their destination virtual node from the loop thread."""
+        def putDecodedPacket(self, decodedPacket):
+            """Routes a decoded packet dictionary. Can be called from any thread."""
+            if self.stopped: return False
+            if self.eventLoop.isLoopThread(): self.interface._routeDecodedPacket_(decodedPacket)
+            else: self.eventLoop.callSoon(self.interface._routeDecodedPacket_, decodedPacket)
+            return True
+
+
+class interfaceHub(object):
+    """Owns any number of serial ports, and services all of them from a single event loop thread.
+    
+    Each port added to the hub is wrapped in an eventSerialInterface and an eventGestaltInterface, which run on the hub's eventLoop. Received
+    bytes are framed and decoded by the gestalt interface of the port they arrived on, and routed to that interface's virtual nodes. Nodes are
+    created as usual, by passing the gestalt interface returned by addSerialPort as their interface. Because no threads are started per port,
+    the cost of adding a bus is just another file descriptor in the loop's select call.
+    """
+    def __init__(self, name = None):
+        """Initializes the hub, and starts its event loop.
+        
+        name -- an optional name for the hub, for use by utilities.notice.
+        """
+        self._name_ = name
+        self.eventLoop = eventLoop(name = name).start()
+        self.gestaltInterfaces = [] #one eventGestaltInterface per port, in the order they were added
+        self.interfaceLock = threading.Lock()
+    
+    def addSerialPort(self, port = None, baudrate = None, interfaceType = None, name = None, timeout = 0.1, flowControl = None, maxWriteSize = 4096, maxWriteDelay = 0, persistence = None):
+        """Adds a serial port to the hub.
+        
+        persistence -- the persistence file of the returned gestalt interface.
+        
+        The remaining arguments are the same as for serialInterface.
+        
+        Returns an eventGestaltInterface, which should be provided as the interface of any virtual nodes on the port.
+        """
+        serialPort = eventSerialInterface(port = port, baudrate = baudrate, interfaceType = interfaceType, name = name, timeout = timeout, flowControl = flowControl,
+                                          maxWriteSize = maxWriteSize, maxWriteDelay = maxWriteDelay, loop = self.eventLoop)
+        return self.addInterface(eventGestaltInterface(name = name, interface = serialPort, persistence = persistence, loop = self.eventLoop))
+    
+    def addInterface(self, interface):
+        """Adds an existing eventGestaltInterface to the hub. It must run on the hub's event loop.
+        
+        Returns the interface.
+        """
+        if not isinstance(interface, eventGestaltInterface) or interface._eventLoop_ is not self.eventLoop:
+            raise ValueError("Only an eventGestaltInterface running on the hub's event loop can be added to an interfaceHub.")
+        with self.interfaceLock:
+            self.gestaltInterfaces += [interface]
+        return interface
+    
+    def stop(self, timeout = 1.0):
+        """Stops every interface on the hub, followed by the hub's event loop.
+        
+        Returns True if all interfaces and the loop stopped within timeout seconds.
+        """
+        with self.interfaceLock:
+            gestaltInterfaces = list(self.gestaltInterfaces)
+        stopped = all([gestaltInterface.stop(timeout) for gestaltInterface in gestaltInterfaces])
+        return self.eventLoop.stop(timeout) and stopped
+    
+    def metrics(self):
+        """Returns a list with a dictionary of transmission counters for each serial port on the hub."""
+        with self.interfaceLock:
+            serialPorts = [gestaltInterface._interface_ for gestaltInterface in self.gestaltInterfaces]
+        return [{'port': serialPort.portPath, 'packets': serialPort.packetCount, 'writes': serialPort.writeCount}
+                for serialPort in serialPorts if isinstance(serialPort, eventSerialInterface)]
@@ -94,6 +94,7 @@ class baseGestaltVirtualNode(baseVirtualNode):
         #-- Initialization--
         utilities.callFunctionAcrossMRO(self, "init", args, kwargs)
         utilities.callFunctionAcrossMRO(self, "initPackets")
+        self._internPacketTemplates_()  #share templates with any identical nodes
         utilities.callFunctionAcrossMRO(self, "initPorts")
         utilities.callFunctionAcrossMRO(self, "initLast")
         self._initInterface_()  #initialize interface
@@ -120,6 +121,16 @@ class baseGestaltVirtualNode(baseVirtualNode):
         """Initializes packet templates."""
         pass
     
+    def _internPacketTemplates_(self):
+        """Replaces each packet template defined by initPackets with a structurally identical template shared across all nodes.
+        
+        Nodes of the same type define the same templates, so interning them means that each is only compiled once, and that
+        any caches built up by the compiled templates are shared.
+        """
+        for attributeName, attributeValue in self.__dict__.items():
+            if type(attributeValue) == packets.template or type(attributeValue) == packets.emptyTemplate:
+                setattr(self, attributeName, packets.internTemplate(attributeValue))
+    
     def initPorts(self):
         """Bind actionObjects and packets to ports."""
         pass
@@ -144,7 +155,7 @@ class baseGestaltVirtualNode(baseVirtualNode):
         (3) set the virtual node's address
         """
         if self._interface_:    #an interface was provided
-            if type(self._interface_) != interfaces.gestaltInterface:   #Need to create a gestalt interface. Implies only one node
+            if not isinstance(self._interface_, interfaces.gestaltInterface):   #Need to create a gestalt interface. Implies only one node
                 #figure out name of new interface
                 if self._interface_._name_: #provided interface has a name, pass that along
                     newInterfaceName = self._interface_._name_
@@ -153,7 +164,9 @@ class baseGestaltVirtualNode(baseVirtualNode):
                         newInterfaceName = self._name_+"GestaltInterface" #since the interface is dedicated to only one node, it's OK to use this node's name
                     else:
                         newInterfaceName = None #whoever is using the name will figure this out.
-                self._interface_ = interfaces.gestaltInterface(name = newInterfaceName, interface = self._interface_) #create a new gestalt interface
+                if isinstance(self._interface_, interfaces.eventSerialInterface): gestaltInterfaceType = interfaces.eventGestaltInterface  #keep event-driven interfaces on their event loop
+                else: gestaltInterfaceType = interfaces.gestaltInterface
+                self._interface_ = gestaltInterfaceType(name = newInterfaceName, interface = self._interface_) #create a new gestalt interface
             else:
                 pass #use the provided interface
         else: #No interface provided
@@ -248,6 +261,9 @@ class baseGestaltVirtualNode(baseVirtualNode):
             templateName = 'inboundTemplateOnPort' + str(port)
             inboundTemplate = packets.emptyTemplate(templateName)
         
+        outboundTemplate = packets.internTemplate(outboundTemplate)  #share templates with any identical nodes
+        inboundTemplate = packets.internTemplate(inboundTemplate)
+        
         #STORE PARAMETERS IN actionObject CLASSES
         outboundActionObjectClass._inboundPacketFlagQueue_ = inboundPacketFlagQueue #store a reference to inbound packet flag queue
         inboundActionObjectClass._inboundPacketFlagQueue_ = inboundPacketFlagQueue
@@ -335,7 +351,7 @@ class baseGestaltVirtualNode(baseVirtualNode):
         outboundActionObject = actionObjectClass._getActionObjectFromInboundPacketFlagQueue_()  #attepts to retrieve an actionObject instance from the class's inboundPacketFlagQueue
         if outboundActionObject:
             outboundActionObject._decodeAndSetInboundPacket_(packet)    #store decoded packet in the outbound actionObject instance
-            outboundActionObject._inboundPacketFlag_.set()  #set flag on outbound actionObject instance to indicate that a packet has been received
+            outboundActionObject._signalInboundPacket_()  #set flag on outbound actionObject instance to indicate that a packet has been received
         
         return True
     
@@ -391,7 +407,8 @@ class gestaltVirtualNode(baseGestaltVirtualNode):
         
         #Bootloader Command
         self.bootCommandRequestPacket = packets.template('bootCommandRequest',
-                                                         packets.unsignedInt('commandCode', 1))
+                                                         packets.unsignedInt('commandCode', 1),
+                                                         cacheSize = 4)  #only a handful of distinct commands are ever sent
         
         self.bootCommandResponsePacket = packets.template('bootCommandResponse',
                                                           packets.unsignedInt('responseCode', 1),
@@ -647,6 +664,8 @@ class gestaltVirtualNode(baseGestaltVirtualNode):
 
     class bootReadRequest(core.actionObject):
         """Reads a page from the node's microcontroller application code memory."""
+        _lazyDecode_ = True #only the page data is read from the response
+        
         def init(self, pageNumber):
             """Initialization function for bootReadRequest.
             
@@ -778,14 +797,14 @@ class arduinoGestaltVirtualNode(soloGestaltVirtualNode):
                 portPath = None
             self.setDefaultInterface(interfaces.serialInterface(port = portPath, baudrate = 38400))
             
-        elif type(self._interface_) == interfaces.serialInterface:  #a serial interface was provided
+        elif isinstance(self._interface_, interfaces.serialInterface):  #a serial interface was provided
             self._interface_.updateBaudrateIfDefault(38400) #attempt to change the default baudrate
             if self._interface_.baudrate != 38400:  #check the baudrate. If it doesn't match, then an incorrect user-provided baudrate supersceded the above call.
                 notice(self, "NOTICE: The user-provided baudrate of " + str(self._interface_.baudrate) + " is not standard for the Arduino Gestalt Library.")
         
-        elif type(self._interface_) == interfaces.gestaltInterface: #a gestalt interface was provided
+        elif isinstance(self._interface_, interfaces.gestaltInterface): #a gestalt interface was provided
             interface = self._interface_._interface_
-            if type(interface) == interfaces.serialInterface:
+            if isinstance(interface, interfaces.serialInterface):
                 interface.updateBaudrateIfDefault(38400)
                 if interface.baudrate != 38400:  #check the baudrate. If it doesn't match, then an incorrect user-provided baudrate supersceded the above call.
                     notice(self, "NOTICE: The user-provided baudrate of " + str(interface.baudrate) + " is not standard for the Arduino Gestalt Library.")
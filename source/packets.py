@@ -6,7 +6,18 @@
 from pygestalt import utilities
 import itertools
 import math
+import struct
+import collections
+import threading
+import weakref
 import errors
+try:
+    import numpy
+except ImportError:
+    numpy = None    #NumPy is optional, and only required for decoding packets into arrays
+
+#struct format characters for little-endian signed integers, keyed by size in bytes. The unsigned codes are utilities.unsignedStructCodes.
+signedStructCodes = {1:'b', 2:'h', 4:'i', 8:'q'}
 
 class serializedPacket(list):
     """The type used for storing serialized packets.
@@ -29,6 +40,105 @@ class serializedPacket(list):
     def toList(self):
         """A shortcut to get the serialized packet in the form of a stripped list."""
         return list(self)
+
+
+class serializedBuffer(bytearray):
+    """A serialized packet stored in a single contiguous buffer.
+    
+    This is an alternative to serializedPacket for use on the per-packet hot path. Tokens are encoded directly into the buffer,
+    the buffer can be written to a serial port without first being converted into a string, and when a buffer is decoded any
+    embedded packets (e.g. a gestalt packet's payload) are returned as memoryviews into the buffer rather than as copies.
+    
+    Note that a bytearray can't be resized while any memoryviews into it exist.
+    """
+    def __init__(self, value = [], template = None):
+        """Initialize a new packet buffer.
+        
+        value -- a flat list of bytes, another buffer, or an integer number of zeroed bytes to allocate.
+        template -- the template used to generate this packet.
+        """
+        bytearray.__init__(self, value)
+        self.template = template
+        self.pool = None    #the packets.bufferPool that this buffer belongs to, if any
+    
+    def toString(self):
+        """A shortcut to get the serialized packet in the format of a string."""
+        return str(self)
+    
+    def toList(self):
+        """A shortcut to get the serialized packet in the form of a stripped list."""
+        return list(self)
+    
+    def release(self):
+        """Returns the buffer to the pool that it was acquired from, once it is no longer needed. Does nothing if the buffer isn't pooled.
+        
+        Returns True if the buffer will be reused, or False if not.
+        """
+        if self.pool == None: return False
+        return self.pool.release(self)
+
+
+class bufferPool(object):
+    """A bounded pool of packets.serializedBuffer objects that are reused from one packet to the next.
+    
+    Buffers are acquired from the pool, encoded into, and released back to the pool once they have been transmitted. This avoids
+    allocating a new buffer object for every packet. If the pool is empty a new buffer is allocated, and if it is full, released buffers
+    are left to the garbage collector. A buffer that still has memoryviews into it can't be cleared, and so isn't reused.
+    """
+    def __init__(self, maxBuffers = 32):
+        """Initializes the buffer pool.
+        
+        maxBuffers -- the maximum number of released buffers that the pool holds onto for reuse.
+        """
+        self.maxBuffers = maxBuffers
+        self.freeBuffers = []
+        self.poolLock = threading.Lock()    #buffers are typically acquired and released by different threads
+        self.hits = 0   #number of buffers acquired from the pool
+        self.misses = 0 #number of buffers allocated because the pool was empty
+        self.discards = 0   #number of released buffers that couldn't be reused
+    
+    def acquire(self, template = None):
+        """Returns an empty packets.serializedBuffer, reusing a released buffer if one is available.
+        
+        template -- the template that will be used to encode the buffer.
+        """
+        with self.poolLock:
+            if self.freeBuffers:
+                self.hits += 1
+                packetBuffer = self.freeBuffers.pop()
+            else:
+                self.misses += 1
+                packetBuffer = None
+        if packetBuffer == None:
+            packetBuffer = serializedBuffer([], template)
+            packetBuffer.pool = self
+        else:
+            packetBuffer.template = template
+        return packetBuffer
+    
+    def release(self, packetBuffer):
+        """Returns a buffer to the pool.
+        
+        packetBuffer -- a packets.serializedBuffer that was acquired from this pool, and that won't be used again by the caller.
+        
+        Returns True if the buffer will be reused, or False if not.
+        """
+        try:
+            del packetBuffer[:]
+        except BufferError: #a memoryview into the buffer still exists, e.g. from decoding it
+            with self.poolLock: self.discards += 1
+            return False
+        with self.poolLock:
+            if len(self.freeBuffers) < self.maxBuffers:
+                self.freeBuffers.append(packetBuffer)
+                return True
+            self.discards += 1
+            return False
+    
+    def metrics(self):
+        """Returns a dictionary of the pool's hit, miss, and discard counts, and the number of buffers currently available."""
+        with self.poolLock:
+            return {'hits':self.hits, 'misses':self.misses, 'discards':self.discards, 'available':len(self.freeBuffers)}
         
 
 class emptyTemplate(object):
@@ -59,17 +169,35 @@ class emptyTemplate(object):
         """Returns an empty packet."""
         return serializedPacket([], self)
     
-    def decode(self, input):
+    def encodeBuffer(self, input):
+        """Returns an empty packet buffer."""
+        return serializedBuffer([], self)
+    
+    def decode(self, input, forwardDecode = True, lazy = False):
         """Returns an empty dictionary following the same format as template.decode"""
         return {}, []   #empty dictionary, empty working packet
+    
+    def decodeRange(self, input, startIndex, endIndex):
+        """Returns an empty dictionary following the same format as template.decodeRange"""
+        return {}
+    
+    def signature(self):
+        """Returns a hashable description of the template, following the same format as template.signature"""
+        return (type(self), self.name)
 
 class template(object):
     """Stores the formatting used to encode and decode serialized data packets."""
-    def __init__(self, *packetTokens):
+    def __init__(self, *packetTokens, **kwargs):
         """Initialize a new template.
         
         packetTokens -- an ordered list of elements that comprise a packet. If the first argument is a string, it will be treated as the packet name.
+        codegen -- if True, the template generates and compiles specialized python source for its encoder and decoder. Default is False.
+        cacheSize -- if provided, the template memoizes up to this many of its most recently encoded packets, keyed by the contents
+                     of the encode dictionary. Useful for templates that encode the same few packets over and over. Default is 0.
         """
+        self.codegen = kwargs.pop('codegen', False)
+        self.cacheSize = kwargs.pop('cacheSize', 0)
+        if kwargs: raise TypeError("template() got an unexpected keyword argument '" + str(kwargs.keys()[0]) + "'")
         
         if type(packetTokens[0]) == str:    # the first argument is a string. We'll assume that's the name of the template.
             self.name = packetTokens[0] # give this template a name!
@@ -82,6 +210,29 @@ class template(object):
         for token in self.template: token.parentTemplateName = self.name    # gives each token a reference to this template's name for error output.
         self.size = self.calculateTemplateSize(self.template)
         self.validateTemplate()
+        self.codec = None   #the compiled encode/decode plan. This gets generated by compile() on first use.
+    
+    def compile(self):
+        """Precomputes the plan used to encode and decode packets with this template.
+        
+        Compilation happens automatically the first time the template is used to encode or decode a packet, but can be
+        triggered ahead of time to keep the cost out of a time-critical loop. If the token list is modified after the
+        template has been used, compile should be called again.
+        
+        Returns the packets.templateCodec instance.
+        """
+        self.codec = templateCodec(self)
+        return self.codec
+    
+    def signature(self):
+        """Returns a hashable description of the template's structure, used by packets.internTemplate to identify identical templates.
+        
+        Two templates with equal signatures have the same name and options, and tokens of the same types created with the same
+        arguments. Raises a TypeError if any token was created with an argument that can't be hashed.
+        """
+        signature = (type(self), self.name, self.codegen, self.cacheSize, tuple(token.signature() for token in self.template))
+        hash(signature)
+        return signature
     
     def validateTemplate(self):
         """Validates that template is properly composed."""
@@ -106,9 +257,17 @@ class template(object):
         the checksum of the remainder of the packet. Then the provided and calculated checksums are compared.
         """
         tokenStartIndex, tokenEndIndex, checksumToken = self.findTokenPositionInPacket(checksumName, inputPacket)   #locate checksum position in packet
+        if type(checksumToken) == checksum and isinstance(inputPacket, bytearray):    #checksum the buffer in place, skipping over the checksum
+            if len(inputPacket) <= checksumToken.size: return False    #nothing to checksum
+            providedChecksum = utilities.bytesToUnsignedInteger(inputPacket[tokenStartIndex:tokenEndIndex])
+            calculatedChecksum = checksumToken.CRCInstance.generate(itertools.islice(inputPacket, tokenStartIndex))
+            calculatedChecksum = checksumToken.CRCInstance.generate(itertools.islice(inputPacket, tokenEndIndex, None), calculatedChecksum)
+            return calculatedChecksum == providedChecksum
         providedChecksum = inputPacket[tokenStartIndex:tokenEndIndex][0] #isolate checksome value from packet. Comes in as list so pull integer.
         remainingPacket = inputPacket[:tokenStartIndex] + inputPacket[tokenEndIndex:] #strip out checksum value from packet
         calculatedChecksum = checksumToken.encode(encodeDict = {}, inProcessPacket = remainingPacket) #calculate checksum of remaining packet
+        if checksumToken.size > 1:  #multi-byte checksums are compared as byte lists
+            providedChecksum = list(inputPacket[tokenStartIndex:tokenEndIndex])
         return calculatedChecksum == providedChecksum #return comparison of checksums
             
     def __call__(self, input):
@@ -165,57 +324,137 @@ class template(object):
                               
         Returns a packets.serializedPacket object.
         """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.encode(encodeDict)
+    
+    def encodeBuffer(self, encodeDict):
+        """Serializes a packet into a contiguous buffer using the token list stored in self.template.
         
-        #1) Encode tokens that don't require information on the in-process packet, i.e. NOT length and checksum tokens 
-        inProcessPacket = [token.encode(encodeDict) for token in self.template]
+        encodeDict -- the input dictionary that needs to get encoded using the template.
         
-        #2) Encode length tokens, all others get copied without calling an encode method. At this point most tokens will be lists.
-        inProcessPacket = [token.encode(encodeDict, inProcessPacket) if type(token) == length else token for token in inProcessPacket]
+        Returns a packets.serializedBuffer object.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.encode(encodeDict, serializedBuffer)
+    
+    def getFramePrefix(self, prefixDict):
+        """Returns a packets.framePrefix that encodes packets whose leading tokens take the values in prefixDict.
         
-        #3) Encode checksum tokens, all others get copied without calling an encode method.
-        inProcessPacket = [token.encode(encodeDict, inProcessPacket) if type(token) == checksum else token for token in inProcessPacket]
-                    
-        return serializedPacket(inProcessPacket, self)  #convert into packet type, giving a reference to the template, and return
+        prefixDict -- a dictionary of key:value pairs for the leading tokens of the template, e.g. the address and port of a packet.
+        
+        Prefixes are cached by the template, so repeated calls with the same values return the same prefix.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.getFramePrefix(prefixDict)
     
     
-    def decode(self, inputPacket, forwardDecode = True):
+    def decode(self, inputPacket, forwardDecode = True, lazy = False):
         """Deserializes a packet, using the token list stored in self.template, into a key:value dictionary.
         
-        inputPacket -- either a list or packets.packet that contains a serial stream of data to be decoded by the template.
+        inputPacket -- either a list, packets.serializedPacket, packets.serializedBuffer, or memoryview that contains a serial stream
+                       of data to be decoded by the template.
         forwardDecode -- if true, primary decode direction is forwards (left to right). If false, primary decode direction is reverse.
+        lazy -- if true, returns a packets.lazyDecodeDict that only decodes each token when its key is first accessed. This avoids
+                copying large pList and pString payloads that are never read.
         
-        The decoding algorithm works by feeding the packet thru a chain of tokens, each of which will strip their component
-        of the packet. It becomes complicated by tokens without a fixed length. This is handled by working in one direction until
-        an unbounded token is encountered (the primary pass), then changing direction thru the remainder of the packets.
+        Tokens with a fixed size are located relative to the start of the packet if they fall ahead of any token without a fixed
+        length, and relative to the end of the packet if they fall behind it. The unbounded token then takes whatever lies between.
+        Note that the decode direction only matters for templates of fixed size that are provided with a longer packet, in which
+        case the template is aligned with either the front (forward) or back (reverse) of the packet.
         
         Returns (decodeDict, workingPacket) where:
         decodeDict -- the set of key:value pairs decoded by the template
         workingPacket -- whatever packet remains after decoding. If template is not embedded in another template, this should be []
         """
-        workingPacket = list(inputPacket) # converts packets.packet to a list, and establishes a working copy.
-        if forwardDecode:   #template direction depends on decode direction
-            workingTemplate = self.template
-        else:
-            workingTemplate = [token for token in reversed(self.template)]  #generate a reverse template 
-        decodeDict = {}   # stores the growing dictionary of decoded packet values.
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.decode(inputPacket, forwardDecode, lazy)
+    
+    def decodeRange(self, inputPacket, startIndex, endIndex):
+        """Deserializes the template spanning inputPacket[startIndex:endIndex], without copying the remainder of the packet.
         
-        # PRIMARY PASS -- iterate over template in primary direction
-        for tokenIndex, token in enumerate(workingTemplate):
-            if token.size > 0:  #token has a fixed size, continue in primary pass
-                decodedKeyValuePairs, workingPacket = token.decode(workingPacket, forwardDecode)
-                decodeDict.update(decodedKeyValuePairs)    #updated decodeDict with key:value pairs decoded by token
-                continue
-            else:
-                tokenIndex -= 1 #roll back the token index so that it's included in the secondary pass 
-                break
+        inputPacket -- a list, packets.serializedPacket, packets.serializedBuffer, or memoryview containing the serialized template.
+        startIndex -- the index of the first byte of the template.
+        endIndex -- the index just past the last byte of the template.
         
-        # SECONDARY PASS -- iterate over remaining template in reverse direction
-        forwardDecode = not(forwardDecode)  #reverse the direction of decoding
-        for token in reversed(workingTemplate[tokenIndex+1:]):    #tokenForwardIndex + 1 is the next token in the template. If no secondary pass, this will iterate over an empty list
-            decodedKeyValuePairs, workingPacket = token.decode(workingPacket, forwardDecode)
-            decodeDict.update(decodedKeyValuePairs)  #update decodeDict with key:value pairs decoded by token
+        This is the cursor-based counterpart to decode, and is how embedded templates are decoded in place.
+        
+        Returns decodeDict, the set of key:value pairs decoded by the template.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.decodeRange(inputPacket, startIndex, endIndex)
+    
+    def encodeMany(self, encodeDicts):
+        """Serializes a sequence of encode dictionaries into a single contiguous buffer.
+        
+        encodeDicts -- an iterable of dictionaries, each of which is encoded as a packet by the template.
+        
+        Returns (packetBuffer, offsets) where:
+        packetBuffer -- a packets.serializedBuffer containing all of the encoded packets, back-to-back.
+        offsets -- a list of indices into packetBuffer, one more than the number of packets. Packet n spans offsets[n]:offsets[n+1].
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.encodeMany(encodeDicts)
+    
+    def decodeMany(self, inputPackets, offsets = None, asArray = False):
+        """Deserializes a sequence of packets.
+        
+        inputPackets -- either an iterable of packets, or a single contiguous buffer if offsets are provided.
+        offsets -- if provided, a list of indices into inputPackets in the format returned by encodeMany.
+        asArray -- if True, returns a NumPy record array rather than a list of dictionaries. See decodeArray.
+        
+        Returns a list of decoded dictionaries, one per packet, or a NumPy record array if asArray is True.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.decodeMany(inputPackets, offsets, asArray)
+    
+    def toDtype(self):
+        """Returns a NumPy structured dtype equivalent to the decoded template.
+        
+        Only fixed-size templates composed of integer, fixed-point, bitfield, length, and checksum tokens are supported. Fixed-point
+        tokens are represented as float64 fields, and each named bit of a bitfield is added as an additional boolean field.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.toDtype()
+    
+    def decodeArray(self, inputBuffer):
+        """Decodes a buffer of concatenated packets into a NumPy record array in a single call.
+        
+        inputBuffer -- a buffer (e.g. a bytearray or packets.serializedBuffer) containing N back-to-back packets.
+        
+        Returns a numpy.recarray of length N with the dtype returned by toDtype(). Checksums are decoded but not validated.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.decodeArray(inputBuffer)
+    
+    def encodeDelta(self, encodeDict, referenceDict = None):
+        """Serializes only the tokens whose values differ from those in a reference packet.
+        
+        encodeDict -- the input dictionary that needs to get encoded using the template.
+        referenceDict -- the encode dictionary of the reference packet, e.g. the last packet that the receiver acknowledged. If not
+                         provided, every token is encoded.
+        
+        The delta packet starts with a presence bitmap, one bit per token of the template, followed by the tokens whose encoded bytes
+        differ from the reference. Embedded templates are treated as a single token. To stream deltas to several receivers, see
+        packets.deltaEncoder, which keeps track of the reference packet for each.
+        
+        Returns a packets.serializedPacket object.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        segments = self.codec.encodeSegments(encodeDict)
+        if referenceDict == None: presentIndices = range(len(segments))
+        else: presentIndices = self.codec.changedSegments(segments, self.codec.encodeSegments(referenceDict))
+        return self.codec.encodeDelta(segments, presentIndices)
+    
+    def decodeDelta(self, inputPacket, referenceDict = None):
+        """Deserializes a packet produced by encodeDelta into a complete key:value dictionary.
+        
+        inputPacket -- the delta packet to be decoded.
+        referenceDict -- the decoded dictionary of the reference packet, which supplies the values of any tokens absent from the delta.
         
-        return decodeDict, workingPacket
+        Returns decodeDict.
+        """
+        if self.codec == None: self.compile()   #compile on first use
+        return self.codec.decodeDelta(inputPacket, referenceDict)[0]
     
     def decodeTokenInIncompletePacket(self, tokenName, packet):
         """Decodes a single named token in a provided potentially incomplete packet.
@@ -234,7 +473,9 @@ class template(object):
         index, token = self.findTokenPositionInTemplate(tokenName) #attempt to find the token in the packet
         if token:   #a token was found
             if len(packet) >= index + token.size:    #check if packet has sufficient length to fully decode the token
-                decodedTokenDict = token.decode(packet[index:])[0]  #decode the token, and take only the resulting dictionary
+                if token.size > 0: endIndex = index + token.size
+                else: endIndex = len(packet)    #unbounded tokens consume the rest of the packet
+                decodedTokenDict = token.decodeRange(packet, index, endIndex)  #decode the token in place
                 decodedValue = decodedTokenDict[tokenName]  #pull the desired token value from the decode dictionary
                 return True, decodedValue #return the decoded value
             else:
@@ -294,7 +535,12 @@ class template(object):
         startIndex -- the beginning index of the sub-list matching the token
         endIndex -- the ending index of the sub-list matching the token
         token -- the token object whose name is provided by the tokenName input argument.
+        
+        Forward searches are looked up in the compiled token index, as long as the packet is long enough to contain the template.
         """
+        if self.codec == None: self.compile()   #compile on first use
+        if forwardDecode and self.codec.tokenIndex != None and len(inputPacket) >= self.codec.frontSize + self.codec.backSize:
+            return self.codec.findTokenPosition(tokenName, len(inputPacket))
         
         workingPacket = list(inputPacket) # converts packets.packet type to a list, and establishes a working copy.
         packetLength = len(workingPacket) # length of packet
@@ -386,6 +632,1314 @@ class template(object):
         return 0, packetLength, None # return indices for the entire input packet
                     
 
+class templateRegistry(object):
+    """Interns structurally identical templates, so that they share a single set of tokens and a single compiled codec.
+    
+    Each node instance builds its own packet templates, so without interning every node on a network carries duplicate tokens, and
+    compiles and caches its own copy of each codec. Templates are held by weak reference, and are dropped once no longer used.
+    """
+    def __init__(self):
+        """Initializes an empty registry."""
+        self.templates = weakref.WeakValueDictionary()  #{signature: template}
+        self.lock = threading.Lock()
+        self.hits = 0   #number of templates that were replaced by an existing template
+        self.misses = 0 #number of templates that were added to the registry
+    
+    def intern(self, newTemplate):
+        """Returns the registered template that is structurally identical to newTemplate, registering newTemplate if there is none.
+        
+        Templates whose signature can't be determined are returned unchanged.
+        """
+        try:
+            signature = newTemplate.signature()
+        except TypeError:   #a token was created with an unhashable argument
+            return newTemplate
+        with self.lock:
+            registeredTemplate = self.templates.get(signature)
+            if registeredTemplate != None:
+                self.hits += 1
+                return registeredTemplate
+            self.templates[signature] = newTemplate
+            self.misses += 1
+            return newTemplate
+    
+    def __len__(self):
+        return len(self.templates)
+
+
+registry = templateRegistry()   #the registry used by internTemplate
+
+def internTemplate(newTemplate):
+    """Returns a template that is structurally identical to the one provided, shared with any other identical templates.
+    
+    newTemplate -- a packets.template or packets.emptyTemplate instance.
+    
+    The returned template may be newTemplate itself, or an identical template that was interned earlier, and should be used in its
+    place. Because interned templates are shared, their tokens shouldn't be modified.
+    """
+    return registry.intern(newTemplate)
+
+
+class templateCodec(object):
+    """A precompiled plan for encoding and decoding packets with a packets.template.
+    
+    The codec walks the template once on instantiation and records, for each token, how it gets encoded and where its data
+    resides within a serialized packet. Tokens ahead of the unbounded token (if any) are located by their offset from the front
+    of the packet, and tokens behind it by their offset from the back. Length and checksum tokens are encoded as placeholder
+    slots that get filled in once the rest of the packet has been serialized, so that a packet can be encoded in a single pass.
+    
+    Templates of fixed size whose tokens all provide a structCode are additionally compiled into a little-endian struct.Struct,
+    so that the entire packet is encoded with a single call to pack_into and decoded with a single call to unpack_from. If a
+    value can't be packed exactly as the token would encode it on its own, the codec falls back on encoding token-by-token.
+    """
+    prefixCacheSize = 256   #maximum number of frame prefixes kept per template
+    
+    def __init__(self, parentTemplate):
+        """Compiles the provided template.
+        
+        parentTemplate -- the packets.template instance to be compiled.
+        """
+        self.template = parentTemplate
+        self.size = parentTemplate.size   #size of the template, following the convention of template.calculateTemplateSize
+        self.encodePlan = []    #[(token, slotType)] in template order. slotType is None for tokens encoded from the encode dictionary.
+        self.decodePlan = []    #[(token, offset, size, fromBack, isEmbedded)] in template order.
+        self.frontSize = 0  #total size of the tokens ahead of the unbounded token, or of the whole template if fixed-size.
+        self.backSize = 0   #total size of the tokens behind the unbounded token.
+        self.slotSize = 0   #total size of the length and checksum tokens, which are not counted by length tokens.
+        
+        unboundedTokenFound = False
+        for token in parentTemplate.template:
+            #ENCODE PLAN
+            if type(token) == length:
+                self.encodePlan += [(token, length)]
+                self.slotSize += token.size
+            elif type(token) == checksum:
+                self.encodePlan += [(token, checksum)]
+                self.slotSize += token.size
+            else:
+                self.encodePlan += [(token, None)]
+            
+            #DECODE PLAN
+            isEmbedded = (type(token) == template or type(token) == packetTemplate)   #embedded templates decode into several key:value pairs
+            if unboundedTokenFound: #token is behind the unbounded token, and is located relative to the end of the packet
+                self.decodePlan += [[token, self.backSize, token.size, True, isEmbedded]]   #offset is converted below, once the back size is known
+                self.backSize += token.size
+            elif token.size > 0:    #token is ahead of any unbounded token, and is located relative to the start of the packet
+                self.decodePlan += [[token, self.frontSize, token.size, False, isEmbedded]]
+                self.frontSize += token.size
+            else:   #this is the unbounded token
+                self.decodePlan += [[token, self.frontSize, 0, False, isEmbedded]]
+                unboundedTokenFound = True
+        
+        for step in self.decodePlan:
+            if step[3]: step[1] = self.backSize - step[1]  #convert to the distance from the end of the packet to the start of the token
+        self.decodePlan = [tuple(step) for step in self.decodePlan]
+        
+        self.compileTokenIndex()
+        self.compileStruct()
+        self.generatedEncoder = None
+        self.generatedDecoder = None
+        if parentTemplate.codegen: self.compileSource()
+        
+        self.cacheLock = threading.Lock()   #templates may be encoded from several threads at once
+        if parentTemplate.cacheSize > 0: self.encodeCache = collections.OrderedDict()  #{cacheKey: encodedPacket}, least recently used first
+        else: self.encodeCache = None
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.framePrefixes = collections.OrderedDict() #{cacheKey: framePrefix}, oldest first
+    
+    def compileTokenIndex(self):
+        """Builds an index of the position of every named token within a serialized packet.
+        
+        Sets self.tokenIndex to a dictionary of {keyName:(token, startOffset, startFromBack, endOffset, endFromBack)}, where each offset is
+        measured either from the front of the packet, or if fromBack is True, from the end of the packet. Tokens in embedded templates are
+        included. If a name occurs more than once, the index holds whichever is found first by template.findTokenPositionInPacket.
+        
+        self.tokenIndex is set to None for templates whose token positions can't be indexed, i.e. templates with an embedded template of
+        unbounded size, or that fail validation.
+        """
+        self.tokenIndex = None
+        indexEntries = self.indexTokens(self.template.template)
+        if indexEntries == None:
+            return
+        self.tokenIndex = {}
+        for keyName, indexEntry in indexEntries:
+            self.tokenIndex.setdefault(keyName, indexEntry)
+    
+    @classmethod
+    def indexTokens(cls, tokens, reverseSearch = False):
+        """Returns a list of (keyName, (token, startOffset, startFromBack, endOffset, endFromBack)) in the order they are searched.
+        
+        tokens -- the list of tokens in a template
+        reverseSearch -- if True, the tokens are searched starting from the back of the template. Only supported for templates of fixed size.
+        
+        Mirrors the search order of template.findTokenPositionInPacket: a primary pass from the front over the tokens of predetermined size,
+        followed by a secondary pass from the back that ends on the unbounded token. Returns None if the tokens can't be indexed.
+        """
+        tokenSizes = [token.size for token in tokens]
+        if not tokens or min(tokenSizes) < 0 or tokenSizes.count(0) > 1 or (reverseSearch and 0 in tokenSizes):
+            return None
+        if 0 in tokenSizes:
+            unboundedIndex = tokenSizes.index(0)
+        else:
+            unboundedIndex = len(tokens)
+        frontSize = sum(tokenSizes[:unboundedIndex])
+        backSize = sum(tokenSizes[unboundedIndex + 1:])
+        
+        frontEntries = []   #tokens ahead of the unbounded token, in the order they are searched
+        position = 0
+        for token in tokens[:unboundedIndex]:
+            if type(token) == template or type(token) == packetTemplate:    #the token is an embedded template of fixed size, offset its index
+                embeddedEntries = cls.indexTokens(token.template.template if type(token) == packetTemplate else token.template, reverseSearch)
+                if embeddedEntries == None: return None
+                frontEntries += [(keyName, (embeddedToken, position + startOffset, False, position + endOffset, False))
+                                 for keyName, (embeddedToken, startOffset, startFromBack, endOffset, endFromBack) in embeddedEntries]
+            else:
+                frontEntries += [(token.keyName, (token, position, False, position + token.size, False))]
+            position += token.size
+        if reverseSearch:   #a fixed-size template searched from the back, which is only the case for templates embedded behind the unbounded token
+            frontEntries.reverse()
+        
+        backEntries = []    #tokens behind the unbounded token, searched from the end of the packet
+        position = 0    #distance from the end of the packet to the end of the token
+        for token in reversed(tokens[unboundedIndex + 1:]):
+            if type(token) == template or type(token) == packetTemplate:
+                embeddedEntries = cls.indexTokens(token.template.template if type(token) == packetTemplate else token.template, True)
+                if embeddedEntries == None: return None
+                backEntries += [(keyName, (embeddedToken, position + token.size - startOffset, True, position + token.size - endOffset, True))
+                                for keyName, (embeddedToken, startOffset, startFromBack, endOffset, endFromBack) in embeddedEntries]
+            else:
+                backEntries += [(token.keyName, (token, position + token.size, True, position, True))]
+            position += token.size
+        
+        if unboundedIndex < len(tokens):   #the unbounded token spans from the end of the front tokens to the start of the back tokens
+            unboundedToken = tokens[unboundedIndex]
+            if type(unboundedToken) == template or type(unboundedToken) == packetTemplate:
+                return None
+            backEntries += [(unboundedToken.keyName, (unboundedToken, frontSize, False, backSize, True))]
+        
+        return frontEntries + backEntries
+    
+    def findTokenPosition(self, tokenName, packetLength):
+        """Returns the index range that a named token spans in a packet of the provided length, using the token index.
+        
+        tokenName -- the string name of the token to be found
+        packetLength -- the length of the packet, which must be at least self.frontSize + self.backSize.
+        
+        Returns (startIndex, endIndex, token), in the same format as template.findTokenPositionInPacket.
+        """
+        if tokenName not in self.tokenIndex:
+            return 0, packetLength, None
+        token, startOffset, startFromBack, endOffset, endFromBack = self.tokenIndex[tokenName]
+        if startFromBack: startOffset = packetLength - startOffset
+        if endFromBack: endOffset = packetLength - endOffset
+        return startOffset, endOffset, token
+    
+    def compileStruct(self):
+        """Compiles the struct fast path, if the template is of fixed size and all tokens provide a struct code.
+        
+        Sets self.packetStruct to a struct.Struct instance, or to None if the fast path isn't avaliable for this template.
+        """
+        self.packetStruct = None
+        structCodes = [getattr(token, 'structCode', None) for token in self.template.template]  #embedded templates have no struct code
+        if self.size <= 0 or None in structCodes:
+            return
+        
+        self.structValues = []  #the list of values to be packed, pre-populated with the values of length and checksum tokens
+        self.structEncodePlan = []  #[(valueIndex, keyName, packFunction)] for tokens encoded from the encode dictionary
+        self.structDecodePlan = []  #[(keyName, unpackFunction)] for all tokens
+        self.structChecksumSlots = []   #[(position, token)]
+        self.structChecksumSegments = []    #[(start, end)] spans of the packet that are covered by checksums, i.e. all but the checksum tokens
+        payloadLength = self.size - self.slotSize
+        position = 0
+        segmentStart = 0
+        for valueIndex, token in enumerate(self.template.template):
+            if type(token) == length:
+                self.structValues += [token.calculateLength(payloadLength)]
+            elif type(token) == checksum:
+                self.structValues += [0]    #gets filled in once the rest of the packet has been packed
+                self.structChecksumSegments += [(segmentStart, position)]
+                self.structChecksumSlots += [(position, token)]
+                segmentStart = position + token.size
+            else:
+                self.structValues += [None]
+                self.structEncodePlan += [(valueIndex, token.keyName, token._packValue_)]
+            self.structDecodePlan += [(token.keyName, token._unpackValue_)]
+            position += token.size
+        
+        self.structChecksumSegments += [(segmentStart, self.size)]
+        self.packetStruct = struct.Struct('<' + ''.join(structCodes))
+    
+    def compileSource(self):
+        """Generates python source for an encoder and decoder specialized to the template, and compiles it.
+        
+        The generated functions unroll the template, inline the integer conversions and bitfield masks of integer, fixed-point,
+        bitfield, length and checksum tokens, and only call into the remaining tokens (e.g. pList, pString, or embedded templates).
+        They handle the typical case of in-range integer values and byte-valued packets. Anything else raises an exception inside the
+        generated function, in which case the codec falls back on its other encoding and decoding paths.
+        
+        The source is kept in self.encoderSource and self.decoderSource for reference.
+        """
+        self.generatedNamespace = {'iterateSegments':self.iterateSegments}
+        self.encoderSource = self.generateEncoderSource()
+        self.decoderSource = self.generateDecoderSource()
+        exec compile(self.encoderSource + '\n' + self.decoderSource, '<template ' + self.template.name + '>', 'exec') in self.generatedNamespace
+        self.generatedEncoder = self.generatedNamespace['encode']
+        self.generatedDecoder = self.generatedNamespace['decode']
+    
+    def generatedConstant(self, value):
+        """Returns a source expression for the provided constant, storing it in the generated namespace if it has no literal form."""
+        if type(value) in (str, int, long, bool) or value == None:
+            return repr(value)
+        constantName = 'constant' + str(len(self.generatedNamespace))
+        self.generatedNamespace[constantName] = value
+        return constantName
+    
+    @staticmethod
+    def byteSources(valueSource, size):
+        """Returns source expressions for each byte of an integer value, least significant byte first."""
+        return [valueSource + ' & 255'] + ['(' + valueSource + ' >> ' + str(8*byteIndex) + ') & 255' for byteIndex in range(1, size)]
+    
+    @staticmethod
+    def offsetSource(baseSource, offset):
+        """Returns a source expression for baseSource + offset."""
+        if offset == 0: return baseSource
+        if baseSource.isdigit(): return str(int(baseSource) + offset)
+        return baseSource + ' + ' + str(offset)
+    
+    @staticmethod
+    def isInlined(token):
+        """Returns True if the token's conversion is inlined into generated source."""
+        return type(token) in (unsignedInt, signedInt, fixedPoint, bitfield, length, checksum) and token.size > 0
+    
+    def generateEncoderSource(self):
+        """Returns the source of a function encode(encodeDict, encodedPacket) that serializes encodeDict into the bytearray encodedPacket."""
+        lines = ['def encode(encodeDict, encodedPacket):']
+        pendingBytes = []   #source expressions for bytes waiting to be added to the packet
+        positionBase, positionOffset = None, 0  #the position of the next token is positionBase + positionOffset
+        lengthSlots = []    #[(tokenName, positionSource, token)]
+        checksumSlots = []
+        
+        for index, token in enumerate(self.template.template):
+            tokenName, valueName = 'token' + str(index), 'value' + str(index)
+            self.generatedNamespace[tokenName] = token
+            if positionBase == None: positionSource = str(positionOffset)
+            else: positionSource = self.offsetSource(positionBase, positionOffset)
+            
+            if type(token) == length or type(token) == checksum:  #reserve a slot to be filled in once the remainder of the packet has been encoded
+                if type(token) == length: lengthSlots += [(tokenName, positionSource, token)]
+                else: checksumSlots += [(tokenName, positionSource, token)]
+                pendingBytes += ['0'] * token.size
+                positionOffset += token.size
+                continue
+            
+            if not self.isInlined(token):  #the token encodes itself, and its size can only be measured once it has
+                if pendingBytes: lines += ['    encodedPacket.extend((' + ', '.join(pendingBytes) + ',))']
+                pendingBytes = []
+                lines += ['    ' + valueName + ' = ' + tokenName + '.encode(encodeDict)',
+                          '    if hasattr(' + valueName + ', "__iter__"): encodedPacket.extend(' + valueName + ')',
+                          '    else: encodedPacket.append(' + valueName + ')',
+                          '    position' + str(index) + ' = len(encodedPacket)']
+                positionBase, positionOffset = 'position' + str(index), 0
+                continue
+            
+            keySource = self.generatedConstant(token.keyName)
+            maxValue = 256**token.size - 1   #largest value that fits in the token
+            lines += ['    ' + valueName + ' = encodeDict[' + keySource + ']']
+            if type(token) == unsignedInt:
+                lines += ['    if type(' + valueName + ') is not int or ' + valueName + ' < 0 or ' + valueName + ' > ' + str(maxValue) + ': raise ValueError']
+            elif type(token) == signedInt:
+                lines += ['    if type(' + valueName + ') is not int or abs(' + valueName + ') > ' + str(token.maxValue) + ': raise ValueError',
+                          '    ' + valueName + ' &= ' + str(maxValue)]
+            elif type(token) == fixedPoint:
+                lines += ['    if type(' + valueName + ') is not int and type(' + valueName + ') is not float: raise ValueError']
+                if token.integerBits > 0:   #signed value
+                    lines += ['    ' + valueName + ' = int(' + valueName + ' * ' + str(2**token.fractionalBits) + ')',
+                              '    if abs(' + valueName + ') > ' + str(2**token.bitSize/2 - 1) + ': raise ValueError',
+                              '    ' + valueName + ' &= ' + str(2**token.bitSize - 1)]
+                else:   #no integer bits, unsigned value
+                    lines += ['    if ' + valueName + ' < 0: raise ValueError',
+                              '    ' + valueName + ' = int(' + valueName + ' * ' + str(2**token.fractionalBits) + ')',
+                              '    if ' + valueName + ' > ' + str(maxValue) + ': raise ValueError']
+            elif type(token) == bitfield:
+                bitfieldName = 'bitfield' + str(index)
+                lines += ['    ' + bitfieldName + ' = ' + valueName, '    ' + valueName + ' = 0']
+                for bitName, mask, defaultValue in token.encodeMasks:
+                    lines += ['    if ' + bitfieldName + '.get(' + self.generatedConstant(bitName) + ', ' + self.generatedConstant(defaultValue) + '): ' + valueName + ' |= ' + str(mask)]
+                lines += ['    if ' + valueName + ' > ' + str(maxValue) + ': raise ValueError']
+            pendingBytes += self.byteSources(valueName, token.size)
+            positionOffset += token.size
+        
+        if pendingBytes: lines += ['    encodedPacket.extend((' + ', '.join(pendingBytes) + ',))']
+        lines += ['    packetLength = len(encodedPacket)']
+        
+        for tokenName, positionSource, token in lengthSlots:
+            lines += ['    lengthValue = packetLength - ' + str(self.slotSize - int(bool(token.countSelf))),
+                      '    if lengthValue > ' + str(256**token.size - 1) + ': raise ValueError']
+            lines += ['    encodedPacket[' + self.offsetSource(positionSource, byteIndex) + '] = ' + byteSource for byteIndex, byteSource in enumerate(self.byteSources('lengthValue', token.size))]
+        
+        if checksumSlots:   #checksums are calculated with all checksum tokens removed from the packet
+            segmentSources = []
+            segmentStart = '0'
+            for tokenName, positionSource, token in checksumSlots:
+                segmentSources += ['(' + segmentStart + ', ' + positionSource + ')']
+                segmentStart = self.offsetSource(positionSource, token.size)
+            segmentSources += ['(' + segmentStart + ', packetLength)']
+            lines += ['    checksumSegments = (' + ', '.join(segmentSources) + ',)']
+            for tokenName, positionSource, token in checksumSlots:
+                lines += ['    checksumValue = ' + tokenName + '.CRCInstance.generate(iterateSegments(encodedPacket, checksumSegments))']
+                lines += ['    encodedPacket[' + self.offsetSource(positionSource, byteIndex) + '] = ' + byteSource for byteIndex, byteSource in enumerate(self.byteSources('checksumValue', token.size))]
+        
+        lines += ['    return encodedPacket']
+        return '\n'.join(lines) + '\n'
+    
+    def generateDecoderSource(self):
+        """Returns the source of a function decode(inputPacket, packetBytes, startIndex, packetLength, isBuffer) that returns a decoded dictionary.
+        
+        inputPacket -- the packet, as either a list or a memoryview. Slices of this are provided to tokens whose conversion isn't inlined.
+        packetBytes -- the packet, indexable as integers (i.e. a bytearray or list of bytes).
+        startIndex -- the index in the packet at which the template starts.
+        packetLength -- the length of the packet.
+        isBuffer -- True if inputPacket is a memoryview.
+        """
+        lines = ['def decode(inputPacket, packetBytes, startIndex, packetLength, isBuffer):',
+                 '    decodeDict = {}',
+                 '    unboundedEndIndex = packetLength - ' + str(self.backSize)]
+        
+        for index, (token, offset, size, fromBack, isEmbedded) in enumerate(self.decodePlan):
+            tokenName, valueName = 'token' + str(index), 'value' + str(index)
+            self.generatedNamespace[tokenName] = token
+            if fromBack: startSource = 'packetLength - ' + str(offset)
+            else: startSource = self.offsetSource('startIndex', offset)
+            
+            if not self.isInlined(token):
+                if size: sliceSource = 'inputPacket[' + startSource + ':' + self.offsetSource(startSource, size) + ']'
+                else: sliceSource = 'inputPacket[' + startSource + ':unboundedEndIndex]'
+                if isEmbedded:
+                    if size: lines += ['    decodeDict.update(' + tokenName + '.decodeRange(inputPacket, ' + startSource + ', ' + self.offsetSource(startSource, size) + '))']
+                    else: lines += ['    decodeDict.update(' + tokenName + '.decodeRange(inputPacket, ' + startSource + ', unboundedEndIndex))']
+                elif token.decodeFromView: lines += ['    decodeDict[' + self.generatedConstant(token.keyName) + '] = ' + tokenName + '._decode_(' + sliceSource + ')']
+                else: lines += ['    decodeDict[' + self.generatedConstant(token.keyName) + '] = ' + tokenName + '._decode_(' + sliceSource + '.tolist() if isBuffer else ' + sliceSource + ')']
+                continue
+            
+            if size == 1: lines += ['    ' + valueName + ' = packetBytes[' + startSource + ']']
+            else: lines += ['    position = ' + startSource,
+                            '    ' + valueName + ' = ' + ' | '.join(['packetBytes[position]'] + ['packetBytes[position + ' + str(byteIndex) + '] << ' + str(8*byteIndex) for byteIndex in range(1, size)])]
+            if type(token) == signedInt:
+                lines += ['    if ' + valueName + ' >= ' + str(2**(token.bitSize - 1)) + ': ' + valueName + ' -= ' + str(2**token.bitSize)]
+            elif type(token) == fixedPoint:
+                lines += ['    ' + valueName + ' &= ' + str(2**token.bitSize - 1)]
+                if token.integerBits > 0:   #signed value
+                    lines += ['    if ' + valueName + ' >= ' + str(2**(token.bitSize - 1)) + ': ' + valueName + ' -= ' + str(2**token.bitSize)]
+                lines += ['    ' + valueName + ' = float(' + valueName + ')/' + str(2**token.fractionalBits)]
+            elif type(token) == bitfield:
+                bitSources = [self.generatedConstant(bitName) + ':bool(' + valueName + ' & ' + str(mask) + ')' for bitName, mask in token.decodeMasks]
+                lines += ['    ' + valueName + ' = {' + ', '.join(bitSources) + '}']
+            lines += ['    decodeDict[' + self.generatedConstant(token.keyName) + '] = ' + valueName]
+        
+        lines += ['    return decodeDict']
+        return '\n'.join(lines) + '\n'
+    
+    def encodeGenerated(self, encodeDict, packetType = serializedPacket):
+        """Serializes the provided encode dictionary using the generated encoder.
+        
+        Returns a packet of type packetType, or raises an exception if the dictionary should be encoded by the other paths.
+        """
+        if packetType == serializedBuffer:
+            return self.generatedEncoder(encodeDict, serializedBuffer([], self.template))
+        encodedPacket = serializedPacket([], self.template)
+        encodedPacket.extend(self.generatedEncoder(encodeDict, bytearray()))
+        return encodedPacket
+    
+    def decodeGenerated(self, inputPacket, forwardDecode = True):
+        """Deserializes the provided packet using the generated decoder.
+        
+        Returns (decodeDict, workingPacket), or raises an exception if the packet should be decoded by the other paths.
+        """
+        isBuffer = isinstance(inputPacket, (bytearray, memoryview))
+        if isBuffer:
+            packetBytes = inputPacket if isinstance(inputPacket, bytearray) else memoryview(inputPacket).tolist()
+            inputPacket = memoryview(inputPacket)
+        else:
+            if type(inputPacket) != list: inputPacket = list(inputPacket)
+            packetBytes = bytearray(inputPacket)    #raises an exception if the packet contains anything other than bytes
+        packetLength = len(inputPacket)
+        if packetLength < self.frontSize + self.backSize:
+            raise ValueError("Packet is too short to be decoded by the generated decoder.")
+        
+        if self.size > 0:   #template has a fixed size, so align it with one end of the packet
+            if forwardDecode:
+                startIndex = 0
+                remainingPacket = inputPacket[self.size:]
+            else:
+                startIndex = packetLength - self.size
+                remainingPacket = inputPacket[:startIndex]
+            if isBuffer: remainingPacket = remainingPacket.tolist()
+        else:
+            startIndex = 0
+            remainingPacket = []
+        return self.generatedDecoder(inputPacket, packetBytes, startIndex, packetLength, isBuffer), remainingPacket
+    
+    def encode(self, encodeDict, packetType = serializedPacket):
+        """Serializes the provided encode dictionary.
+        
+        encodeDict -- the dictionary of key:value pairs to be encoded.
+        packetType -- the type of packet to be returned, either packets.serializedPacket or packets.serializedBuffer.
+        
+        Returns a packet of type packetType.
+        """
+        if self.encodeCache != None:
+            return self.encodeCached(encodeDict, packetType)
+        return self.encodeUncached(encodeDict, packetType)
+    
+    def encodeUncached(self, encodeDict, packetType = serializedPacket):
+        """Serializes the provided encode dictionary using the fastest avaliable path, bypassing the encode cache."""
+        if self.generatedEncoder:
+            try:
+                return self.encodeGenerated(encodeDict, packetType)
+            except (KeyError, ValueError, TypeError, OverflowError, AttributeError, IndexError):
+                pass    #the remaining paths will either produce the same result, or raise the appropriate error
+        if self.packetStruct:
+            try:
+                return self.encodeStruct(encodeDict, packetType)
+            except (KeyError, ValueError, TypeError, OverflowError, struct.error):
+                pass    #encoding token-by-token will either produce the same result, or raise the appropriate error
+        return self.encodeTokens(encodeDict, packetType)
+    
+    frozenTypes = (int, long, float, bool, str, unicode, type(None))    #immutable types that are used as-is in cache keys
+    
+    @classmethod
+    def freezeValue(cls, value):
+        """Returns a hashable key that identifies the provided encode value, including the types of everything it contains.
+        
+        Only dictionaries, lists, tuples, bytearrays, and immutable scalars are supported. A TypeError is raised for anything else,
+        including objects whose contents could change without changing their identity.
+        """
+        frozenTypes = cls.frozenTypes
+        valueType = type(value)
+        if valueType in frozenTypes:
+            return value
+        if isinstance(value, dict):
+            return (valueType, frozenset([(keyName, type(item), item if type(item) in frozenTypes else cls.freezeValue(item)) for keyName, item in value.iteritems()]))
+        if isinstance(value, (list, tuple)):
+            if all(type(element) == int for element in value): return (valueType, tuple(value))    #typical list of bytes
+            return (valueType, tuple([(type(element), cls.freezeValue(element)) for element in value]))
+        if isinstance(value, bytearray):
+            return (valueType, str(value))
+        raise TypeError("Values of type " + valueType.__name__ + " can't be used as cache keys.")
+    
+    def encodeCached(self, encodeDict, packetType = serializedPacket):
+        """Serializes the provided encode dictionary, returning a copy of the cached packet if the same dictionary was recently encoded.
+        
+        The cache holds up to template.cacheSize packets, and discards the least recently used packet when full.
+        """
+        try:
+            cacheKey = (packetType, self.freezeValue(encodeDict))
+            with self.cacheLock:
+                cachedPacket = self.encodeCache.pop(cacheKey, None)
+                if cachedPacket != None:
+                    self.encodeCache[cacheKey] = cachedPacket   #reinserted to mark it as the most recently used
+                    self.cacheHits += 1
+        except TypeError:   #contains unhashable values, e.g. NumPy arrays
+            return self.encodeUncached(encodeDict, packetType)
+        if cachedPacket == None:
+            cachedPacket = self.encodeUncached(encodeDict, packetType)
+            with self.cacheLock:
+                self.cacheMisses += 1
+                self.encodeCache[cacheKey] = cachedPacket
+                while len(self.encodeCache) > self.template.cacheSize: self.encodeCache.popitem(last = False)  #discard the least recently used packet
+        
+        if packetType == serializedBuffer: return serializedBuffer(cachedPacket, self.template)    #callers are free to modify the returned packet
+        encodedPacket = serializedPacket([], self.template)
+        encodedPacket.extend(cachedPacket)
+        return encodedPacket
+    
+    def getFramePrefix(self, prefixDict):
+        """Returns the framePrefix for the provided prefix dictionary, creating it on first use.
+        
+        Up to prefixCacheSize prefixes are kept, after which the oldest is discarded.
+        """
+        cacheKey = self.freezeValue(prefixDict)
+        with self.cacheLock:
+            prefix = self.framePrefixes.get(cacheKey)
+        if prefix == None:
+            prefix = framePrefix(self.template, prefixDict)
+            with self.cacheLock:
+                self.framePrefixes[cacheKey] = prefix
+                while len(self.framePrefixes) > self.prefixCacheSize: self.framePrefixes.popitem(last = False)
+        return prefix
+    
+    def encodeStruct(self, encodeDict, packetType = serializedPacket):
+        """Serializes the provided encode dictionary with a single call to the compiled struct.
+        
+        encodeDict -- the dictionary of key:value pairs to be encoded.
+        packetType -- the type of packet to be returned, either packets.serializedPacket or packets.serializedBuffer.
+        
+        Returns a packet of type packetType.
+        """
+        if packetType == serializedBuffer:  #pack directly into the returned buffer
+            packetBuffer = serializedBuffer(self.size, self.template)
+        else:
+            packetBuffer = bytearray(self.size)
+        self.packStructInto(packetBuffer, 0, encodeDict)
+        
+        if packetType == serializedBuffer:
+            return packetBuffer
+        encodedPacket = serializedPacket([], self.template)
+        encodedPacket.extend(packetBuffer)
+        return encodedPacket
+    
+    def packStructInto(self, packetBuffer, offset, encodeDict):
+        """Packs the provided encode dictionary into a buffer at the given offset, using the compiled struct.
+        
+        packetBuffer -- a writable buffer, with at least self.size bytes avaliable following offset.
+        offset -- the index in packetBuffer at which the packet should start.
+        encodeDict -- the dictionary of key:value pairs to be encoded.
+        """
+        structValues = list(self.structValues)
+        for valueIndex, keyName, packFunction in self.structEncodePlan:
+            structValues[valueIndex] = packFunction(encodeDict[keyName])
+        self.packetStruct.pack_into(packetBuffer, offset, *structValues)
+        
+        if self.structChecksumSlots:
+            checksumSegments = [(offset + start, offset + end) for start, end in self.structChecksumSegments]
+            for position, token in self.structChecksumSlots:
+                packetBuffer[offset + position:offset + position + token.size] = token.encodeChecksum(self.iterateSegments(packetBuffer, checksumSegments))
+    
+    def encodeMany(self, encodeDicts):
+        """Serializes a sequence of encode dictionaries into a single contiguous buffer.
+        
+        encodeDicts -- an iterable of dictionaries of key:value pairs to be encoded.
+        
+        For templates with a struct fast path, the buffer is allocated once and each packet is packed in place.
+        
+        Returns (packetBuffer, offsets) where:
+        packetBuffer -- a packets.serializedBuffer containing all of the encoded packets, back-to-back.
+        offsets -- a list of indices into packetBuffer, one more than the number of packets. Packet n spans offsets[n]:offsets[n+1].
+        """
+        if self.packetStruct:
+            encodeDicts = list(encodeDicts)
+            packetBuffer = serializedBuffer(self.size * len(encodeDicts), self.template)
+            offsets = range(0, self.size * (len(encodeDicts) + 1), self.size)
+            packStructInto = self.packStructInto
+            for offset, encodeDict in itertools.izip(offsets, encodeDicts):
+                try:
+                    packStructInto(packetBuffer, offset, encodeDict)
+                except (KeyError, ValueError, TypeError, OverflowError, struct.error):
+                    packetBuffer[offset:offset + self.size] = self.encodeTokens(encodeDict, serializedBuffer)
+            return packetBuffer, offsets
+        
+        packetBuffer = serializedBuffer([], self.template)
+        offsets = [0]
+        for encodeDict in encodeDicts:
+            packetBuffer.extend(self.encodeTokens(encodeDict, serializedBuffer))
+            offsets += [len(packetBuffer)]
+        return packetBuffer, offsets
+    
+    def encodeTokens(self, encodeDict, packetType = serializedPacket, prefix = None, packetBuffer = None):
+        """Serializes the provided encode dictionary in a single pass over the template.
+        
+        encodeDict -- the dictionary of key:value pairs to be encoded.
+        packetType -- the type of packet to be returned, either packets.serializedPacket or packets.serializedBuffer.
+        prefix -- an optional packets.framePrefix, in which case only the tokens following the prefix are encoded from encodeDict.
+        packetBuffer -- an optional empty packets.serializedBuffer to encode into, e.g. from a packets.bufferPool. Overrides packetType.
+        
+        Returns a packet of type packetType, or packetBuffer if provided.
+        """
+        if packetBuffer == None: encodedPacket = packetType([], self.template)
+        else: encodedPacket = packetBuffer
+        lengthSlots = []    #[(position, token)]
+        checksumSlots = []  #[(position, token)]
+        if prefix == None:
+            encodePlan = self.encodePlan
+            checksumStart = 0
+        else:   #start with the pre-encoded prefix
+            encodedPacket.extend(prefix.prefixBytes)
+            encodePlan = prefix.encodePlan
+            checksumStart = prefix.size  #the prefix is already accounted for by its stored checksum states
+        
+        for token, slotType in encodePlan:
+            if slotType == None:    #token encodes a value from the encode dictionary
+                encodedToken = token.encode(encodeDict)
+                if hasattr(encodedToken, '__iter__'): encodedPacket.extend(encodedToken)
+                else: encodedPacket.append(encodedToken)    #catches tokens that encode into a single integer
+            else:   #reserve a slot to be filled in once the remainder of the packet has been encoded
+                if slotType == length: lengthSlots += [(len(encodedPacket), token)]
+                else: checksumSlots += [(len(encodedPacket), token)]
+                encodedPacket.extend([0]*token.size)
+        
+        if lengthSlots:
+            payloadLength = len(encodedPacket) - self.slotSize  #length and checksum tokens are not counted
+            for position, token in lengthSlots:
+                encodedPacket[position:position + token.size] = token.encodeLength(payloadLength)
+        
+        if checksumSlots:   #checksums are calculated with all checksum tokens removed from the packet
+            checksumSegments = []   #[(start, end)] spans of the packet between checksum slots
+            segmentStart = checksumStart
+            for position, token in checksumSlots:
+                checksumSegments += [(segmentStart, position)]
+                segmentStart = position + token.size
+            checksumSegments += [(segmentStart, len(encodedPacket))]
+            for position, token in checksumSlots:
+                if prefix == None: checksumState = None
+                else: checksumState = prefix.checksumStates[token]
+                encodedPacket[position:position + token.size] = token.encodeChecksum(self.iterateSegments(encodedPacket, checksumSegments), checksumState)
+        
+        return encodedPacket
+    
+    @staticmethod
+    def iterateSegments(encodedPacket, segments):
+        """Returns an iterator over the bytes in a list of segments of a packet, without copying them.
+        
+        encodedPacket -- the packet, as a list or bytearray.
+        segments -- a list of (start, end) index pairs.
+        """
+        return itertools.chain.from_iterable(itertools.islice(encodedPacket, start, end) for start, end in segments)
+    
+    def decode(self, inputPacket, forwardDecode = True, lazy = False):
+        """Deserializes the provided packet into a key:value dictionary.
+        
+        inputPacket -- the packet to be decoded.
+        forwardDecode -- if the template has a fixed size, determines whether it is aligned with the front or the back of the packet.
+        lazy -- if True, returns a lazyDecodeDict rather than decoding every token up front.
+        
+        Returns (decodeDict, workingPacket), in the same format as template.decode.
+        """
+        if lazy:
+            return self.decodeLazy(inputPacket, forwardDecode)
+        if self.generatedDecoder:
+            try:
+                return self.decodeGenerated(inputPacket, forwardDecode)
+            except (ValueError, TypeError, IndexError):
+                pass    #packet contains values that aren't bytes, or is too short, so leave it to the other paths
+        if self.packetStruct and len(inputPacket) >= self.size:
+            try:
+                return self.decodeStruct(inputPacket, forwardDecode)
+            except (ValueError, TypeError):
+                pass    #packet contains values that aren't bytes, so leave it to the tokens to decode
+        return self.decodeTokens(inputPacket, forwardDecode)
+    
+    def decodeStruct(self, inputPacket, forwardDecode = True):
+        """Deserializes the provided packet with a single call to the compiled struct.
+        
+        inputPacket -- the packet to be decoded. Must be at least the size of the template.
+        forwardDecode -- determines whether the template is aligned with the front or the back of the packet.
+        
+        Returns (decodeDict, workingPacket), in the same format as template.decode.
+        """
+        if isinstance(inputPacket, (bytearray, memoryview)): packetBuffer = inputPacket   #can be unpacked directly
+        else: packetBuffer = bytearray(inputPacket)
+        if forwardDecode:
+            startIndex = 0
+            remainingPacket = packetBuffer[self.size:]
+        else:
+            startIndex = len(inputPacket) - self.size
+            remainingPacket = packetBuffer[:startIndex]
+        if type(remainingPacket) == memoryview: remainingPacket = remainingPacket.tolist()   #memoryviews iterate over characters in python 2
+        else: remainingPacket = list(remainingPacket)
+        
+        decodeDict = {}
+        for (keyName, unpackFunction), structValue in zip(self.structDecodePlan, self.packetStruct.unpack_from(packetBuffer, startIndex)):
+            decodeDict[keyName] = unpackFunction(structValue)
+        return decodeDict, remainingPacket
+    
+    def decodeMany(self, inputPackets, offsets = None, asArray = False):
+        """Deserializes a sequence of packets.
+        
+        inputPackets -- either an iterable of packets, or a single contiguous buffer if offsets are provided.
+        offsets -- if provided, a list of indices into inputPackets in the format returned by encodeMany.
+        asArray -- if True, returns a NumPy record array rather than a list of dictionaries. See decodeArray.
+        
+        Returns a list of decoded dictionaries, one per packet, or a NumPy record array if asArray is True.
+        """
+        contiguousBuffer = None
+        if offsets != None:  #split the contiguous buffer into views
+            contiguousBuffer = inputPackets
+            packetView = memoryview(inputPackets)
+            inputPackets = [packetView[offsets[index]:offsets[index + 1]] for index in range(len(offsets) - 1)]
+        
+        if asArray:
+            if offsets != None and offsets == range(0, self.size * len(offsets), self.size) and len(packetView) == offsets[-1]:
+                packetBuffer = contiguousBuffer    #already packed back-to-back, so can be used directly
+            else:
+                packetBuffer = bytearray()
+                for inputPacket in inputPackets: packetBuffer.extend(inputPacket)
+            return self.decodeArray(packetBuffer)
+        
+        if not self.packetStruct:
+            decode = self.decodeTokens
+            return [decode(inputPacket)[0] for inputPacket in inputPackets]
+        
+        decodeDicts = []
+        unpackFrom = self.packetStruct.unpack_from
+        structDecodePlan = self.structDecodePlan
+        for inputPacket in inputPackets:
+            if len(inputPacket) == self.size and isinstance(inputPacket, (bytearray, memoryview)):  #can be unpacked directly
+                decodeDict = {}
+                for (keyName, unpackFunction), structValue in zip(structDecodePlan, unpackFrom(inputPacket)):
+                    decodeDict[keyName] = unpackFunction(structValue)
+                decodeDicts += [decodeDict]
+            else:
+                decodeDicts += [self.decode(inputPacket)[0]]
+        return decodeDicts
+    
+    def checkArraySupport(self):
+        """Raises an exception if packets of this template can't be decoded into a NumPy array."""
+        if not self.packetStruct:
+            raise errors.CompositionError("Template " + self.template.name + " can't be decoded into an array. Only templates of fixed size, composed of integer, fixed-point and bitfield tokens are supported.")
+        if numpy == None:
+            raise ImportError("NumPy is required in order to decode packets into an array.")
+    
+    def structDtype(self):
+        """Returns a NumPy structured dtype that matches the packed layout of the compiled struct.
+        
+        Each token is represented by a field of the same name, containing its packed little-endian integer value.
+        """
+        self.checkArraySupport()
+        return numpy.dtype([(token.keyName, '<' + token.structCode) for token in self.template.template])
+    
+    def toDtype(self):
+        """Returns a NumPy structured dtype for the decoded values of the template.
+        
+        Integer tokens keep their packed width, fixed-point tokens are decoded into float64 fields, and bitfields are expanded into an
+        additional boolean field for each named bit.
+        """
+        self.checkArraySupport()
+        return numpy.dtype(list(itertools.chain.from_iterable(token._arrayFields_() for token in self.template.template)))
+    
+    def decodeArray(self, inputBuffer):
+        """Decodes a buffer of back-to-back packets into a NumPy record array, in one pass per field.
+        
+        inputBuffer -- a buffer (e.g. a bytearray) containing N concatenated packets.
+        
+        Returns a numpy.recarray of length N, with the dtype returned by toDtype.
+        """
+        self.checkArraySupport()
+        if len(inputBuffer) % self.size:
+            raise errors.CompositionError("Buffer of length " + str(len(inputBuffer)) + " does not contain a whole number of " + self.template.name + " packets.")
+        packedArray = numpy.frombuffer(inputBuffer, dtype = self.structDtype())
+        decodedArray = numpy.empty(len(packedArray), dtype = self.toDtype())
+        for token in self.template.template:
+            for (fieldName, fieldType), fieldValues in zip(token._arrayFields_(), token._unpackArray_(packedArray[token.keyName])):
+                decodedArray[fieldName] = fieldValues
+        return decodedArray.view(numpy.recarray)
+    
+    def decodeTokens(self, inputPacket, forwardDecode = True):
+        """Deserializes the provided packet token-by-token into a key:value dictionary.
+        
+        inputPacket -- the packet to be decoded.
+        forwardDecode -- if the template has a fixed size, determines whether it is aligned with the front or the back of the packet.
+        
+        Returns (decodeDict, workingPacket), in the same format as template.decode.
+        """
+        inputPacket, startIndex, endIndex, remainingPacket = self.locateTemplate(inputPacket, forwardDecode)
+        return self.decodeTokenRanges(inputPacket, startIndex, endIndex), remainingPacket
+    
+    def decodeRange(self, inputPacket, startIndex, endIndex):
+        """Deserializes the template spanning inputPacket[startIndex:endIndex] into a key:value dictionary.
+        
+        inputPacket -- the packet containing the template.
+        startIndex -- the index of the first byte of the template.
+        endIndex -- the index just past the last byte of the template.
+        
+        Only the bytes of each individual token are ever sliced from the packet, so embedded templates are decoded in place rather than
+        being handed a copy of the remainder of the packet. Fixed-size templates with a struct or generated decoder take their own span
+        of the packet, which is no larger than the template.
+        
+        Returns decodeDict.
+        """
+        if type(inputPacket) != list and type(inputPacket) != memoryview:
+            if isinstance(inputPacket, bytearray): inputPacket = memoryview(inputPacket)
+            else: inputPacket = list(inputPacket)
+        if self.size > 0 and (self.packetStruct or self.generatedDecoder) and endIndex - startIndex == self.size:
+            return self.decode(inputPacket[startIndex:endIndex])[0]
+        return self.decodeTokenRanges(inputPacket, startIndex, endIndex)
+    
+    def decodeTokenRanges(self, inputPacket, startIndex, endIndex):
+        """Decodes each token of the template spanning inputPacket[startIndex:endIndex], which must be a list or memoryview.
+        
+        Returns decodeDict.
+        """
+        isBuffer = (type(inputPacket) == memoryview)
+        decodeDict = {}
+        for token, tokenStartIndex, tokenEndIndex, isEmbedded in self.tokenRanges(startIndex, endIndex):
+            if isEmbedded: decodeDict.update(token.decodeRange(inputPacket, tokenStartIndex, tokenEndIndex))
+            elif isBuffer and not token.decodeFromView: decodeDict[token.keyName] = token._decode_(inputPacket[tokenStartIndex:tokenEndIndex].tolist())
+            else: decodeDict[token.keyName] = token._decode_(inputPacket[tokenStartIndex:tokenEndIndex])
+        return decodeDict
+    
+    def decodeLazy(self, inputPacket, forwardDecode = True):
+        """Deserializes the provided packet into a lazyDecodeDict, which decodes each token only once its key is accessed.
+        
+        inputPacket -- the packet to be decoded.
+        forwardDecode -- if the template has a fixed size, determines whether it is aligned with the front or the back of the packet.
+        
+        Returns (decodeDict, workingPacket), in the same format as template.decode.
+        """
+        tokenSlices, remainingPacket, isBuffer = self.sliceTokens(inputPacket, forwardDecode)
+        return lazyDecodeDict(tokenSlices, isBuffer), remainingPacket
+    
+    def locateTemplate(self, inputPacket, forwardDecode = True):
+        """Locates the template within the provided packet.
+        
+        inputPacket -- the packet to be decoded.
+        forwardDecode -- if the template has a fixed size, determines whether it is aligned with the front or the back of the packet.
+        
+        Returns (inputPacket, startIndex, endIndex, workingPacket) where:
+        inputPacket -- the packet as either a list, or a memoryview if it was provided as a buffer.
+        startIndex, endIndex -- the span of the packet occupied by the template.
+        workingPacket -- whatever packet remains after decoding, as in template.decode.
+        """
+        if isinstance(inputPacket, (bytearray, memoryview)): inputPacket = memoryview(inputPacket)  #slices of the buffer are views rather than copies
+        elif type(inputPacket) != list: inputPacket = list(inputPacket)   #slices of the packet will be provided to the tokens as lists
+        packetLength = len(inputPacket)
+        
+        if self.size > 0:   #template has a fixed size, so align it with one end of the packet
+            if forwardDecode:
+                startIndex, endIndex = 0, self.size
+                remainingPacket = inputPacket[self.size:]
+            else:
+                startIndex, endIndex = packetLength - self.size, packetLength
+                remainingPacket = inputPacket[:startIndex]
+            if type(remainingPacket) == memoryview: remainingPacket = remainingPacket.tolist()
+        else:   #template contains an unbounded token, so spans the entire packet
+            startIndex, endIndex = 0, packetLength
+            remainingPacket = []
+        return inputPacket, startIndex, endIndex, remainingPacket
+    
+    def tokenRanges(self, startIndex, endIndex):
+        """Returns the span of each token in a template that occupies [startIndex:endIndex] of a packet.
+        
+        Returns a list of (token, tokenStartIndex, tokenEndIndex, isEmbedded) in template order.
+        """
+        unboundedEndIndex = endIndex - self.backSize    #the unbounded token ends where the back tokens begin
+        ranges = []
+        for token, offset, size, fromBack, isEmbedded in self.decodePlan:
+            if fromBack: tokenStartIndex = endIndex - offset
+            else: tokenStartIndex = startIndex + offset
+            if size: ranges += [(token, tokenStartIndex, tokenStartIndex + size, isEmbedded)]
+            else: ranges += [(token, tokenStartIndex, unboundedEndIndex, isEmbedded)]
+        return ranges
+    
+    def sliceTokens(self, inputPacket, forwardDecode = True):
+        """Splits the provided packet into the slices to be decoded by each token.
+        
+        inputPacket -- the packet to be sliced.
+        forwardDecode -- if the template has a fixed size, determines whether it is aligned with the front or the back of the packet.
+        
+        Returns (tokenSlices, workingPacket, isBuffer) where:
+        tokenSlices -- a list of (token, decodePacket, isEmbedded) in template order.
+        workingPacket -- whatever packet remains after decoding, as in template.decode.
+        isBuffer -- True if the slices are memoryviews of a buffer, or False if they are lists.
+        """
+        inputPacket, startIndex, endIndex, remainingPacket = self.locateTemplate(inputPacket, forwardDecode)
+        tokenSlices = [(token, inputPacket[tokenStartIndex:tokenEndIndex], isEmbedded) for token, tokenStartIndex, tokenEndIndex, isEmbedded in self.tokenRanges(startIndex, endIndex)]
+        return tokenSlices, remainingPacket, type(inputPacket) == memoryview
+
+    
+    def checkDeltaSupport(self):
+        """Raises a CompositionError if the template can't be delta encoded.
+        
+        Delta packets omit unchanged tokens, so templates with length or checksum tokens, whose values depend on the entire packet,
+        are not supported. These belong in the frame that carries the delta packet.
+        """
+        if self.slotSize:
+            raise errors.CompositionError("Template " + self.template.name + " can't be delta encoded, because it contains length or checksum tokens.")
+    
+    def encodeSegments(self, encodeDict):
+        """Serializes each token of the template separately.
+        
+        Returns a list with the encoded bytes of each token, in template order.
+        """
+        self.checkDeltaSupport()
+        segments = []
+        for token, slotType in self.encodePlan:
+            encodedToken = token.encode(encodeDict)
+            if hasattr(encodedToken, '__iter__'): segments += [list(encodedToken)]
+            else: segments += [[encodedToken]]  #catches tokens that encode into a single integer
+        return segments
+    
+    @staticmethod
+    def changedSegments(segments, referenceSegments):
+        """Returns the indices of the segments that differ from the reference segments."""
+        return [index for index, segment in enumerate(segments) if segment != referenceSegments[index]]
+    
+    def encodeDelta(self, segments, presentIndices, packetType = serializedPacket):
+        """Serializes a delta packet from a list of encoded token segments.
+        
+        segments -- the encoded bytes of each token, as returned by encodeSegments.
+        presentIndices -- the indices of the tokens to include in the packet.
+        packetType -- the type of packet to be returned, either packets.serializedPacket or packets.serializedBuffer.
+        
+        Returns a packet of type packetType, starting with a presence bitmap in which bit n (LSB first) is set if token n is included.
+        """
+        presenceBitmap = [0]*((len(segments) + 7)//8)
+        for index in presentIndices: presenceBitmap[index >> 3] |= 1 << (index & 7)
+        encodedPacket = packetType(presenceBitmap, self.template)
+        for index in sorted(presentIndices): encodedPacket.extend(segments[index])
+        return encodedPacket
+    
+    def decodeDelta(self, inputPacket, referenceDict = None):
+        """Deserializes a delta packet into a complete key:value dictionary.
+        
+        inputPacket -- the delta packet to be decoded.
+        referenceDict -- the decoded dictionary of the reference packet, which supplies the values of the absent tokens.
+        
+        Returns (decodeDict, presentIndices), where presentIndices lists the tokens that were included in the packet.
+        """
+        self.checkDeltaSupport()
+        if isinstance(inputPacket, (bytearray, memoryview)): inputPacket = memoryview(inputPacket)
+        elif type(inputPacket) != list: inputPacket = list(inputPacket)
+        tokenCount = len(self.encodePlan)
+        bitmapSize = (tokenCount + 7)//8
+        if len(inputPacket) < bitmapSize:
+            raise ValueError("Packet is too short to contain the presence bitmap of template " + self.template.name + ".")
+        presenceBitmap = inputPacket[:bitmapSize]
+        if type(presenceBitmap) == memoryview: presenceBitmap = presenceBitmap.tolist()
+        presentIndices = [index for index in range(tokenCount) if presenceBitmap[index >> 3] & (1 << (index & 7))]
+        if referenceDict == None and len(presentIndices) < tokenCount:
+            raise ValueError("Delta packet for template " + self.template.name + " omits tokens, but no reference packet was provided.")
+        
+        packetLength = len(inputPacket)
+        fixedSize = sum([self.encodePlan[index][0].size for index in presentIndices])  #an unbounded token takes whatever remains
+        if fixedSize > packetLength - bitmapSize:
+            raise ValueError("Delta packet for template " + self.template.name + " is too short to contain the tokens it lists.")
+        
+        if referenceDict == None: decodeDict = {}
+        else: decodeDict = dict(referenceDict)
+        tokenStartIndex = bitmapSize
+        for index in presentIndices:
+            token = self.encodePlan[index][0]
+            if token.size: tokenEndIndex = tokenStartIndex + token.size
+            else: tokenEndIndex = tokenStartIndex + packetLength - bitmapSize - fixedSize
+            decodeDict.update(token.decodeRange(inputPacket, tokenStartIndex, tokenEndIndex))
+            tokenStartIndex = tokenEndIndex
+        return decodeDict, presentIndices
+
+class framePrefix(object):
+    """The leading tokens of a template, encoded in advance for a fixed set of values.
+    
+    Packets that share their leading values, e.g. the start byte, address, and port of a gestalt packet, are encoded by copying the
+    prefix and encoding only the remaining tokens. The CRC of the prefix is also stored, so that checksums only cover the new bytes.
+    Frame prefixes are obtained thru template.getFramePrefix, which caches them.
+    """
+    def __init__(self, frameTemplate, prefixDict):
+        """Initializes the frame prefix.
+        
+        frameTemplate -- the packets.template whose packets are to be encoded.
+        prefixDict -- a dictionary of key:value pairs for the leading tokens of the template. The prefix extends up to the first token
+                      that isn't in prefixDict, or that is a length, checksum, or embedded template.
+        """
+        if frameTemplate.codec == None: frameTemplate.compile()   #compile on first use
+        self.template = frameTemplate
+        self.codec = frameTemplate.codec
+        self.prefixBytes = []
+        tokenCount = 0
+        for token, slotType in self.codec.encodePlan:
+            if slotType != None or type(token) == template or type(token) == packetTemplate or token.keyName not in prefixDict: break
+            encodedToken = token.encode(prefixDict)
+            if hasattr(encodedToken, '__iter__'): self.prefixBytes.extend(encodedToken)
+            else: self.prefixBytes.append(encodedToken)
+            tokenCount += 1
+        self.size = len(self.prefixBytes)
+        self.encodePlan = self.codec.encodePlan[tokenCount:]  #the tokens that remain to be encoded
+        self.checksumStates = dict((token, token.CRCInstance.generate(self.prefixBytes)) for token, slotType in self.encodePlan if slotType == checksum)  #{token: CRC of prefix}
+    
+    def encode(self, encodeDict):
+        """Serializes the provided encode dictionary following the prefix.
+        
+        encodeDict -- the dictionary of key:value pairs for the tokens that follow the prefix.
+        
+        Returns a packets.serializedPacket object.
+        """
+        return self.codec.encodeTokens(encodeDict, serializedPacket, self)
+    
+    def encodeBuffer(self, encodeDict, packetBuffer = None):
+        """Serializes the provided encode dictionary following the prefix.
+        
+        packetBuffer -- an optional empty packets.serializedBuffer to encode into, e.g. one acquired from a packets.bufferPool.
+        
+        Returns a packets.serializedBuffer object.
+        """
+        return self.codec.encodeTokens(encodeDict, serializedBuffer, self, packetBuffer)
+
+
+class lazyDecodeDict(collections.MutableMapping):
+    """A decoded packet dictionary that defers decoding each token until its key is first accessed.
+    
+    The dictionary holds slices of the original packet, which for a packets.serializedBuffer are views rather than copies. Each token is
+    decoded on first access and the result is cached. Tokens in embedded templates are decoded lazily by a nested lazyDecodeDict.
+    """
+    def __init__(self, tokenSlices, isBuffer):
+        """Initializes the lazy decode dictionary.
+        
+        tokenSlices -- a list of (token, decodePacket, isEmbedded), as returned by templateCodec.sliceTokens
+        isBuffer -- True if the slices are memoryviews, which are converted to lists before being provided to most tokens.
+        """
+        self.pendingTokens = collections.OrderedDict()  #{keyName: (token, decodePacket)} for tokens that haven't yet been decoded
+        self.decodedValues = {} #{keyName: decodedValue} for tokens that have been decoded or assigned
+        self.isBuffer = isBuffer
+        for token, decodePacket, isEmbedded in tokenSlices:
+            if isEmbedded:  #defer to a nested lazy decode dictionary
+                embeddedTemplate = token.template if type(token) == packetTemplate else token
+                embeddedDict = embeddedTemplate.decode(decodePacket, True, lazy = True)[0]
+                for keyName in embeddedDict:
+                    self.pendingTokens[keyName] = (embeddedDict, None)
+            else:
+                self.pendingTokens[token.keyName] = (token, decodePacket)
+    
+    def __getitem__(self, keyName):
+        if keyName in self.decodedValues:
+            return self.decodedValues[keyName]
+        token, decodePacket = self.pendingTokens[keyName]  #raises a KeyError if not found
+        if type(token) == lazyDecodeDict: decodedValue = token[keyName]
+        elif self.isBuffer and not token.decodeFromView: decodedValue = token._decode_(decodePacket.tolist())
+        else: decodedValue = token._decode_(decodePacket)
+        del self.pendingTokens[keyName] #only once decoded, so that a token that fails to decode raises the same error on every access
+        self.decodedValues[keyName] = decodedValue
+        return decodedValue
+    
+    def __setitem__(self, keyName, value):
+        self.pendingTokens.pop(keyName, None)
+        self.decodedValues[keyName] = value
+    
+    def __delitem__(self, keyName):
+        if keyName in self.pendingTokens: del self.pendingTokens[keyName]
+        else: del self.decodedValues[keyName]
+    
+    def __iter__(self):
+        return itertools.chain(self.decodedValues.keys(), self.pendingTokens.keys())
+    
+    def __len__(self):
+        return len(self.decodedValues) + len(self.pendingTokens)
+    
+    def __contains__(self, keyName):
+        return keyName in self.decodedValues or keyName in self.pendingTokens
+    
+    def __copy__(self):
+        copiedDict = lazyDecodeDict([], self.isBuffer)
+        copiedDict.pendingTokens = collections.OrderedDict(self.pendingTokens)
+        copiedDict.decodedValues = dict(self.decodedValues)
+        return copiedDict
+    
+    def __repr__(self):
+        return repr(self.toDict())
+    
+    def toDict(self):
+        """Decodes any remaining tokens and returns a regular dictionary."""
+        return dict(self.items())
+    
+
+class streamDecoder(object):
+    """Frames and decodes packets from a stream of bytes that arrive in arbitrarily sized chunks.
+    
+    Received bytes are appended to an internal buffer, and a cursor marks the start of the frame currently being received. The frame
+    length is read from the template's length token as soon as the header has arrived, using offsets that are precomputed by the template's
+    codec, and so each received byte is only examined once.
+    """
+    def __init__(self, frameTemplate, syncTokenName = None, syncValues = (), checksumName = None):
+        """Initializes the stream decoder.
+        
+        frameTemplate -- the packets.template used to decode frames. It must either be of fixed size, or contain a length token ahead of any
+                         token of unbounded size.
+        syncTokenName -- the name of a token at the start of every frame, e.g. a start byte. If provided, any frame whose sync token doesn't
+                         match one of syncValues is discarded one byte at a time until the stream is back in sync.
+        syncValues -- a list of valid values for the sync token.
+        checksumName -- the name of the checksum token used to validate each frame. If not provided, the first checksum token in the template
+                        is used if one exists. Frames that fail validation are discarded.
+        """
+        self.template = frameTemplate
+        if frameTemplate.codec == None: frameTemplate.compile()
+        codec = frameTemplate.codec
+        
+        self.minimumFrameSize = codec.frontSize + codec.backSize    #the shortest frame that the template can decode
+        self.lengthToken = None
+        self.headerSize = 0 #the number of bytes that must be received before the frame length is known
+        for token, offset, size, fromBack, isEmbedded in codec.decodePlan:
+            if type(token) == length and not fromBack:
+                self.lengthToken = token
+                self.lengthOffset = offset
+                self.headerSize = offset + token.size
+                self.lengthAdjustment = codec.slotSize - int(token.countSelf)  #frame length = length value + length adjustment
+                break
+        if self.lengthToken == None and codec.size <= 0:
+            raise errors.CompositionError("Stream decoder requires template " + frameTemplate.name + " to have either a fixed size, or a length token ahead of its unbounded token.")
+        
+        self.syncToken = None
+        self.syncValues = syncValues
+        if syncTokenName != None:
+            syncPosition = codec.findTokenPosition(syncTokenName, self.minimumFrameSize) if codec.tokenIndex != None else (0, 0, None)
+            if syncPosition[2] == None or syncPosition[0] != 0 or syncPosition[1] > self.minimumFrameSize:
+                raise errors.CompositionError("Sync token " + str(syncTokenName) + " must be at the start of template " + frameTemplate.name + ".")
+            self.syncToken = syncPosition[2]
+            self.headerSize = max(self.headerSize, self.syncToken.size)
+        
+        if checksumName == None:
+            checksumTokens = [token for token, offset, size, fromBack, isEmbedded in codec.decodePlan if type(token) == checksum]
+            if checksumTokens: checksumName = checksumTokens[0].keyName
+        self.checksumName = checksumName
+        
+        self.framesDecoded = 0  #number of frames successfully decoded
+        self.framesRejected = 0 #number of frames discarded because of an invalid length or checksum
+        self.syncErrors = 0 #number of bytes discarded while searching for a valid sync token
+        self.reset()
+    
+    def reset(self):
+        """Discards any partially received frame, e.g. after the stream has timed out."""
+        self.buffer = bytearray()
+        self.cursor = 0 #the start of the current frame in self.buffer
+        self.frameLength = None #the length of the current frame, once its header has been received
+    
+    def feed(self, chunk):
+        """Appends a chunk of received bytes to the stream, and returns any frames that were completed by it.
+        
+        chunk -- the received bytes, as a string, bytearray, or list of integers.
+        
+        Returns a list of decoded dictionaries, one for each complete frame that validated against its checksum.
+        """
+        buffer = self.buffer
+        buffer.extend(chunk)
+        decodedFrames = []
+        
+        while True:
+            availableBytes = len(buffer) - self.cursor
+            if self.frameLength == None:    #still receiving the frame header
+                if availableBytes < self.headerSize:
+                    break
+                if self.syncToken and self.syncToken._decode_(buffer[self.cursor:self.cursor + self.syncToken.size]) not in self.syncValues:
+                    self.cursor += 1    #out of sync, discard a byte and try again
+                    self.syncErrors += 1
+                    continue
+                if self.lengthToken:
+                    lengthStart = self.cursor + self.lengthOffset
+                    frameLength = self.lengthToken._decode_(buffer[lengthStart:lengthStart + self.lengthToken.size]) + self.lengthAdjustment
+                    if frameLength < max(self.minimumFrameSize, self.headerSize):   #reported length is impossible, so can't be in sync
+                        self.cursor += 1
+                        self.framesRejected += 1
+                        continue
+                    self.frameLength = frameLength
+                else:
+                    self.frameLength = self.template.size
+            
+            if availableBytes < self.frameLength:   #frame is incomplete
+                break
+            
+            frame = serializedBuffer(buffer[self.cursor:self.cursor + self.frameLength], self.template)
+            self.cursor += self.frameLength
+            self.frameLength = None
+            if self.checksumName != None and not self.template.validateChecksum(self.checksumName, frame):
+                self.framesRejected += 1
+                continue
+            decodedFrames += [self.template.decode(frame)[0]]
+            self.framesDecoded += 1
+        
+        if self.cursor:    #discard consumed bytes
+            del buffer[:self.cursor]
+            self.cursor = 0
+        return decodedFrames
+
+
+class deltaEncoder(object):
+    """Delta encodes packets on several channels, each relative to the last packet acknowledged on that channel.
+    
+    A channel is typically a (node, port) pair. Each packet includes every token that differs from the acknowledged reference packet, as
+    well as any token that differed in a packet sent since, so that the receiver decodes correctly regardless of which of the
+    unacknowledged packets it last received. The first packet on a channel, or after a reset, includes every token.
+    """
+    def __init__(self, deltaTemplate):
+        """Initializes the delta encoder.
+        
+        deltaTemplate -- the packets.template used to encode packets. It may not contain length or checksum tokens.
+        """
+        self.template = deltaTemplate
+        if deltaTemplate.codec == None: deltaTemplate.compile()
+        self.codec = deltaTemplate.codec
+        self.codec.checkDeltaSupport()
+        self.channels = {}  #{channelKey: [referenceSegments, lastSegments, pendingIndices]}
+        self.channelLock = threading.Lock()  #packets may be encoded from several threads at once
+        self.encodedBytes = 0   #total size of the delta packets that have been encoded
+        self.fullBytes = 0  #total size that the same packets would have taken if fully encoded
+    
+    def encode(self, channelKey, encodeDict, packetType = serializedPacket):
+        """Delta encodes a packet on the provided channel.
+        
+        channelKey -- a hashable key identifying the receiver, e.g. (node, port).
+        encodeDict -- the input dictionary to be encoded using the template.
+        packetType -- the type of packet to be returned, either packets.serializedPacket or packets.serializedBuffer.
+        
+        Returns a packet of type packetType, which should be decoded by a packets.deltaDecoder.
+        """
+        segments = self.codec.encodeSegments(encodeDict)
+        with self.channelLock:
+            if channelKey in self.channels: referenceSegments, lastSegments, pendingIndices = self.channels[channelKey]
+            else: referenceSegments, pendingIndices = None, set()
+            if referenceSegments == None: presentIndices = range(len(segments))
+            else:
+                pendingIndices.update(self.codec.changedSegments(segments, referenceSegments))
+                presentIndices = pendingIndices
+            encodedPacket = self.codec.encodeDelta(segments, presentIndices, packetType)
+            self.channels[channelKey] = [referenceSegments, segments, pendingIndices]
+            self.encodedBytes += len(encodedPacket)
+            self.fullBytes += sum([len(segment) for segment in segments])
+        return encodedPacket
+    
+    def encodeBuffer(self, channelKey, encodeDict):
+        """Delta encodes a packet on the provided channel.
+        
+        Returns a packets.serializedBuffer object.
+        """
+        return self.encode(channelKey, encodeDict, serializedBuffer)
+    
+    def acknowledge(self, channelKey):
+        """Marks the most recently encoded packet on the provided channel as received, making it the reference for future packets."""
+        with self.channelLock:
+            if channelKey in self.channels:
+                lastSegments = self.channels[channelKey][1]
+                self.channels[channelKey] = [lastSegments, lastSegments, set()]
+    
+    def reset(self, channelKey = None):
+        """Forgets the reference packet of the provided channel, or of every channel if none is provided.
+        
+        The next packet on the channel will include every token, e.g. after the receiver has been reset.
+        """
+        with self.channelLock:
+            if channelKey == None: self.channels.clear()
+            else: self.channels.pop(channelKey, None)
+
+
+class deltaDecoder(object):
+    """Decodes delta packets on several channels, each relative to the last packet decoded on that channel."""
+    def __init__(self, deltaTemplate):
+        """Initializes the delta decoder.
+        
+        deltaTemplate -- the packets.template used to decode packets. It may not contain length or checksum tokens.
+        """
+        self.template = deltaTemplate
+        if deltaTemplate.codec == None: deltaTemplate.compile()
+        self.codec = deltaTemplate.codec
+        self.codec.checkDeltaSupport()
+        self.references = {}    #{channelKey: decodeDict}
+        self.referenceLock = threading.Lock()
+    
+    def decode(self, channelKey, inputPacket):
+        """Decodes a delta packet received on the provided channel, and makes it the reference for the next packet.
+        
+        channelKey -- a hashable key identifying the sender, e.g. (node, port).
+        inputPacket -- the delta packet to be decoded.
+        
+        Returns the complete decoded dictionary. Raises a ValueError if the packet omits tokens and no reference has been decoded.
+        """
+        with self.referenceLock:
+            decodeDict = self.codec.decodeDelta(inputPacket, self.references.get(channelKey))[0]
+            self.references[channelKey] = decodeDict
+        return dict(decodeDict)
+    
+    def reset(self, channelKey = None):
+        """Forgets the reference packet of the provided channel, or of every channel if none is provided."""
+        with self.referenceLock:
+            if channelKey == None: self.references.clear()
+            else: self.references.pop(channelKey, None)
+
 class packetToken(object):
     """Base class for creating packet tokens, which are elements that handle encoding and decoding each segment of a packet."""
     
@@ -399,12 +1953,54 @@ class packetToken(object):
         self.requireEncodeDict = True   #by default, tokens require an encode dictionary in order to encode packets. Exceptions include length and checksum tokens.
         self.size = 0   # by default, tokens encode to and decode from a list of predetermined size. Exceptions incude pList, pString, and packet tokens.
                         # size = 0 means it has no predetermined size, which is a fail-safe default for validation.
+        self.structCode = None  #if set by the subclass to a struct format character, the token can be encoded by a template's struct fast path.
+        self.decodeFromView = False #if True, the token is provided with a memoryview rather than a list when decoding a packets.serializedBuffer.
+        self.initArguments = (args, kwargs) #retained so that structurally identical tokens can be identified
         self.init(*args, **kwargs)    # call subclass init function to do something with additional arguments.
     
     def init(self, *args, **kwargs):
         """Secondary initializer should be over-ridden by subclass.""" 
         pass
     
+    def signature(self):
+        """Returns a hashable description of the token, consisting of its type, keyName, and the arguments it was created with."""
+        args, kwargs = self.initArguments
+        return (type(self), self.keyName, self.freezeArgument(args), self.freezeArgument(sorted(kwargs.items())))
+    
+    @classmethod
+    def freezeArgument(cls, argument):
+        """Converts a token argument into a hashable form. Templates and tokens are represented by their signatures."""
+        if hasattr(argument, 'signature'): return argument.signature()
+        if type(argument) in (list, tuple): return (type(argument), tuple(cls.freezeArgument(element) for element in argument))
+        return argument
+    
+    def _packValue_(self, encodeValue):
+        """Converts a value from the encode dictionary into the integer that gets packed by the token's struct code.
+        
+        Tokens that set a structCode should override this method if the value needs conversion. A ValueError should be raised
+        for any value that the struct module would not pack exactly as the token's _encode_ method does, in which case the
+        template falls back on encoding token-by-token.
+        """
+        return encodeValue
+    
+    def _unpackValue_(self, structValue):
+        """Converts an integer unpacked using the token's struct code into the decoded value.
+        
+        Tokens that set a structCode should override this method if the value needs conversion.
+        """
+        return structValue
+    
+    def _arrayFields_(self):
+        """Returns a list of (fieldName, dtype) tuples that the token decodes into when decoding packets into a NumPy array.
+        
+        By default the token is represented by a single field containing its packed little-endian integer value.
+        """
+        return [(self.keyName, '<' + self.structCode)]
+    
+    def _unpackArray_(self, packedValues):
+        """Converts an array of packed integer values into a list of decoded arrays, one for each of the token's array fields."""
+        return [packedValues]
+    
     def encode(self, encodeDict, inProcessPacket = []):
         """Serializes the value keyName in encodeDict using the subclass's _encode_ method.
         
@@ -443,6 +2039,17 @@ class packetToken(object):
         decodedValue = self._decode_(decodePacket)
         
         return {self.keyName:decodedValue}, remainingPacket
+    
+    def decodeRange(self, inputPacket, startIndex, endIndex):
+        """Decodes the token occupying inputPacket[startIndex:endIndex] into a key:value pair.
+        
+        Unlike decode, this doesn't split off the remainder of the packet, and is used by templates to decode tokens in place.
+        
+        Returns {keyName: decodedValue}
+        """
+        decodePacket = inputPacket[startIndex:endIndex]
+        if type(decodePacket) == memoryview and not self.decodeFromView: decodePacket = decodePacket.tolist()
+        return {self.keyName:self._decode_(decodePacket)}
 
 
 #---- TOKEN TYPES ----
@@ -456,6 +2063,7 @@ class unsignedInt(packetToken):
         size -- the length in bytes of the unsigned integer.
         """
         self.size = size # length of unsigned integer
+        self.structCode = utilities.unsignedStructCodes.get(size)
     
     def _encode_(self, encodeValue, inProcessPacket):
         """Converts an unsigned integer into a sequence of bytes.
@@ -470,6 +2078,15 @@ class unsignedInt(packetToken):
         decodePacket -- the ordered list of bytes to be converted into an unsigned integer.
         """
         return utilities.bytesToUnsignedInteger(decodePacket)
+    
+    def _packValue_(self, encodeValue):
+        """Returns the unsigned integer to be packed by the struct fast path.
+        
+        Negative values are wrapped around by utilities.unsignedIntegerToBytes rather than rejected, so are left to _encode_.
+        """
+        if type(encodeValue) not in (int, long, float) or encodeValue < 0:
+            raise ValueError("Value " + str(encodeValue) + " can't be packed as an unsigned integer.")
+        return int(encodeValue)
 
 
 class length(packetToken):
@@ -483,6 +2100,7 @@ class length(packetToken):
         self.size = size
         self.countSelf = countSelf
         self.requireEncodeDict = False  #does not require an encode dictionary, because input is the entire in-process packet
+        self.structCode = utilities.unsignedStructCodes.get(size)
     
     def _encode_(self, encodeValue, inProcessPacket):
         """Returns the length of the inProcessPacket, either including or nor itself.
@@ -497,10 +2115,26 @@ class length(packetToken):
         if len(inProcessPacket)>0:  #an inProcess packet has been provided
             #create and count a list only containing integers from the flattened inProcessPacket
             length = len(list(itertools.ifilter(lambda token: type(token) == int, utilities.flattenList(inProcessPacket))))
-            if self.countSelf: length += 1
-            return utilities.unsignedIntegerToBytes(length, self.size)  #convert to integer of lenth self.size
+            return self.encodeLength(length)
         else: return self   #no in-process packet has been provided.
     
+    def encodeLength(self, payloadLength):
+        """Encodes a length value.
+        
+        payloadLength -- the number of bytes in the packet, not including any length or checksum tokens.
+        
+        Returns the length token's list of bytes.
+        """
+        return utilities.unsignedIntegerToBytes(self.calculateLength(payloadLength), self.size)  #convert to integer of lenth self.size
+    
+    def calculateLength(self, payloadLength):
+        """Returns the length value reported by the token.
+        
+        payloadLength -- the number of bytes in the packet, not including any length or checksum tokens.
+        """
+        if self.countSelf: return payloadLength + 1
+        else: return payloadLength
+    
     def _decode_(self, decodePacket):
         """Decodes the provided packet snippet into an unsigned integer ostensibly representing a length.
         
@@ -513,14 +2147,25 @@ class length(packetToken):
 
 class checksum(packetToken):
     """Performs a checksum operation on the in-process packet."""
-    def init(self, polynomial = 7):
+    def init(self, polynomial = 7, algorithm = 'CRC-8'):
         """Initializes the checksum token.
         
-        polynomial -- defines the taps used to generate a CRC value. For Gestalt, this defaults to 7 (ATM standard)
+        polynomial -- defines the taps used to generate a CRC-8 value. For Gestalt, this defaults to 7 (ATM standard)
+        algorithm -- the CRC algorithm, one of 'CRC-8', 'CRC-16/CCITT', 'CRC-16/XMODEM', 'CRC-16/MODBUS', or 'CRC-32'.
+                     The size of the token is set by the algorithm. Multi-byte checksums are encoded LSB first.
         """
-        self.CRCInstance = utilities.CRC(polynomial)    # initialize a CRC gen/test class
+        if algorithm == 'CRC-8':
+            self.CRCInstance = utilities.CRC(polynomial)    # initialize a CRC gen/test class
+        elif algorithm[:7] == 'CRC-16/' and algorithm[7:] in utilities.CRC16.variants:
+            self.CRCInstance = utilities.CRC16(algorithm[7:])
+        elif algorithm == 'CRC-32':
+            self.CRCInstance = utilities.CRC32()
+        else:
+            raise errors.CompositionError("Checksum algorithm " + str(algorithm) + " is not supported.")
+        self.algorithm = algorithm
         self.requireEncodeDict = False  #doesn't need an input from the encode dictionary
-        self.size = 1   #for now only supports single-byte checksums
+        self.size = self.CRCInstance.size
+        self.structCode = utilities.unsignedStructCodes.get(self.size)
     
     def _encode_(self, encodeValue, inProcessPacket):
         """Returns the checksum value of the in-process packet.
@@ -531,8 +2176,19 @@ class checksum(packetToken):
         if len(inProcessPacket)>0: #an inProcess packet has been provided
             # create list of all the ints. At this point that should be everything but the checksum token
             checksumList = list(itertools.ifilter(lambda token: type(token) == int, utilities.flattenList(inProcessPacket)))
-            return self.CRCInstance.generate(checksumList)  #generate and return checksum
+            if self.size == 1: return self.CRCInstance.generate(checksumList)  #generate and return checksum
+            else: return self.encodeChecksum(checksumList)
         else: return self
+    
+    def encodeChecksum(self, byteList, crc = None):
+        """Encodes the checksum of a flat list of bytes.
+        
+        byteList -- the bytes to be checksummed, not including the checksum token itself.
+        crc -- the CRC of any preceding bytes, if the checksum is being continued from an earlier part of the packet.
+        
+        Returns the checksum token's list of bytes.
+        """
+        return utilities.unsignedIntegerToBytes(self.CRCInstance.generate(byteList, crc), self.size)
         
     def _decode_(self, decodePacket):
         """Decodes the provided packet snippet into an unsigned integer ostensibly representing a checksum.
@@ -592,6 +2248,70 @@ class pString(packetToken):
         return utilities.listToString(decodePacket)
 
 
+class pArray(packetToken):
+    """A typed array token, for homogeneous sequences of numbers.
+    
+    The whole array is converted with a single struct call, rather than one token per element.
+    Note that if no count is provided, the number of elements is determined by the run-time input to the encoder or decoder.
+    """
+    elementTypes = {'uint8':'B', 'int8':'b', 'uint16':'H', 'int16':'h', 'uint32':'I', 'int32':'i', 'uint64':'Q', 'int64':'q'}   #{typeName: struct code}
+    
+    def init(self, elementType, count = 0):
+        """Initializer for typed array tokens.
+        
+        elementType -- the type of each element. Either the name of an integer type, e.g. 'int16' or 'uint32', or an unsignedInt,
+                       signedInt, or fixedPoint token whose format is used for every element, e.g. packets.fixedPoint('sample', 1, 15).
+        count -- the number of elements in the array. If 0, the array is unbounded.
+        """
+        if isinstance(elementType, packetToken):
+            if type(elementType) not in (unsignedInt, signedInt, fixedPoint) or elementType.structCode == None:
+                raise errors.CompositionError("Array " + str(self.keyName) + " elements must be 1, 2, 4, or 8 byte unsignedInt, signedInt, or fixedPoint tokens.")
+            self.elementToken = elementType
+            self.elementCode = elementType.structCode
+        elif elementType in self.elementTypes:
+            self.elementToken = None    #elements are packed as-is
+            self.elementCode = self.elementTypes[elementType]
+        else:
+            raise errors.CompositionError("Array element type " + str(elementType) + " is not supported.")
+        self.elementSize = struct.calcsize('<' + self.elementCode)
+        self.count = count
+        self.size = count * self.elementSize    # if 0, length is determined by the run-time input to the encoder or decoder
+        if count: self.arrayStruct = struct.Struct('<' + str(count) + self.elementCode)
+        else: self.arrayStruct = None
+        self.decodeFromView = True  #the struct module unpacks directly from memoryviews
+    
+    def getStruct(self, count):
+        """Returns the struct used to convert an array with the provided number of elements."""
+        if self.arrayStruct: return self.arrayStruct
+        return struct.Struct('<' + str(count) + self.elementCode)
+    
+    def _encode_(self, encodeValue, inProcessPacket):
+        """Packs the provided sequence of numbers into a list of bytes.
+        
+        encodeValue -- the sequence of numbers to be encoded. If the array has a fixed count, must contain exactly that many elements.
+        """
+        if numpy != None and isinstance(encodeValue, numpy.ndarray): encodeValue = encodeValue.tolist()
+        if self.elementToken: encodeValue = [self.elementToken._packValue_(value) for value in encodeValue]
+        if self.arrayStruct and len(encodeValue) != self.count:
+            raise ValueError("Array " + str(self.keyName) + " requires " + str(self.count) + " elements, but " + str(len(encodeValue)) + " were provided.")
+        try:
+            return list(bytearray(self.getStruct(len(encodeValue)).pack(*encodeValue)))
+        except struct.error as error:
+            raise ValueError("Array " + str(self.keyName) + " can't be encoded: " + str(error))
+    
+    def _decode_(self, decodePacket):
+        """Decodes the provided packet snippet into a list of numbers.
+        
+        decodePacket -- the list of bytes or memoryview to be converted. Must be a whole number of elements long.
+        """
+        if len(decodePacket) % self.elementSize:
+            raise ValueError("Array " + str(self.keyName) + " can't be decoded from " + str(len(decodePacket)) + " bytes, which is not a whole number of elements.")
+        if type(decodePacket) != memoryview: decodePacket = bytearray(decodePacket)
+        decodedValues = self.getStruct(len(decodePacket) // self.elementSize).unpack(decodePacket)
+        if self.elementToken: return [self.elementToken._unpackValue_(value) for value in decodedValues]
+        return list(decodedValues)
+
+
 class packet(packetToken):
     """An embedded packet.
     
@@ -601,19 +2321,24 @@ class packet(packetToken):
     def init(self):
         """Initializer for packet token type."""
         self.size = 0  # length is determined by the runt-time input to the encoder or decoder
+        self.decodeFromView = True  #sub-packets of a packets.serializedBuffer are decoded as views into the buffer
         
     def _encode_(self, encodeValue, inProcessPacket):
         """Converts sub-packet to list, and insert into packet.
         
         encodeValue -- contains a packets.packet instance.
         """
-        return list(encodeValue)
+        if type(encodeValue) == memoryview: return encodeValue.tolist()   #memoryviews iterate over characters in python 2
+        elif isinstance(encodeValue, bytearray): return encodeValue    #buffers are copied directly into the packet being encoded
+        else: return list(encodeValue)
     
     def _decode_(self, decodePacket):
         """Decodes the provided packet snippet into a packets.serializedPacket object.
         
-        decodePacket -- the list to be converted into a serializd packet object.
+        decodePacket -- the list to be converted into a serializd packet object. If a memoryview is provided, it is returned as-is
+                        so that the sub-packet references the original buffer rather than a copy.
         """
+        if type(decodePacket) == memoryview: return decodePacket
         return serializedPacket(decodePacket)
 
 
@@ -647,6 +2372,10 @@ class packetTemplate(packetToken):
         """
         return self.template.decode(inputPacket, forwardDecode)
     
+    def decodeRange(self, inputPacket, startIndex, endIndex):
+        """Decodes child template in place by passing along decodeRange call."""
+        return self.template.decodeRange(inputPacket, startIndex, endIndex)
+    
     def findTokenPositionInTemplate(self, tokenName):
         """Returns the index range that a referenced token spans in the input packet.
         
@@ -670,6 +2399,8 @@ class signedInt(packetToken):
         """
         self.size = size
         self.bitSize = size*8
+        self.maxValue = 2**(self.bitSize - 1) - 1   #matches the range accepted by utilities.signedIntegerToTwosComplement
+        self.structCode = signedStructCodes.get(size)
         
     def _encode_(self, encodeValue, inProcessPacket):
         """Encodes the provided value into a signed integer fit within the specified number of bytes.
@@ -686,6 +2417,12 @@ class signedInt(packetToken):
         """
         twosComplementInteger = utilities.bytesToUnsignedInteger(decodePacket)
         return utilities.twosComplementToSignedInteger(twosComplementInteger, self.bitSize)
+    
+    def _packValue_(self, encodeValue):
+        """Returns the signed integer to be packed by the struct fast path."""
+        if abs(encodeValue) > self.maxValue:
+            raise ValueError("Value " + str(encodeValue) + " exceeds the range of a " + str(self.size) + " byte signed integer.")
+        return int(encodeValue)
            
 
 class fixedPoint(packetToken):
@@ -704,6 +2441,7 @@ class fixedPoint(packetToken):
         self.fractionalBits = fractionalBits
         self.bitSize = integerBits + fractionalBits
         self.size = int(math.ceil((self.bitSize)/8.0))   #smallest number of bytes that will contain the fixed-point format.
+        self.structCode = utilities.unsignedStructCodes.get(self.size)
     
     def _encode_(self, encodeValue, inProcessPacket):
         """Encodes the provided value into a signed fixed-point decimal."""
@@ -720,14 +2458,43 @@ class fixedPoint(packetToken):
         
         decodePacket -- the ordered list of bytes to be converted into a fixed point decimal.
         """
-        twosComplementRepresentation = utilities.bytesToUnsignedInteger(decodePacket)
-        twosComplementRepresentation = twosComplementRepresentation&(2**(self.bitSize) - 1) #mask off any unwanted bits
+        return self._unpackValue_(utilities.bytesToUnsignedInteger(decodePacket))
+    
+    def _packValue_(self, encodeValue):
+        """Returns the two's complement integer to be packed by the struct fast path."""
+        bitShiftedValue = encodeValue * 2**self.fractionalBits
+        if self.integerBits > 0:    #signed value
+            return utilities.signedIntegerToTwosComplement(int(bitShiftedValue), self.bitSize)
+        elif type(bitShiftedValue) not in (int, long, float) or bitShiftedValue < 0:    #negative unsigned values are left to _encode_
+            raise ValueError("Value " + str(encodeValue) + " can't be packed as an unsigned fixed-point decimal.")
+        else:
+            return int(bitShiftedValue)
+    
+    def _unpackValue_(self, structValue):
+        """Converts an unpacked two's complement integer into a fixed point signed decimal."""
+        twosComplementRepresentation = structValue&(2**(self.bitSize) - 1) #mask off any unwanted bits
         if self.integerBits > 0: #signed value
             signedInteger = utilities.twosComplementToSignedInteger(twosComplementRepresentation, self.bitSize)
         else:   #no integer bits, unsigned value
             signedInteger = twosComplementRepresentation
         bitShiftedValue = float(signedInteger)/(2**self.fractionalBits)
         return bitShiftedValue
+    
+    def _arrayFields_(self):
+        """Fixed point decimals are decoded into a float64 array field."""
+        return [(self.keyName, '<f8')]
+    
+    def _unpackArray_(self, packedValues):
+        """Converts an array of packed two's complement integers into an array of fixed point signed decimals."""
+        twosComplementRepresentation = packedValues.astype(numpy.uint64) & numpy.uint64(2**(self.bitSize) - 1)   #mask off any unwanted bits
+        if self.integerBits > 0 and self.bitSize < 64:  #signed value
+            signedIntegers = twosComplementRepresentation.astype(numpy.int64)
+            signedIntegers[signedIntegers >= 2**(self.bitSize - 1)] -= 2**self.bitSize
+        elif self.integerBits > 0:  #64-bit signed value, reinterpreting the bits performs the conversion
+            signedIntegers = twosComplementRepresentation.view(numpy.int64)
+        else:   #no integer bits, unsigned value
+            signedIntegers = twosComplementRepresentation
+        return [signedIntegers.astype(numpy.float64)/(2**self.fractionalBits)]
 
 class bitfield(packetToken):
     """A bitfield packet token."""
@@ -739,6 +2506,7 @@ class bitfield(packetToken):
         """
         self.numberOfBits = numberOfBits
         self.size = int(math.ceil(self.numberOfBits/8.0))   #smallest number of bytes that will contain the provided bit size
+        self.structCode = utilities.unsignedStructCodes.get(self.size)
         
         self.bitPositionBitNameDictionary = {}  #stores {position:name} pairs
         self.bitNameBitPositionDictionary = {}  #stores {name:position} pairs
@@ -750,38 +2518,72 @@ class bitfield(packetToken):
                 bitDefaultValue = argumentTuple[2]
             else:
                 bitDefaultValue = None
+            if type(bitPosition) not in (int, long) or bitPosition < 0:
+                raise errors.CompositionError("Bit position " + str(bitPosition) + " of bitfield " + str(self.keyName) + " must be a non-negative integer.")
             self.bitPositionBitNameDictionary.update({bitPosition:bitName})
             self.bitNameBitPositionDictionary.update({bitName:bitPosition})
             self.bitPositionDefaultValueDictionary.update({bitPosition:bitDefaultValue})
-            
+        self.compileMasks()
+    
+    def compileMasks(self):
+        """Precomputes the bit masks used to encode and decode the bitfield.
+        
+        self.encodeMasks -- [(bitName, mask, defaultValue)], with one entry per bit position. If several names share a position, the
+                            last in iteration order wins, just as it would when setting and clearing each bit in turn.
+        self.decodeMasks -- [(bitName, mask)] for every bit position.
+        self.defaultValue -- the integer value of the bitfield when no bits are provided.
+        self.decodeTable -- for single-byte bitfields, a list of the decoded dictionary for each of the 256 possible values. Otherwise None.
+        """
+        encodeMasks = collections.OrderedDict()  #{mask: (bitName, defaultValue)}
+        for bitName in self.bitNameBitPositionDictionary:
+            bitPosition = self.bitNameBitPositionDictionary[bitName]
+            defaultValue = self.bitPositionDefaultValueDictionary[bitPosition]
+            if defaultValue == None: defaultValue = False   #by default set to 0
+            encodeMasks.pop(1<<bitPosition, None)   #a later name at the same position replaces the earlier one
+            encodeMasks[1<<bitPosition] = (bitName, defaultValue)
+        self.encodeMasks = [(name, mask, default) for mask, (name, default) in encodeMasks.items()]
+        self.decodeMasks = [(self.bitPositionBitNameDictionary[position], 1<<position) for position in self.bitPositionBitNameDictionary]
+        self.defaultValue = sum(mask for name, mask, default in self.encodeMasks if default)
+        if self.size == 1: self.decodeTable = [self.unpackMasks(inputValue) for inputValue in range(256)]
+        else: self.decodeTable = None
+    
+    def unpackMasks(self, inputValue):
+        """Converts the integer value of a bitfield into a dictionary of bitfield names and values, using the precomputed masks."""
+        return {bitName:bool(inputValue & mask) for bitName, mask in self.decodeMasks}
+    
     def _encode_(self, encodeDictionary, inProcessPacket):
         """Encodes the provided inputValue into a bitfield.
         
         encodeDictionary -- a dictionary containing bitName:bitValue pairs to encode into the bitfield
         """
+        return utilities.unsignedIntegerToBytes(self._packValue_(encodeDictionary), self.size)
+    
+    def _packValue_(self, encodeDictionary):
+        """Returns the integer value of the bitfield described by the provided dictionary of bitName:bitValue pairs."""
+        if encodeDictionary == {}: return self.defaultValue   #no bits provided
         outputValue = 0 #default bit field is zeroed out.
-        for bitName in self.bitNameBitPositionDictionary:   #iterate thru stored bitfield definition
-            bitPosition = self.bitNameBitPositionDictionary[bitName]    #get bit position
-            if bitName in encodeDictionary: #check if bitName is in the provided encode dictionary
-                bitValue = encodeDictionary[bitName]    #bitName is in encodeDictionary, set bitValue from encodeDictionary
-            elif self.bitPositionDefaultValueDictionary[bitPosition] != None:   #check if a default bit value was provided on token creation
-                bitValue = self.bitPositionDefaultValueDictionary[bitPosition]  #Bit value not specified in input, use default value instead
-            else:
-                bitValue = False    #by default set to 0
-                
-            outputValue = utilities.changeBitInInteger(outputValue, bitPosition, bitValue)
-        
-        return utilities.unsignedIntegerToBytes(outputValue, self.size)
+        for bitName, mask, defaultValue in self.encodeMasks:    #each mask is a distinct bit, so the field is the OR of the set bits
+            if bitName in encodeDictionary:
+                if encodeDictionary[bitName]: outputValue |= mask
+            elif defaultValue: outputValue |= mask  #bit value not specified in input, use default value instead
+        return outputValue
     
     def _decode_(self, decodePacket):
         """Decodes the provided packet snippet into a dictionary of bitfield names and values.
         
         decodePacket -- the ordered list of bytes to be converted into a dictionary.
         """
-        inputValue = utilities.bytesToUnsignedInteger(decodePacket)
-        decodeDictionary = {}   #stores bitName:bitValue pairs
-        for bitPosition in self.bitPositionBitNameDictionary:   #iterate over all bit positions in bitfield definition
-            bitName = self.bitPositionBitNameDictionary[bitPosition]    #grab bit name
-            bitValue = bool(inputValue&(1<<bitPosition))    #test if bit in inputValue is set
-            decodeDictionary.update({bitName:bitValue})    #update the decode dictionary
-        return decodeDictionary
\ No newline at end of file
+        return self._unpackValue_(utilities.bytesToUnsignedInteger(decodePacket))
+    
+    def _unpackValue_(self, inputValue):
+        """Converts the integer value of a bitfield into a dictionary of bitfield names and values."""
+        if self.decodeTable and 0 <= inputValue <= 255: return dict(self.decodeTable[inputValue])   #copied, so callers can modify the result
+        return self.unpackMasks(inputValue)
+    
+    def _arrayFields_(self):
+        """Bitfields are decoded into their packed integer value, followed by a boolean array field for each named bit."""
+        return [(self.keyName, '<' + self.structCode)] + [(self.bitPositionBitNameDictionary[bitPosition], '?') for bitPosition in sorted(self.bitPositionBitNameDictionary)]
+    
+    def _unpackArray_(self, packedValues):
+        """Expands an array of packed bitfield integers into the packed values, followed by a boolean array for each named bit."""
+        return [packedValues] + [(packedValues & (1<<bitPosition)) != 0 for bitPosition in sorted(self.bitPositionBitNameDictionary)]
\ No newline at end of file
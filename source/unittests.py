@@ -4,7 +4,11 @@
 
 # ----IMPORTS----
 import unittest
+import os, pty, select, time
+import Queue
 import pygestalt.packets
+import pygestalt.utilities
+import pygestalt.interfaces
 
 #----Utilities Module----
 # -> function inputs are within bounds
@@ -22,3 +26,628 @@ import pygestalt.packets
 # -> no duplicate token names, even across embedded templates
 # -> can generate zero-length templates
 
+
+class generatedCodecTest(unittest.TestCase):
+    """Differential test of templates with generated encoders and decoders against the same templates without."""
+    
+    def buildTokens(self, generator, prefix):
+        """Returns a random list of tokens, each freshly instantiated."""
+        tokens = []
+        for index in range(generator.randint(1, 6)):
+            name = prefix + str(index)
+            kind = generator.choice(['unsignedInt', 'signedInt', 'fixedPoint', 'bitfield', 'pList', 'pString', 'length', 'checksum'])
+            size = generator.choice([1, 2, 3, 4])
+            if kind == 'unsignedInt': tokens += [(pygestalt.packets.unsignedInt, (name, size))]
+            elif kind == 'signedInt': tokens += [(pygestalt.packets.signedInt, (name, size))]
+            elif kind == 'fixedPoint': tokens += [(pygestalt.packets.fixedPoint, (name, generator.choice([0, 1, 4, 8]), generator.choice([7, 8, 15, 16, 23])))]
+            elif kind == 'bitfield': tokens += [(pygestalt.packets.bitfield, (name, 8*size) + tuple((bitPosition, name + 'b' + str(bitPosition)) for bitPosition in sorted(generator.sample(range(8*size), 3))))]
+            elif kind == 'pList': tokens += [(pygestalt.packets.pList, (name, size))]
+            elif kind == 'pString': tokens += [(pygestalt.packets.pString, (name, size))]
+            elif kind == 'length': tokens += [(pygestalt.packets.length, (name, generator.choice([1, 2]), generator.choice([True, False])))]
+            else: tokens += [(pygestalt.packets.checksum, (name, generator.choice([7, 49])))]
+        if generator.random() < 0.5: tokens += [(pygestalt.packets.packet, (prefix + 'payload',))]
+        return tokens
+    
+    def buildValues(self, generator, tokens):
+        """Returns a random encode dictionary for the provided tokens, sometimes with out-of-range values."""
+        encodeDict = {}
+        for tokenType, arguments in tokens:
+            name = arguments[0]
+            if tokenType in (pygestalt.packets.unsignedInt, pygestalt.packets.signedInt):
+                encodeDict[name] = generator.choice([generator.randrange(256**arguments[1]) - 128, -1, 256**arguments[1], 1.5])
+            elif tokenType == pygestalt.packets.fixedPoint:
+                encodeDict[name] = generator.choice([generator.uniform(-1.0, 1.0), generator.random(), 2**arguments[1], -2])
+            elif tokenType == pygestalt.packets.bitfield:
+                encodeDict[name] = dict((bitName, generator.choice([True, False])) for bitPosition, bitName in arguments[2:])
+            elif tokenType == pygestalt.packets.pList:
+                encodeDict[name] = [generator.randrange(256) for index in range(arguments[1])]
+            elif tokenType == pygestalt.packets.pString:
+                encodeDict[name] = ''.join(chr(generator.randint(32, 126)) for index in range(arguments[1]))
+            elif tokenType == pygestalt.packets.packet:
+                encodeDict[name] = [generator.randrange(256) for index in range(generator.randint(0, 8))]
+        return encodeDict
+    
+    def captureResult(self, function):
+        """Returns ('ok', result) or ('error', exceptionType)."""
+        try: return ('ok', function())
+        except Exception as error: return ('error', type(error))
+    
+    def test_generatedMatchesCodec(self):
+        import random
+        generator = random.Random(11)
+        for caseIndex in range(500):
+            tokens = self.buildTokens(generator, 'case' + str(caseIndex) + 't')
+            referenceTemplate = pygestalt.packets.template('reference', *[tokenType(*arguments) for tokenType, arguments in tokens])
+            generatedTemplate = pygestalt.packets.template('generated', *[tokenType(*arguments) for tokenType, arguments in tokens], codegen = True)
+            encodeDict = self.buildValues(generator, tokens)
+            referenceResult = self.captureResult(lambda: list(referenceTemplate.encode(dict(encodeDict))))
+            generatedResult = self.captureResult(lambda: list(generatedTemplate.encode(dict(encodeDict))))
+            self.assertEqual(referenceResult, generatedResult)
+            if referenceResult[0] != 'ok': continue
+            encodedPacket = referenceResult[1]
+            randomPacket = [generator.randrange(256) for index in range(len(encodedPacket))]
+            for inputPacket in (encodedPacket, bytearray(encodedPacket), randomPacket):
+                self.assertEqual(self.captureResult(lambda: referenceTemplate.decode(inputPacket)), self.captureResult(lambda: generatedTemplate.decode(inputPacket)))
+            if referenceTemplate.size > 0:
+                self.assertEqual(self.captureResult(lambda: referenceTemplate.decode(encodedPacket + [1, 2], False)), self.captureResult(lambda: generatedTemplate.decode(encodedPacket + [1, 2], False)))
+
+
+class serialReconnectTest(unittest.TestCase):
+    """Tests that a serial interface reconnects to its port after the connection is lost, over a pseudo-terminal."""
+    
+    def setUp(self):
+        self.masterFileDescriptor, self.slaveFileDescriptor = pty.openpty()
+        self.interface = pygestalt.interfaces.serialInterface(port = os.ttyname(self.slaveFileDescriptor), name = 'reconnectTest')
+        self.interface._portReconnectTime_ = 0.1
+    
+    def tearDown(self):
+        self.interface.stop()
+        os.close(self.masterFileDescriptor)
+        os.close(self.slaveFileDescriptor)
+    
+    def test_reconnectsAfterConnectionLost(self):
+        self.interface.start()
+        self.assertTrue(self.interface.isConnected())
+        connectCalls = []
+        originalConnect = self.interface.connect
+        def countedConnect():
+            connectCalls.append(time.time())
+            return originalConnect()
+        self.interface.connect = countedConnect
+        self.interface.isConnectedFlag.clear()  #the port is marked disconnected, as the receiver does when a read fails
+        deadline = time.time() + 10.0
+        while not (connectCalls and self.interface.isConnected()) and time.time() < deadline: time.sleep(0.05)
+        self.assertTrue(connectCalls)
+        self.assertTrue(self.interface.isConnected())
+        self.assertTrue(self.interface.transmit(pygestalt.packets.serializedPacket([1, 2, 3])))
+        self.assertEqual(os.read(self.masterFileDescriptor, 3), '\x01\x02\x03')
+        self.assertTrue(self.interface.stop())
+
+
+class channelPriorityStopTest(unittest.TestCase):
+    """Tests that a gestalt interface stops promptly while an actionMolecule is waiting to be cleared for release."""
+    
+    class unclearedMolecule(object):
+        """Stands in for an actionObject that is committed but never cleared for release."""
+        def _waitForClearForRelease_(self, timeout = None):
+            time.sleep(timeout)
+            return False
+    
+    def test_stopWhileWaitingForRelease(self):
+        interface = pygestalt.interfaces.gestaltInterface(name = 'stopTest')
+        interface.commit(self.unclearedMolecule())
+        time.sleep(0.2)
+        startTime = time.time()
+        self.assertTrue(interface.stop(timeout = 2.0))
+        self.assertLess(time.time() - startTime, 1.0)
+
+
+class crcTest(unittest.TestCase):
+    """Checks each CRC variant against its published check value, the CRC of '123456789'."""
+    
+    checkInput = '123456789'
+    
+    def assertCheckValue(self, crc, checkValue):
+        for byteList in (self.checkInput, bytearray(self.checkInput), [ord(character) for character in self.checkInput], memoryview(self.checkInput)):
+            self.assertEqual(crc.generate(byteList), checkValue)
+        self.assertEqual(crc.generate(self.checkInput[4:], crc.generate(self.checkInput[:4])), checkValue) #continued across segments
+    
+    def test_CRC16CCITT(self):
+        self.assertCheckValue(pygestalt.utilities.CRC16('CCITT'), 0x29B1)
+    
+    def test_CRC16XMODEM(self):
+        self.assertCheckValue(pygestalt.utilities.CRC16('XMODEM'), 0x31C3)
+    
+    def test_CRC16MODBUS(self):
+        self.assertCheckValue(pygestalt.utilities.CRC16('MODBUS'), 0x4B37)
+    
+    def test_CRC32(self):
+        self.assertCheckValue(pygestalt.utilities.CRC32(), 0xCBF43926)
+
+
+class lazyDecodeTest(unittest.TestCase):
+    """Tests that lazy decoding produces the same values as eager decoding, and defers decode errors until a token is accessed."""
+    
+    def setUp(self):
+        self.innerTemplate = pygestalt.packets.template('lazyInner', pygestalt.packets.signedInt('offset', 2), pygestalt.packets.pString('tag', 3))
+        self.lazyTemplate = pygestalt.packets.template('lazyOuter',
+                                                       pygestalt.packets.unsignedInt('command', 1),
+                                                       pygestalt.packets.fixedPoint('gain', 1, 15),
+                                                       pygestalt.packets.bitfield('flags', 8, (0, 'enable'), (3, 'direction')),
+                                                       pygestalt.packets.packetTemplate('inner', self.innerTemplate),
+                                                       pygestalt.packets.pList('data'),
+                                                       pygestalt.packets.unsignedInt('trailer', 2))
+        self.arrayTemplate = pygestalt.packets.template('lazyArray', pygestalt.packets.unsignedInt('id', 1), pygestalt.packets.pArray('samples', 'uint16'))
+    
+    def normalize(self, decodeDict):
+        """Returns decodeDict as a regular dictionary, with any memoryviews converted to lists."""
+        return dict((keyName, list(bytearray(value)) if type(value) == memoryview else value) for keyName, value in dict(decodeDict).items())
+    
+    def test_matchesEager(self):
+        import random
+        generator = random.Random(5)
+        encodedPacket = list(self.lazyTemplate.encode({'command':3, 'gain':-0.25, 'flags':{'enable':True, 'direction':False},
+                                                       'offset':-300, 'tag':'abc', 'data':[1, 2, 3, 4], 'trailer':513}))
+        randomPackets = [[generator.randrange(256) for index in range(generator.randint(9, 20))] for count in range(50)]
+        for inputPacket in [encodedPacket] + randomPackets:
+            for packetForm in (list, bytearray, pygestalt.packets.serializedBuffer):
+                eagerDict, eagerRemainder = self.lazyTemplate.decode(packetForm(inputPacket))
+                lazyDict, lazyRemainder = self.lazyTemplate.decode(packetForm(inputPacket), lazy = True)
+                self.assertTrue(isinstance(lazyDict, pygestalt.packets.lazyDecodeDict))
+                self.assertEqual(sorted(lazyDict.keys()), sorted(eagerDict.keys()))
+                self.assertEqual(self.normalize(lazyDict), self.normalize(eagerDict))
+                self.assertEqual(list(lazyRemainder), list(eagerRemainder))
+    
+    def test_decodesOnAccess(self):
+        lazyDict = self.lazyTemplate.decode(self.lazyTemplate.encode({'command':3, 'gain':0.5, 'flags':{'enable':True, 'direction':True},
+                                                                      'offset':7, 'tag':'xyz', 'data':[9], 'trailer':1}), lazy = True)[0]
+        self.assertEqual(len(lazyDict.decodedValues), 0)
+        self.assertEqual(lazyDict['tag'], 'xyz')
+        self.assertEqual(sorted(lazyDict.decodedValues.keys()), ['tag'])
+        lazyDict['command'] = 4
+        self.assertEqual(lazyDict['command'], 4)
+        self.assertRaises(KeyError, lambda: lazyDict['missing'])
+    
+    def test_errorOnFirstAccess(self):
+        inputPacket = [7, 1, 2, 3]  #three bytes of samples, which isn't a whole number of uint16 elements
+        self.assertRaises(ValueError, self.arrayTemplate.decode, inputPacket)
+        lazyDict = self.arrayTemplate.decode(inputPacket, lazy = True)[0]
+        self.assertEqual(lazyDict['id'], 7)  #other tokens decode as usual
+        self.assertRaises(ValueError, lambda: lazyDict['samples'])
+        self.assertRaises(ValueError, lambda: lazyDict['samples'])  #the token is still pending, and raises the same error again
+        self.assertTrue('samples' in lazyDict)
+        self.assertRaises(ValueError, lazyDict.toDict)
+
+
+class encodeCacheTest(unittest.TestCase):
+    """Tests the encode cache of templates created with a cacheSize."""
+    
+    def setUp(self):
+        self.cachedTemplate = pygestalt.packets.template('cachedTemplate', pygestalt.packets.unsignedInt('command', 1), pygestalt.packets.pList('data', 2), cacheSize = 2)
+        self.referenceTemplate = pygestalt.packets.template('referenceTemplate', pygestalt.packets.unsignedInt('command', 1), pygestalt.packets.pList('data', 2))
+    
+    def encode(self, command, packetType = pygestalt.packets.serializedPacket):
+        encodeDict = {'command':command, 'data':[command, 255]}
+        if packetType == pygestalt.packets.serializedBuffer: encodedPacket = self.cachedTemplate.encodeBuffer(encodeDict)
+        else: encodedPacket = self.cachedTemplate.encode(encodeDict)
+        self.assertEqual(list(encodedPacket), list(self.referenceTemplate.encode(encodeDict)))
+        self.assertEqual(type(encodedPacket), packetType)
+        return encodedPacket
+    
+    def test_hits(self):
+        firstPacket = self.encode(1)
+        secondPacket = self.encode(1)
+        self.assertEqual((self.cachedTemplate.codec.cacheHits, self.cachedTemplate.codec.cacheMisses), (1, 1))
+        secondPacket[0] = 99    #returned packets are copies, so modifying one doesn't affect the cache
+        self.assertEqual(list(self.encode(1)), list(firstPacket))
+        self.encode(1, pygestalt.packets.serializedBuffer)   #cached separately for each packet type
+        self.assertEqual((self.cachedTemplate.codec.cacheHits, self.cachedTemplate.codec.cacheMisses), (2, 2))
+    
+    def test_eviction(self):
+        self.encode(1)
+        self.encode(2)
+        self.encode(1)  #hit, so 2 becomes the least recently used
+        self.encode(3)  #evicts 2
+        codec = self.cachedTemplate.codec
+        self.assertEqual(len(codec.encodeCache), 2)
+        self.assertEqual((codec.cacheHits, codec.cacheMisses), (1, 3))
+        self.encode(1)
+        self.assertEqual((codec.cacheHits, codec.cacheMisses), (2, 3))
+        self.encode(2)
+        self.assertEqual((codec.cacheHits, codec.cacheMisses), (2, 4))
+
+
+class framePrefixTest(unittest.TestCase):
+    """Tests that packets encoded thru a frame prefix match those encoded by the template."""
+    
+    def test_matchesEncode(self):
+        for checksumAlgorithm in ('CRC-8', 'CRC-16/CCITT', 'CRC-32'):
+            frameTemplate = pygestalt.packets.template('prefixFrame' + checksumAlgorithm,
+                                                       pygestalt.packets.unsignedInt('_startByte_', 1),
+                                                       pygestalt.packets.unsignedInt('_address_', 2),
+                                                       pygestalt.packets.unsignedInt('_port_', 1),
+                                                       pygestalt.packets.length('_length_'),
+                                                       pygestalt.packets.packet('_payload_'),
+                                                       pygestalt.packets.checksum('_checksum_', algorithm = checksumAlgorithm))
+            prefixDict = {'_startByte_':72, '_address_':513, '_port_':7}
+            prefix = frameTemplate.getFramePrefix(prefixDict)
+            self.assertTrue(frameTemplate.getFramePrefix(dict(prefixDict)) is prefix)
+            self.assertEqual(prefix.size, 4)
+            bufferPool = pygestalt.packets.bufferPool()
+            for payload in ([], [1], range(200)):
+                expectedPacket = list(frameTemplate.encode(dict(prefixDict, _payload_ = payload)))
+                self.assertEqual(list(prefix.encode({'_payload_':payload})), expectedPacket)
+                self.assertEqual(list(prefix.encodeBuffer({'_payload_':payload})), expectedPacket)
+                self.assertEqual(list(prefix.encodeBuffer({'_payload_':payload}, bufferPool.acquire(frameTemplate))), expectedPacket)
+                self.assertTrue(frameTemplate.validateChecksum('_checksum_', prefix.encode({'_payload_':payload})))
+    
+    def test_prefixEviction(self):
+        frameTemplate = pygestalt.packets.template('prefixEvictionFrame', pygestalt.packets.unsignedInt('_address_', 2), pygestalt.packets.packet('_payload_'))
+        firstPrefix = frameTemplate.getFramePrefix({'_address_':0})
+        for address in range(1, frameTemplate.codec.prefixCacheSize + 1): frameTemplate.getFramePrefix({'_address_':address})
+        self.assertEqual(len(frameTemplate.codec.framePrefixes), frameTemplate.codec.prefixCacheSize)
+        self.assertFalse(frameTemplate.getFramePrefix({'_address_':0}) is firstPrefix)
+
+
+class twosComplementTest(unittest.TestCase):
+    """Tests conversions between signed integers and two's complement, with cached and uncached widths."""
+    
+    def test_roundTrip(self):
+        for bitSize in (1, 8, 12, 16, 32, 64, 70):
+            maxSize = 2**(bitSize - 1) - 1
+            for value in set([0, min(1, maxSize), -min(1, maxSize), maxSize, -maxSize]):
+                twosComplement = pygestalt.utilities.signedIntegerToTwosComplement(value, bitSize)
+                self.assertEqual(twosComplement, value % 2**bitSize)
+                self.assertEqual(pygestalt.utilities.twosComplementToSignedInteger(twosComplement, bitSize), value)
+    
+    def test_overflow(self):
+        for bitSize in (8, 16, 70):
+            self.assertRaises(ValueError, pygestalt.utilities.signedIntegerToTwosComplement, 2**(bitSize - 1), bitSize)
+            self.assertRaises(ValueError, pygestalt.utilities.signedIntegerToTwosComplement, -2**(bitSize - 1), bitSize)
+
+
+class streamDecoderTest(unittest.TestCase):
+    """Tests framing of a byte stream into gestalt packets by packets.streamDecoder."""
+    
+    def setUp(self):
+        self.frameTemplate = pygestalt.packets.template('streamFrame',
+                                                        pygestalt.packets.unsignedInt('_startByte_', 1),
+                                                        pygestalt.packets.unsignedInt('_address_', 2),
+                                                        pygestalt.packets.unsignedInt('_port_', 1),
+                                                        pygestalt.packets.length('_length_'),
+                                                        pygestalt.packets.packet('_payload_'),
+                                                        pygestalt.packets.checksum('_checksum_'))
+        self.decoder = pygestalt.packets.streamDecoder(self.frameTemplate, syncTokenName = '_startByte_', syncValues = (72, 138), checksumName = '_checksum_')
+    
+    def encodeFrame(self, address, payload, startByte = 72):
+        return list(self.frameTemplate.encode({'_startByte_':startByte, '_address_':address, '_port_':1, '_payload_':payload}))
+    
+    def assertFrames(self, decodedFrames, expectedFrames):
+        self.assertEqual([(frame['_address_'], list(bytearray(frame['_payload_']))) for frame in decodedFrames], expectedFrames)
+    
+    def test_frameSplitAcrossFeeds(self):
+        frame = self.encodeFrame(1, [10, 20, 30, 40])
+        self.assertEqual(self.decoder.feed(frame[:1]), [])
+        self.assertEqual(self.decoder.feed(frame[1:4]), [])
+        self.assertEqual(self.decoder.feed(frame[4:-1]), [])
+        self.assertFrames(self.decoder.feed(frame[-1:]), [(1, [10, 20, 30, 40])])
+        self.assertEqual(self.decoder.framesDecoded, 1)
+    
+    def test_severalFramesInOneChunk(self):
+        chunk = self.encodeFrame(1, [1]) + self.encodeFrame(2, []) + self.encodeFrame(3, [3, 3, 3], startByte = 138)
+        self.assertFrames(self.decoder.feed(bytearray(chunk)), [(1, [1]), (2, []), (3, [3, 3, 3])])
+    
+    def test_leadingGarbage(self):
+        chunk = [0, 255, 17, 71] + self.encodeFrame(5, [50, 51])
+        self.assertFrames(self.decoder.feed(''.join(chr(byte) for byte in chunk)), [(5, [50, 51])])
+        self.assertEqual(self.decoder.syncErrors, 4)
+    
+    def test_badChecksumResync(self):
+        badFrame = self.encodeFrame(1, [1, 2, 3])
+        badFrame[-1] ^= 0xFF
+        self.assertFrames(self.decoder.feed(badFrame + self.encodeFrame(2, [4, 5, 6])), [(2, [4, 5, 6])])
+        self.assertEqual(self.decoder.framesRejected, 1)
+    
+    def test_lengthPastBuffer(self):
+        frame = self.encodeFrame(1, [1, 2])
+        frame[4] = 200  #length points well past the end of the frame
+        self.assertEqual(self.decoder.feed(frame), [])  #waits for the rest of the claimed frame
+        self.assertTrue(self.decoder.frameLength > len(frame))
+        self.assertEqual(self.decoder.feed([0]*(self.decoder.frameLength - len(frame))), [])   #claimed frame fails its checksum
+        self.assertEqual(self.decoder.framesRejected, 1)
+        self.assertFrames(self.decoder.feed(self.encodeFrame(2, [7])), [(2, [7])])
+    
+    def test_impossibleLength(self):
+        frame = self.encodeFrame(1, [1, 2])
+        frame[4] = 1    #shorter than the frame header
+        self.assertFrames(self.decoder.feed(frame + self.encodeFrame(2, [7])), [(2, [7])])
+        self.assertTrue(self.decoder.framesRejected >= 1)
+    
+    def test_reset(self):
+        frame = self.encodeFrame(1, [1, 2])
+        self.decoder.feed(frame[:5])
+        self.decoder.reset()
+        self.assertFrames(self.decoder.feed(self.encodeFrame(2, [3])), [(2, [3])])
+
+
+class deltaEncodingTest(unittest.TestCase):
+    """Round-trip tests of delta packets, which carry a presence bitmap followed by the tokens that changed."""
+    
+    def setUp(self):
+        self.deltaTemplate = pygestalt.packets.template('deltaTemplate',
+                                                        pygestalt.packets.unsignedInt('position', 2),
+                                                        pygestalt.packets.signedInt('velocity', 2),
+                                                        pygestalt.packets.fixedPoint('gain', 1, 15),
+                                                        pygestalt.packets.bitfield('flags', 8, (0, 'enable'), (1, 'direction')),
+                                                        pygestalt.packets.packet('data'))   #unbounded, takes whatever remains of the packet
+        self.referenceDict = {'position':1000, 'velocity':-20, 'gain':0.5, 'flags':{'enable':True, 'direction':False}, 'data':[1, 2, 3]}
+    
+    def decodedValues(self, decodeDict):
+        """Returns decodeDict with the unbounded token's bytes as a list, for comparison with an encode dictionary."""
+        decodeDict = dict(decodeDict)
+        decodeDict['data'] = list(bytearray(decodeDict['data']))
+        return decodeDict
+    
+    def roundTrip(self, encodeDict):
+        deltaPacket = self.deltaTemplate.encodeDelta(encodeDict, self.referenceDict)
+        referenceDecodeDict = self.deltaTemplate.decode(self.deltaTemplate.encode(self.referenceDict))[0]
+        return deltaPacket, self.decodedValues(self.deltaTemplate.decodeDelta(deltaPacket, referenceDecodeDict))
+    
+    def test_noChange(self):
+        deltaPacket, decodeDict = self.roundTrip(dict(self.referenceDict))
+        self.assertEqual(list(deltaPacket), [0])    #only the presence bitmap
+        self.assertEqual(decodeDict, self.referenceDict)
+    
+    def test_allChanged(self):
+        encodeDict = {'position':7, 'velocity':300, 'gain':-0.25, 'flags':{'enable':False, 'direction':True}, 'data':[9, 8, 7, 6]}
+        deltaPacket, decodeDict = self.roundTrip(encodeDict)
+        self.assertEqual(list(deltaPacket), [0x1F] + list(self.deltaTemplate.encode(encodeDict)))
+        self.assertEqual(decodeDict, encodeDict)
+    
+    def test_unboundedTokenChanged(self):
+        for data in ([], [4], [5, 6, 7, 8, 9, 10]):
+            encodeDict = dict(self.referenceDict, data = data)
+            deltaPacket, decodeDict = self.roundTrip(encodeDict)
+            self.assertEqual(list(deltaPacket), [0x10] + data)
+            self.assertEqual(decodeDict, encodeDict)
+    
+    def test_unboundedAndFixedTokensChanged(self):
+        encodeDict = dict(self.referenceDict, velocity = 5, data = [100, 101])
+        deltaPacket, decodeDict = self.roundTrip(encodeDict)
+        self.assertEqual(list(deltaPacket), [0x12, 5, 0, 100, 101])
+        self.assertEqual(decodeDict, encodeDict)
+    
+    def test_missingReference(self):
+        deltaPacket = self.deltaTemplate.encodeDelta(dict(self.referenceDict, position = 1), self.referenceDict)
+        self.assertRaises(ValueError, self.deltaTemplate.decodeDelta, deltaPacket)
+    
+    def test_decoderResyncsAfterMissedFrame(self):
+        encoder = pygestalt.packets.deltaEncoder(self.deltaTemplate)
+        decoder = pygestalt.packets.deltaDecoder(self.deltaTemplate)
+        channel = ('node', 1)
+        firstDict = dict(self.referenceDict)
+        self.assertEqual(self.decodedValues(decoder.decode(channel, encoder.encode(channel, firstDict))), firstDict)
+        encoder.acknowledge(channel)
+        missedDict = dict(firstDict, position = 2000, gain = -0.5)
+        encoder.encode(channel, missedDict) #never reaches the decoder, and so is never acknowledged
+        nextDict = dict(missedDict, velocity = 40)
+        self.assertEqual(self.decodedValues(decoder.decode(channel, encoder.encode(channel, nextDict))), nextDict)
+        encoder.acknowledge(channel)
+        finalDict = dict(nextDict, data = [0])
+        finalPacket = encoder.encode(channel, finalDict)
+        self.assertEqual(list(finalPacket), [0x10, 0])  #only the change since the acknowledged packet is sent
+        self.assertEqual(self.decodedValues(decoder.decode(channel, finalPacket)), finalDict)
+
+
+class loopbackNode(object):
+    """Stands in for a virtual node. Transmits on a single port, and records the packets that are routed back to it."""
+    port = 7
+    
+    def __init__(self):
+        self.receivedPackets = Queue.Queue()
+    
+    def _getPortNumber_(self, actionObject):
+        return self.port
+    
+    def _isInSyntheticMode_(self):
+        return False
+    
+    def _routeInboundPacket_(self, port, packet):
+        self.receivedPackets.put((port, list(bytearray(packet))))
+
+
+class loopbackActionObject(object):
+    """Stands in for an actionObject with an already encoded payload."""
+    def __init__(self, virtualNode, payload):
+        self.virtualNode = virtualNode
+        self.payload = payload
+    
+    def _getEncodedOutboundPacket_(self):
+        return self.payload
+
+
+class releasableMolecule(object):
+    """Stands in for an actionObject committed to an interface, recording when it is granted channel access."""
+    def __init__(self, grantedMolecules):
+        self.grantedMolecules = grantedMolecules
+        self.releaseCallbacks = []
+        self.cleared = False
+        self.channelAccessLock = None
+    
+    def clearForRelease(self):
+        self.cleared = True
+        for callback in self.releaseCallbacks: callback()
+    
+    def _isClearForRelease_(self):
+        return self.cleared
+    
+    def _whenClearedForRelease_(self, callback):
+        if self.cleared: callback()
+        else: self.releaseCallbacks += [callback]
+    
+    def _grantChannelAccess_(self, channelAccessLock):
+        self.channelAccessLock = channelAccessLock
+        self.grantedMolecules.put(self)
+
+
+class eventInterfaceTestCase(unittest.TestCase):
+    """Base class for loopback tests of the event-driven interfaces. The test plays the part of the physical node on the master side of a pseudo-terminal."""
+    
+    def openDevice(self):
+        """Opens a pseudo-terminal, and returns the path of the port to which the interface should connect."""
+        masterFileDescriptor, slaveFileDescriptor = pty.openpty()
+        self.addCleanup(os.close, masterFileDescriptor)
+        self.addCleanup(os.close, slaveFileDescriptor)
+        self.deviceFileDescriptor = masterFileDescriptor
+        return os.ttyname(slaveFileDescriptor)
+    
+    def readFromDevice(self, byteCount, timeout = 2.0, deviceFileDescriptor = None):
+        """Returns up to byteCount bytes received by the device within timeout seconds, as a string."""
+        if deviceFileDescriptor == None: deviceFileDescriptor = self.deviceFileDescriptor
+        receivedBytes = ''
+        deadline = time.time() + timeout
+        while len(receivedBytes) < byteCount and time.time() < deadline:
+            if select.select([deviceFileDescriptor], [], [], max(deadline - time.time(), 0))[0]:
+                receivedBytes += os.read(deviceFileDescriptor, byteCount - len(receivedBytes))
+        return receivedBytes
+    
+    def assertLoopback(self, gestaltInterface, deviceFileDescriptor = None, address = 5):
+        """Transmits a packet thru gestaltInterface, checks that the device receives it, and that the device's reply is routed back to the node."""
+        if deviceFileDescriptor == None: deviceFileDescriptor = self.deviceFileDescriptor
+        node = loopbackNode()
+        gestaltInterface._updateNode_(node, address)
+        gestaltPacket = gestaltInterface._gestaltPacket_
+        
+        self.assertTrue(gestaltInterface.transmit(loopbackActionObject(node, [1, 2, 3]), 'unicast'))
+        expectedRequest = gestaltPacket.encode({'_startByte_':72, '_address_':address, '_port_':node.port, '_payload_':[1, 2, 3]}).toString()
+        self.assertEqual(self.readFromDevice(len(expectedRequest), deviceFileDescriptor = deviceFileDescriptor), expectedRequest)
+        
+        reply = gestaltPacket.encode({'_startByte_':72, '_address_':address, '_port_':node.port, '_payload_':[address, 4, 5]})
+        os.write(deviceFileDescriptor, reply.toString()[:3])    #the reply arrives in two chunks
+        time.sleep(0.05)
+        os.write(deviceFileDescriptor, reply.toString()[3:])
+        self.assertEqual(node.receivedPackets.get(timeout = 2.0), (node.port, [address, 4, 5]))
+
+
+class eventLoopTest(unittest.TestCase):
+    """Tests that interfaces.eventLoop runs reader, timer, and scheduled callbacks from its thread."""
+    
+    def test_callbacks(self):
+        loop = pygestalt.interfaces.eventLoop(name = 'loopTest').start()
+        readDescriptor, writeDescriptor = os.pipe()
+        self.addCleanup(os.close, readDescriptor)
+        self.addCleanup(os.close, writeDescriptor)
+        calls = Queue.Queue()
+        
+        loop.addReader(readDescriptor, lambda: calls.put(('read', os.read(readDescriptor, 16), loop.isLoopThread())))
+        loop.callSoon(lambda: None) #the reader is registered by the time this runs
+        os.write(writeDescriptor, 'ping')
+        self.assertEqual(calls.get(timeout = 1.0), ('read', 'ping', True))
+        loop.removeReader(readDescriptor)
+        
+        loop.callLater(0.05, calls.put, 'later')
+        cancelledTimer = loop.callLater(0.01, calls.put, 'cancelled')
+        cancelledTimer.cancel()
+        loop.callSoon(calls.put, 'soon')
+        self.assertEqual(calls.get(timeout = 1.0), 'soon')
+        self.assertEqual(calls.get(timeout = 1.0), 'later')
+        
+        loop.callSoon(lambda: 1/0)  #exceptions are reported, and the loop keeps running
+        loop.callSoon(calls.put, 'afterException')
+        self.assertEqual(calls.get(timeout = 1.0), 'afterException')
+        
+        startTime = time.time()
+        self.assertTrue(loop.stop())
+        self.assertLess(time.time() - startTime, 1.0)
+        self.assertTrue(calls.empty())
+    
+    def test_requiresFcntl(self):
+        fcntlModule = pygestalt.interfaces.fcntl
+        pygestalt.interfaces.fcntl = None   #as on Windows, where the fcntl module doesn't exist
+        try:
+            self.assertRaises(ImportError, pygestalt.interfaces.eventLoop)
+        finally:
+            pygestalt.interfaces.fcntl = fcntlModule
+
+
+class eventSerialInterfaceTest(eventInterfaceTestCase):
+    """Loopback test of interfaces.eventSerialInterface."""
+    
+    def test_loopback(self):
+        loop = pygestalt.interfaces.eventLoop(name = 'serialTest').start()
+        self.addCleanup(loop.stop)
+        serialPort = pygestalt.interfaces.eventSerialInterface(port = self.openDevice(), name = 'eventSerialTest', loop = loop)
+        receivedChunks = Queue.Queue()
+        serialPort.setReceiveCallback(receivedChunks.put)
+        
+        self.assertTrue(serialPort.transmit(pygestalt.packets.serializedPacket([1, 2, 3])))
+        self.assertTrue(serialPort.transmit(pygestalt.packets.serializedPacket([4, 5])))
+        self.assertEqual(self.readFromDevice(5), '\x01\x02\x03\x04\x05')
+        
+        os.write(self.deviceFileDescriptor, '\x06\x07')
+        self.assertEqual(receivedChunks.get(timeout = 2.0), '\x06\x07')
+        self.assertEqual(serialPort.packetCount, 2)
+        
+        self.assertTrue(serialPort.stop())
+        self.assertFalse(serialPort.isConnected())
+
+
+class eventGestaltInterfaceTest(eventInterfaceTestCase):
+    """Loopback test of interfaces.eventGestaltInterface."""
+    
+    def test_loopback(self):
+        loop = pygestalt.interfaces.eventLoop(name = 'gestaltTest').start()
+        self.addCleanup(loop.stop)
+        serialPort = pygestalt.interfaces.eventSerialInterface(port = self.openDevice(), name = 'eventGestaltTest', loop = loop)
+        gestaltInterface = pygestalt.interfaces.eventGestaltInterface(name = 'eventGestaltTest', interface = serialPort)
+        self.assertTrue(gestaltInterface._eventLoop_ is loop)
+        
+        self.assertLoopback(gestaltInterface)
+        
+        self.assertTrue(gestaltInterface.stop())
+        self.assertFalse(serialPort.isConnected())
+        self.assertTrue(loop.stop())
+    
+    def test_channelPriority(self):
+        loop = pygestalt.interfaces.eventLoop(name = 'priorityTest').start()
+        self.addCleanup(loop.stop)
+        gestaltInterface = pygestalt.interfaces.eventGestaltInterface(name = 'priorityTest', loop = loop)
+        grantedMolecules = Queue.Queue()
+        firstMolecule, secondMolecule = releasableMolecule(grantedMolecules), releasableMolecule(grantedMolecules)
+        gestaltInterface.commit(firstMolecule)
+        gestaltInterface.commit(secondMolecule)
+        secondMolecule.clearForRelease()    #can't be released ahead of the first molecule
+        self.assertRaises(Queue.Empty, grantedMolecules.get, True, 0.1)
+        firstMolecule.clearForRelease()
+        self.assertTrue(grantedMolecules.get(timeout = 1.0) is firstMolecule)
+        self.assertRaises(Queue.Empty, grantedMolecules.get, True, 0.1)   #the channel is still held by the first molecule
+        firstMolecule.channelAccessLock.release()
+        self.assertTrue(grantedMolecules.get(timeout = 1.0) is secondMolecule)
+        self.assertTrue(gestaltInterface.stop())
+
+
+
+class interfaceHubTest(eventInterfaceTestCase):
+    """Loopback test of interfaces.interfaceHub, with two serial buses serviced by the hub's event loop."""
+    
+    def test_loopback(self):
+        hub = pygestalt.interfaces.interfaceHub(name = 'hubTest')
+        firstPath = self.openDevice()
+        firstDevice = self.deviceFileDescriptor
+        secondPath = self.openDevice()
+        secondDevice = self.deviceFileDescriptor
+        firstInterface = hub.addSerialPort(port = firstPath, name = 'hubTestA')
+        secondInterface = hub.addSerialPort(port = secondPath, name = 'hubTestB')
+        self.assertTrue(firstInterface._eventLoop_ is hub.eventLoop and secondInterface._eventLoop_ is hub.eventLoop)
+        threadedInterface = pygestalt.interfaces.gestaltInterface(name = 'threadedInterface')
+        self.addCleanup(threadedInterface.stop)
+        self.assertRaises(ValueError, hub.addInterface, threadedInterface)
+        
+        self.assertLoopback(firstInterface, firstDevice, address = 5)
+        self.assertLoopback(secondInterface, secondDevice, address = 6)
+        self.assertEqual([metrics['packets'] for metrics in hub.metrics()], [1, 1])
+        
+        startTime = time.time()
+        self.assertTrue(hub.stop())
+        self.assertLess(time.time() - startTime, 1.0)
+        self.assertFalse(hub.eventLoop.thread.is_alive())
@@ -9,6 +9,8 @@ import ast
 import datetime
 import itertools
 import sys
+import binascii
+import struct
 from pygestalt import config
 
 def callFunctionAcrossMRO(instance, functionName, args = (), kwargs = {}, parentToChild = True):
@@ -246,12 +248,23 @@ class persistenceManager(object):
         fileObject.close()
         
 
+integerWidths = dict([(numbytes, (256**numbytes, tuple(range(0, 8*numbytes, 8)))) for numbytes in range(9)]) #{numbytes: (limit, bit shifts LSB first)}
+unsignedStructCodes = {1:'B', 2:'H', 4:'I', 8:'Q'}  #struct format characters for little-endian integers, keyed by size in bytes
+byteSequenceTypes = (list, tuple, bytearray)  #sequences that bytesToUnsignedInteger can safely iterate more than once
+
 def unsignedIntegerToBytes(integer, numbytes):
     """Converts an unsigned integer into a sequence of bytes, LSB first.
     
     integer -- the number to be converted
     numbytes -- the number of bytes to be used in representing the integer
+    
+    Negative integers wrap around, as in a two's complement representation. Raises an IndexError if the integer is too large.
     """
+    if type(integer) == int and integer >= 0 and type(numbytes) == int and numbytes in integerWidths:    #typical case, converted with shifts
+        limit, shifts = integerWidths[numbytes]
+        if integer >= limit: raise IndexError('Overflow in conversion between uint and byte list.')
+        return [(integer >> shift) & 255 for shift in shifts]
+    
     bytes = range(numbytes)
     for i in bytes:
         bytes[i] = int(integer%256)
@@ -263,11 +276,56 @@ def unsignedIntegerToBytes(integer, numbytes):
     
 def bytesToUnsignedInteger(byteList):
     """Converts a little-endian sequence of bytes into an unsigned integer."""
+    if type(byteList) in byteSequenceTypes:  #typical case, converted with shifts
+        value = 0
+        shift = 0
+        try:
+            for byte in byteList:
+                value += byte << shift
+                shift += 8
+            return value
+        except TypeError:   #contains something other than integers, e.g. floats
+            pass
     value = 0   #initialize at 0
     for order, byte in enumerate(byteList):
         value += byte*(256**order)
     return value
 
+def unsignedIntegersToBytes(integers, numbytes):
+    """Converts a sequence of unsigned integers into a flat sequence of bytes, each integer LSB first.
+    
+    integers -- the sequence of numbers to be converted.
+    numbytes -- the number of bytes used to represent each integer.
+    
+    Integers of 1, 2, 4, or 8 bytes are packed with a single call to the struct module. Results and overflow errors are identical to
+    converting each integer with unsignedIntegerToBytes.
+    """
+    if type(numbytes) == int and numbytes in unsignedStructCodes and all([type(integer) in (int, long) for integer in integers]):
+        try:
+            return list(bytearray(struct.pack('<' + str(len(integers)) + unsignedStructCodes[numbytes], *integers)))
+        except struct.error:   #out of range or negative, so leave it to unsignedIntegerToBytes
+            pass
+    return [byte for integer in integers for byte in unsignedIntegerToBytes(integer, numbytes)]
+
+def bytesToUnsignedIntegers(byteList, numbytes):
+    """Converts a flat little-endian sequence of bytes into a list of unsigned integers, each of numbytes bytes.
+    
+    Any bytes beyond the last whole integer are ignored.
+    """
+    count = len(byteList)//numbytes
+    if type(numbytes) == int and numbytes in unsignedStructCodes:
+        try:
+            return list(struct.unpack_from('<' + str(count) + unsignedStructCodes[numbytes], bytearray(byteList)))
+        except (ValueError, TypeError): #contains values that aren't bytes, so leave it to bytesToUnsignedInteger
+            pass
+    return [bytesToUnsignedInteger(byteList[index*numbytes:(index + 1)*numbytes]) for index in range(count)]
+
+twosComplementWidths = dict([(bitSize, (2**(bitSize - 1) - 1, 2**bitSize - 1, 2**(bitSize - 1))) for bitSize in range(1, 65)]) #{bitSize: (maximum magnitude, all ones, sign bit)}
+
+def getTwosComplementWidth(bitSize):
+    """Returns (maximum magnitude, all ones, sign bit) for a two's complement number of bitSize bits, from twosComplementWidths if possible."""
+    if bitSize in twosComplementWidths: return twosComplementWidths[bitSize]
+    return (2**bitSize)/2 - 1, 2**bitSize - 1, 2**(bitSize - 1)
 
 def signedIntegerToTwosComplement(integer, bitSize):
     """Converts a signed integer into an unsigned two's complement representation.
@@ -275,12 +333,11 @@ def signedIntegerToTwosComplement(integer, bitSize):
     integer -- the number to be converted.
     bitSize -- the length in bits of the two's complement number to be returned.
     """
-    maxSize = (2**bitSize)/2 - 1
+    maxSize, allOnes, signBit = getTwosComplementWidth(bitSize)
     if abs(integer) > maxSize: #integer cannot be expressed in size
         raise ValueError("Cannot convert signed integer to twos complement. Input value of " + str(integer) + " exceeds maximum size (+/- " + str(maxSize)+").") 
     if integer >= 0: return int(integer) #integer is positive, so nothing needs to be done.
     else:
-        allOnes = 2**bitSize - 1 # fills bitSize bits with all ones
         return (allOnes^abs(int(integer))) + 1  #inverts just the bits comprising the original number, and adds one. This is two's complement!
 
 def twosComplementToSignedInteger(twosComplement, bitSize):
@@ -290,10 +347,8 @@ def twosComplementToSignedInteger(twosComplement, bitSize):
     bitSize -- the length in bits of the two's complement input.
     """
            
-    signBitPosition = bitSize - 1    #sign bit is the most significant bit
-    signBit = 2**signBitPosition    #a single bit in the MSB position
+    maxSize, allOnes, signBit = getTwosComplementWidth(bitSize)   #the sign bit is a single bit in the MSB position
     if(signBit & twosComplement):   #number is negative, need to take two's complement
-        allOnes = 2**bitSize - 1 # fills size bytes with all ones
         return -((twosComplement - 1)^allOnes)   #subtract one then flip bits, the is the inverse of encoding process.
     else:
         return twosComplement #positive number, no need to do anything.
@@ -345,13 +400,24 @@ def fuzzyEquals(number1, number2, tolerance):
         
 class CRC():
     """Generates and validates CRC values."""
+    crcTables = {}  #CRC tables are shared across all instances, and are stored as {(className, polynomial):crcTable}
+    size = 1    #length in bytes of the generated CRC
+    initialValue = 0
+    
     def __init__(self, polynomial = 7):
         """Initializer for a CRC instance.
         
         polynomial -- the taps used to generate the CRC. Default is 7 (ATM), could also use 49 (Dallas-Maxim)
         """
         self.polynomial = polynomial        #CRC-8: ATM=7, Dallas-Maxim = 49
-        self.crcTable = self.crcTableGen()
+        self.crcTable = self.getCRCTable()
+    
+    def getCRCTable(self):
+        """Returns the CRC table for this instance's polynomial, generating it only if no other instance has already done so."""
+        tableKey = (self.__class__.__name__, self.polynomial)
+        if tableKey not in CRC.crcTables:
+            CRC.crcTables[tableKey] = self.crcTableGen()
+        return CRC.crcTables[tableKey]
     
     def calculateByteCRC(self, byteValue):
         """Calculates Bytes in the CRC Table."""
@@ -369,19 +435,18 @@ class CRC():
             crcTable += [self.calculateByteCRC(i)]
         return crcTable
     
-    def generate(self, byteList):
+    def generate(self, byteList, crc = None):
         """Generates a CRC byte from an input list of bytes.
         
-        byteList -- a flat list containing a sequence of bytes for which to generate a CRC.
+        byteList -- a flat list, or any other iterable, containing a sequence of bytes for which to generate a CRC.
+        crc -- the initial CRC value. Provide the result of a previous call to continue a CRC across several segments of a packet.
         """
-        #INITIALIZE CRC ALGORITHM
-        crc = 0
-        crcByte = 0
+        if crc == None: crc = self.initialValue
+        crcTable = self.crcTable    #local reference for speed
         
         #CALCULATE CRC
         for byte in byteList:
-            crcByte = byte^crc
-            crc = self.crcTable[crcByte]
+            crc = crcTable[byte^crc]
         return crc
     
     def validate(self, byteList, checkCRC):
@@ -395,6 +460,80 @@ class CRC():
         
         if actualCRC != checkCRC:    return False    #CRC doesn't match
         else:    return True    #CRC matches
+    
+    @staticmethod
+    def toBuffer(byteList):
+        """Returns the provided bytes in a form that can be passed to the binascii module, copying them only if necessary."""
+        if type(byteList) in (bytearray, str, memoryview): return byteList
+        else: return bytearray(byteList)
+
+
+class CRC16(CRC):
+    """Generates and validates 16-bit CRC values.
+    
+    Non-reflected variants are calculated by binascii.crc_hqx, and reflected variants using a shared lookup table.
+    """
+    size = 2
+    variants = {'CCITT':(0x1021, 0xFFFF, False), #{variant: (polynomial, initialValue, reflected)}
+                'XMODEM':(0x1021, 0x0000, False),
+                'MODBUS':(0x8005, 0xFFFF, True)}
+    
+    def __init__(self, variant = 'CCITT'):
+        """Initializer for a 16-bit CRC instance.
+        
+        variant -- the name of the CRC-16 variant. Can be 'CCITT' (i.e. CCITT-FALSE), 'XMODEM', or 'MODBUS'.
+        """
+        self.variant = variant
+        self.polynomial, self.initialValue, self.reflected = self.variants[variant]
+        if self.reflected:
+            self.crcTable = self.getCRCTable()
+        else:
+            self.crcTable = None    #calculated by binascii
+    
+    def calculateByteCRC(self, byteValue):
+        """Calculates entries in the reflected CRC table."""
+        reflectedPolynomial = int(bin(self.polynomial)[2:].zfill(16)[::-1], 2)
+        for i in range(8):
+            if byteValue & 1:
+                byteValue = (byteValue >> 1) ^ reflectedPolynomial
+            else:
+                byteValue = byteValue >> 1
+        return byteValue
+    
+    def generate(self, byteList, crc = None):
+        """Generates a 16-bit CRC from an input sequence of bytes.
+        
+        byteList -- a flat list, bytearray, or any other iterable, containing a sequence of bytes for which to generate a CRC.
+        crc -- the initial CRC value. Provide the result of a previous call to continue a CRC across several segments of a packet.
+        """
+        if crc == None: crc = self.initialValue
+        if not self.reflected:
+            return binascii.crc_hqx(self.toBuffer(byteList), crc)
+        
+        crcTable = self.crcTable    #local reference for speed
+        if type(byteList) != bytearray: byteList = bytearray(byteList)  #strings and memoryviews iterate as characters, so are converted to integers
+        for byte in byteList:
+            crc = (crc >> 8) ^ crcTable[(crc ^ byte) & 0xFF]
+        return crc
+
+
+class CRC32(CRC):
+    """Generates and validates standard (IEEE 802.3) 32-bit CRC values, as calculated by binascii.crc32."""
+    size = 4
+    
+    def __init__(self):
+        """Initializer for a 32-bit CRC instance."""
+        self.polynomial = 0x04C11DB7
+        self.crcTable = None    #calculated by binascii
+    
+    def generate(self, byteList, crc = None):
+        """Generates a 32-bit CRC from an input sequence of bytes.
+        
+        byteList -- a flat list, bytearray, or any other iterable, containing a sequence of bytes for which to generate a CRC.
+        crc -- the initial CRC value. Provide the result of a previous call to continue a CRC across several segments of a packet.
+        """
+        if crc == None: crc = self.initialValue
+        return binascii.crc32(self.toBuffer(byteList), crc) & 0xFFFFFFFF
 
 class intelHexParser(object):
     """Parses Intel Hex Files for Bootloading and Memory Programming."""